@@ -1,3 +1,4 @@
+import sys
 from enum import Enum
 from typing import Annotated
 
@@ -8,8 +9,12 @@ from . import dump_gis
 from . import fetch_gis
 from . import forecast as forecast_mod
 from . import knobs
+from . import locate as locate_mod
+from . import nearest as nearest_mod
 from . import output
+from . import serve as serve_mod
 from . import settings
+from . import spatial_db
 from . import visualize
 
 app = typer.Typer(
@@ -29,6 +34,10 @@ def _version_callback(value: bool) -> None:
 # Build dynamic enums from runtime data
 GisType = Enum("GisType", {t: t for t in fetch_gis.get_gis_types()})
 VizType = Enum("VizType", {t: t for t in visualize.get_visualizable_types()})
+PolygonType = Enum("PolygonType", {t: t for t in locate_mod.get_polygon_types()})
+PointType = Enum("PointType", {t: t for t in nearest_mod.get_point_types()})
+JsonFormat = Enum("JsonFormat", {f: f for f in output.JSON_FORMATS})
+MapDetail = Enum("MapDetail", {d: d for d in visualize.DETAIL_TOLERANCES})
 
 
 @app.callback()
@@ -41,10 +50,19 @@ def app_callback(
     verbose: Annotated[int, typer.Option("-v", "--verbose", count=True, help="Level of verbosity of logs")] = 0,
     cache_path: Annotated[str, typer.Option("-c", "--cache-path", help=f"BOM data cache path, Default: {settings.CACHE}")] = settings.CACHE,
     json: Annotated[bool, typer.Option("--json", help="Emit JSON output (for widgets / scripting)")] = False,
+    json_format: Annotated[
+        JsonFormat | None,
+        typer.Option("--json-format", help=f"JSON layout, implies --json. Default: {settings.JSON_FORMAT}"),
+    ] = None,
 ) -> None:
     settings.VERBOSE = verbose
     settings.CACHE = cache_path
-    output.set_json_mode(json)
+    output.set_json_mode(json or json_format is not None)
+    try:
+        output.set_json_format(json_format.value if json_format else settings.JSON_FORMAT)
+    except ValueError as e:
+        output.print_error(f"BOM_JSON_FORMAT: {e}")
+        raise typer.Exit(1) from None
     if ctx.invoked_subcommand is None:
         ctx.invoke(forecast)
 
@@ -65,10 +83,15 @@ knobs_cmd.__name__ = "knobs"
 @app.command()
 def forecast(
     town: Annotated[str, typer.Argument(help="Town name to get forecast for")] = "Roleystone",
+    refresh: Annotated[bool, typer.Option("--refresh", help="check the API for newer data even if the cached response is fresh")] = False,
 ) -> None:
-    """Show the 7-day weather forecast for a town."""
+    """Show the 7-day weather forecast for a town.
+
+    Responses are cached, see the BOM_FORECAST_CACHE_TTL and BOM_LOCATION_CACHE_TTL knobs.
+    """
+    settings.HTTP_CACHE_REFRESH = refresh
     try:
-        locations = forecast_mod.search_location(town)
+        locations, locations_status = forecast_mod.fetch_locations(town)
     except Exception as e:
         output.print_error(f"Error searching for '{town}': {e}")
         raise typer.Exit(1) from None
@@ -86,13 +109,13 @@ def forecast(
     location = locations[0]
 
     try:
-        data = forecast_mod.get_daily_forecast(location["geohash"])
+        data, forecast_status = forecast_mod.fetch_daily_forecast(location["geohash"])
     except Exception as e:
         output.print_error(f"Error fetching forecast: {e}")
         raise typer.Exit(1) from None
 
     if output.is_json_mode():
-        output.emit_json({"location": location, "forecast": data})
+        output.emit_json({"location": location, "forecast": data, "cache": {"locations": locations_status, "forecast": forecast_status}})
     else:
         output.print_info(forecast_mod.format_forecast(location, data))
 
@@ -110,57 +133,101 @@ def spatial_callback(
     ftp_timeout: Annotated[
         int, typer.Option("--ftp-timeout", help=f"FTP Timeout, default is {settings.FTP_TIMEOUT}s")
     ] = settings.FTP_TIMEOUT,
+    ftp_workers: Annotated[
+        int, typer.Option("--ftp-workers", min=1, help=f"Concurrent FTP downloads, default is {settings.FTP_WORKERS}")
+    ] = settings.FTP_WORKERS,
 ) -> None:
     """Spatial database management."""
     settings.OVERWRITE = overwrite
     settings.FTP_TIMEOUT = ftp_timeout
+    settings.FTP_WORKERS = ftp_workers
 
 
 @spatial_app.command()
 def fetch() -> None:
     """Fetch spatial data."""
-    fetch_gis.fetch_spatial_data()
+    if fetch_gis.fetch_spatial_data():
+        raise typer.Exit(1)
 
 
 @spatial_app.command()
 def sync() -> None:
-    """Sync the local spatial data, overwriting existing files."""
-    settings.OVERWRITE = True
-    fetch_gis.fetch_spatial_data()
+    """Sync the local spatial data, downloading only files that changed on BOM."""
+    if fetch_gis.sync_spatial_data():
+        raise typer.Exit(1)
 
 
 @spatial_app.command()
-def build() -> None:
-    """Build the local spatial database."""
-    fetch_gis.create_spatial_database()
+def build(
+    workers: Annotated[
+        int,
+        typer.Option("-w", "--workers", min=0, help=f"Layer decoding processes, 0 is one per CPU, default is {settings.BUILD_WORKERS}"),
+    ] = settings.BUILD_WORKERS,
+    force: Annotated[bool, typer.Option("-f", "--force", help="Reload every layer, even if its source is unchanged")] = False,
+) -> None:
+    """Build the local spatial database, reloading only layers that changed."""
+    fetch_gis.create_spatial_database(workers=workers, force=force)
+
+
+class DumpFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
 
 
 @spatial_app.command()
 def csvdump(
     spatial_type: Annotated[GisType | None, typer.Option("-s", "--spatial-type", help="choose a spatial type")] = None,
+    columns: Annotated[str | None, typer.Option("-c", "--columns", help="comma separated columns to write (default: all)")] = None,
+    where: Annotated[
+        list[str] | None,
+        typer.Option("-w", "--where", help="COLUMN=VALUE or COLUMN!=VALUE filter, can be given more than once"),
+    ] = None,
+    output_format: Annotated[DumpFormat, typer.Option("-f", "--format", help="output format")] = DumpFormat.csv,
+    output_path: Annotated[str | None, typer.Option("-o", "--output", help="output file (default: stdout)")] = None,
 ) -> None:
-    """Dump spatial data to csv."""
+    """Dump spatial data to csv, NDJSON or Parquet.
+
+    bomshell spatial csvdump -s forecast_districts -w STATE_CODE=WA -c AAC,DIST_NAME -f parquet -o wa.parquet
+    """
     if spatial_type is None:
         output.print_warning("Select one of the spatial types:")
         for e in fetch_gis.get_gis_types():
             output.print_warning(f"--spatial-type {e}")
         raise typer.Exit()
 
-    dump_gis.dump_to_csv(spatial_type.value)
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        dump_gis.dump_to_csv(spatial_type.value, columns=selected, where=where, output_format=output_format.value, output_path=output_path)
+    except (FileNotFoundError, ValueError) as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
 
 
 @spatial_app.command()
 def tabledump(
     spatial_type: Annotated[GisType | None, typer.Option("-s", "--spatial-type", help="choose a spatial type")] = None,
+    page: Annotated[int | None, typer.Option("-p", "--page", min=1, help="show only this page of rows")] = None,
+    page_size: Annotated[int, typer.Option("-n", "--page-size", min=1, help="rows per page")] = dump_gis.DEFAULT_PAGE_SIZE,
+    interactive: Annotated[bool, typer.Option("-i", "--interactive", help="page through the rows in the terminal")] = False,
 ) -> None:
-    """Dump spatial data to table."""
+    """Dump spatial data to table.
+
+    bomshell spatial tabledump -s point_places --page 3
+
+    bomshell spatial tabledump -s point_places -i
+    """
     if spatial_type is None:
         output.print_warning("Select one of the spatial types:")
         for e in fetch_gis.get_gis_types():
             output.print_warning(f"--spatial-type {e}")
         raise typer.Exit()
 
-    dump_gis.dump_to_table(spatial_type.value)
+    try:
+        dump_gis.dump_to_table(spatial_type.value, page=page, page_size=page_size, interactive=interactive)
+    except (FileNotFoundError, ValueError) as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
 
 
 @spatial_app.command("map")
@@ -171,12 +238,37 @@ def map_cmd(
     ] = None,
     output_path: Annotated[str | None, typer.Option("-o", "--output", help="output HTML file path")] = None,
     no_open: Annotated[bool, typer.Option("--no-open", help="don't open the map in a browser")] = False,
+    detail: Annotated[
+        MapDetail | None,
+        typer.Option("-d", "--detail", help=f"polygon detail, default is {settings.MAP_DETAIL}"),
+    ] = None,
+    simplify: Annotated[
+        float | None,
+        typer.Option("--simplify", min=0, help="polygon simplification tolerance in degrees, overrides --detail"),
+    ] = None,
+    external: Annotated[
+        bool,
+        typer.Option("-e", "--external", help="write each layer to its own file next to the map, loaded when switched on"),
+    ] = False,
+    compress: Annotated[
+        bool,
+        typer.Option("--gzip", help="also write gzip-compressed layers for maps served over http, implies --external"),
+    ] = False,
+    workers: Annotated[
+        int,
+        typer.Option("-w", "--workers", min=0, help=f"threads preparing layers, 0 is one per layer, default is {settings.MAP_WORKERS}"),
+    ] = settings.MAP_WORKERS,
 ) -> None:
     """Generate an interactive map of spatial data.
 
     Combine multiple layers by specifying -s multiple times:
 
         bomshell spatial map -s forecast_districts -s radar_location
+
+    Coastline-heavy layers are simplified; use --detail full for the original shapes.
+
+    Large combinations open faster with --external, which only loads a layer
+    when it is switched on in the layer control.
     """
     if not spatial_types:
         output.print_warning("Select one or more spatial types:")
@@ -186,11 +278,22 @@ def map_cmd(
         raise typer.Exit()
 
     type_values = [t.value for t in spatial_types]
+    if simplify is None:
+        level = detail.value if detail else settings.MAP_DETAIL
+        if level not in visualize.DETAIL_TOLERANCES:
+            output.print_error(f"BOM_MAP_DETAIL must be one of: {', '.join(visualize.DETAIL_TOLERANCES)}")
+            raise typer.Exit(1)
+        simplify = visualize.DETAIL_TOLERANCES[level]
 
     try:
-        result_path = visualize.create_map(type_values, output_path)
+        external = external or compress
+        result_path = visualize.create_map(
+            type_values, output_path, tolerance=simplify, external=external, compress=compress, workers=workers
+        )
         output.print_success(f"Map saved to: {result_path}")
-        if len(type_values) > 1:
+        if external:
+            output.print_cyan(f"Layers saved to: {visualize.layers_directory(result_path)}, switch them on in the layer control")
+        elif len(type_values) > 1:
             output.print_cyan("Use layer control (top-right) to toggle layers")
         if not no_open:
             visualize.open_in_browser(result_path)
@@ -199,5 +302,205 @@ def map_cmd(
         raise typer.Exit(1) from None
 
 
+@spatial_app.command()
+def serve(
+    spatial_types: Annotated[
+        list[VizType] | None,
+        typer.Option("-s", "--spatial-type", help="spatial type(s) to serve (default: all fetched)"),
+    ] = None,
+    host: Annotated[str, typer.Option("--host", help="address to listen on")] = "127.0.0.1",
+    port: Annotated[
+        int, typer.Option("-p", "--port", min=0, help=f"port to listen on, default is {settings.SERVE_PORT}")
+    ] = settings.SERVE_PORT,
+    tile_cache: Annotated[
+        int,
+        typer.Option("--tile-cache", min=0, help=f"GeoJSON tiles kept in memory, default is {settings.SERVE_TILE_CACHE}"),
+    ] = settings.SERVE_TILE_CACHE,
+    no_open: Annotated[bool, typer.Option("--no-open", help="don't open the map in a browser")] = False,
+) -> None:
+    """Serve spatial layers at full detail to a local map, only the visible features are sent.
+
+    bomshell spatial serve -s marine_zones -s point_places
+
+    Tiles and bbox queries are GeoJSON, see the /layers, /layers/<type>?bbox= and
+    /tiles/<type>/<z>/<x>/<y>.geojson endpoints.
+    """
+    if spatial_types:
+        type_values = [t.value for t in spatial_types]
+    else:
+        type_values = [t for t in visualize.get_visualizable_types() if _is_fetched(t)]
+        if not type_values:
+            output.print_error("No spatial data found. Run 'bomshell spatial fetch' first.")
+            raise typer.Exit(1)
+    try:
+        serve_mod.serve(type_values, host, port, tile_cache_size=tile_cache, open_browser=not no_open)
+    # missing layers, and ports that are taken
+    except OSError as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
+
+
+def _is_fetched(spatial_type: str) -> bool:
+    try:
+        visualize.layer_source_path(visualize.SPATIAL_CONFIGS[spatial_type])
+    except FileNotFoundError:
+        return False
+    return True
+
+
+class LocateFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+@spatial_app.command(context_settings={"ignore_unknown_options": True})
+def locate(
+    lat: Annotated[float | None, typer.Argument(help="Latitude in degrees, e.g. -31.95")] = None,
+    lon: Annotated[float | None, typer.Argument(help="Longitude in degrees, e.g. 115.86")] = None,
+    spatial_types: Annotated[
+        list[PolygonType] | None,
+        typer.Option("-s", "--spatial-type", help="polygon type(s) to search (default: all)"),
+    ] = None,
+    input_path: Annotated[str | None, typer.Option("-i", "--input", help="CSV of coordinates with lat/lon columns, - for stdin")] = None,
+    output_format: Annotated[LocateFormat, typer.Option("-f", "--format", help="batch output format")] = LocateFormat.csv,
+    workers: Annotated[
+        int,
+        typer.Option("-w", "--workers", min=0, help=f"batch worker processes, 0 is one per CPU, default is {settings.LOCATE_WORKERS}"),
+    ] = settings.LOCATE_WORKERS,
+    chunk_size: Annotated[int, typer.Option("--chunk-size", min=1, help="batch rows per spatial join")] = locate_mod.LOCATE_CHUNK_SIZE,
+) -> None:
+    """Find the districts, zones and areas a coordinate falls in.
+
+        bomshell spatial locate -31.95 115.86
+
+    Assign districts to many coordinates at once, streaming CSV or NDJSON out:
+
+        bomshell spatial locate --input assets.csv --format ndjson > assets.ndjson
+    """
+    layers = [t.value for t in spatial_types] if spatial_types else None
+
+    if input_path is not None:
+        source = sys.stdin if input_path == "-" else input_path
+        try:
+            frames = locate_mod.locate_batch(source, layers, chunk_size=chunk_size, workers=workers)
+            locate_mod.write_batch(frames, sys.stdout, output_format.value)
+        except (FileNotFoundError, ValueError) as e:
+            output.print_error(str(e))
+            raise typer.Exit(1) from None
+        return
+
+    if lat is None or lon is None:
+        output.print_warning("Give a coordinate, e.g. bomshell spatial locate -31.95 115.86, or --input FILE")
+        raise typer.Exit(1)
+
+    try:
+        found = locate_mod.locate(lat, lon, layers)
+    except FileNotFoundError as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
+
+    if output.is_json_mode():
+        output.emit_json({"lat": lat, "lon": lon, "districts": found})
+    else:
+        output.print_info(locate_mod.format_location(lat, lon, found))
+
+
+@spatial_app.command(context_settings={"ignore_unknown_options": True})
+def nearest(
+    lat: Annotated[float | None, typer.Argument(help="Latitude in degrees, e.g. -31.95")] = None,
+    lon: Annotated[float | None, typer.Argument(help="Longitude in degrees, e.g. 115.86")] = None,
+    spatial_type: Annotated[PointType, typer.Option("-s", "--spatial-type", help="point type to search")] = PointType.radar_location,
+    k: Annotated[int, typer.Option("-k", "--count", min=1, help="number of nearest points")] = 1,
+    input_path: Annotated[str | None, typer.Option("-i", "--input", help="CSV of coordinates with lat/lon columns, - for stdin")] = None,
+    output_format: Annotated[LocateFormat, typer.Option("-f", "--format", help="batch output format")] = LocateFormat.csv,
+) -> None:
+    """Find the nearest radars or forecast point places to a coordinate.
+
+    bomshell spatial nearest -31.95 115.86 -k 3
+
+    bomshell spatial nearest -31.95 115.86 -s point_places
+    """
+    try:
+        if input_path is not None:
+            source = sys.stdin if input_path == "-" else input_path
+            frames = nearest_mod.nearest_frames(source, spatial_type.value, k)
+            locate_mod.write_batch(frames, sys.stdout, output_format.value)
+            return
+
+        if lat is None or lon is None:
+            output.print_warning("Give a coordinate, e.g. bomshell spatial nearest -31.95 115.86, or --input FILE")
+            raise typer.Exit(1)
+
+        found = nearest_mod.nearest(lat, lon, spatial_type.value, k)
+    except (FileNotFoundError, ValueError) as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
+
+    if output.is_json_mode():
+        output.emit_json({"lat": lat, "lon": lon, "spatial_type": spatial_type.value, "nearest": found})
+    else:
+        output.print_info(nearest_mod.format_nearest(lat, lon, spatial_type.value, found))
+
+
+@spatial_app.command()
+def query(
+    spatial_type: Annotated[GisType, typer.Option("-s", "--spatial-type", help="layer to query")],
+    where: Annotated[str | None, typer.Option("-w", "--where", help="SQL filter, e.g. \"state_code='WA'\"")] = None,
+    columns: Annotated[str | None, typer.Option("-c", "--columns", help="comma separated columns to return (default: all)")] = None,
+    limit: Annotated[int | None, typer.Option("-n", "--limit", min=1, help="maximum number of rows")] = None,
+    output_format: Annotated[LocateFormat, typer.Option("-f", "--format", help="output format")] = LocateFormat.csv,
+) -> None:
+    """Query a layer of the local spatial database, streaming the matching rows.
+
+    bomshell spatial query -s forecast_districts --where "state_code='WA'" --columns aac,dist_name
+    """
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        conn = spatial_db.connect()
+        field_names, records = spatial_db.query_layer(conn, spatial_type.value, selected, where, limit)
+        if output.is_json_mode():
+            output.emit_json(records)
+        else:
+            dump_gis.write_records(field_names, records, sys.stdout, output_format.value)
+    except (FileNotFoundError, ValueError) as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
+
+
+@spatial_app.command()
+def search(
+    query: Annotated[str, typer.Argument(help="Place or district name, or the start of one")],
+    spatial_types: Annotated[
+        list[GisType] | None,
+        typer.Option("-s", "--spatial-type", help="spatial type(s) to search (default: all)"),
+    ] = None,
+    limit: Annotated[int, typer.Option("-n", "--limit", min=1, help="maximum number of matches")] = 10,
+) -> None:
+    """Search place and district names in the local spatial database.
+
+    bomshell spatial search "perth air"
+    """
+    layers = [t.value for t in spatial_types] if spatial_types else None
+    try:
+        conn = spatial_db.connect()
+        matches = spatial_db.search_names(conn, query, layers=layers, limit=limit)
+        for match in matches:
+            match["record"] = spatial_db.get_record(conn, match["layer"], match["fid"])
+    except FileNotFoundError as e:
+        output.print_error(str(e))
+        raise typer.Exit(1) from None
+
+    if output.is_json_mode():
+        output.emit_json(matches)
+        return
+    if not matches:
+        output.print_warning(f"No names matching '{query}'")
+        raise typer.Exit(1)
+    for match in matches:
+        record = match["record"] or {}
+        details = ", ".join(str(record[c]) for c in ("aac", "state_code", "state_name") if record.get(c))
+        output.print_info(f"{match['name']} ({match['layer']})" + (f"  {details}" if details else ""))
+
+
 def main() -> None:
     app()
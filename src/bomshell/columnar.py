@@ -0,0 +1,129 @@
+"""Columnar GeoParquet copies of the spatial layers, written by ``spatial build``.
+
+Readers prefer these over the shapefiles when they are fresh, i.e. the source
+files of the layer in the spatial cache are unchanged since the copy was
+written. A ``<file>.json`` next to each copy records the source signature.
+"""
+
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import settings
+from . import spatial_db
+
+SOURCE_EXTENSIONS = (".dbf", ".shp", ".prj")
+
+# Rows per record batch when streaming a layer
+READ_BATCH_SIZE = 10_000
+
+
+def parquet_path(file_name: str) -> str:
+    """:return: cached GeoParquet path of a BOM file such as IDM00001"""
+    return os.path.join(settings.SPATIAL_PARQUET, f"{file_name}.parquet")
+
+
+def source_files(file_name: str) -> list[str]:
+    """:return: the fetched source files of a BOM layer such as IDM00001, whose signature is recorded with its copy"""
+    paths = (os.path.join(settings.SPATIAL_CACHE, file_name + ext) for ext in SOURCE_EXTENSIONS)
+    return [path for path in paths if os.path.exists(path)]
+
+
+def _signature_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _write_signature(path: str, signature: dict) -> None:
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(signature, f)
+    os.replace(temp_path, path)
+
+
+def is_fresh(file_name: str) -> bool:
+    """
+    Whether the GeoParquet copy of *file_name* exists and was written from its
+    sources as they are now, see spatial_db.sources_unchanged.
+    """
+    path = parquet_path(file_name)
+    try:
+        with open(_signature_path(path), encoding="utf-8") as f:
+            signature = json.load(f)
+    except (OSError, ValueError):
+        return False
+    sources = source_files(file_name)
+    if not sources or not os.path.exists(path):
+        return False
+    return spatial_db.sources_unchanged(signature, sources, lambda stat: _write_signature(_signature_path(path), {**signature, **stat}))
+
+
+def write_layer(path: str, records: list[dict], geometry: gpd.GeoSeries | None = None, sources: list[str] | None = None) -> None:
+    """
+    Write a layer as GeoParquet, or plain Parquet when it has no geometry.
+
+    :param path: destination, see parquet_path
+    :param records: DBF records with their original field names
+    :param geometry: WGS84 geometries in record order
+    :param sources: files the layer was read from, their signature is recorded for is_fresh
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # arrow keeps an integer field with blanks as integers, pandas would turn it into floats
+    table = pa.Table.from_pylist(records)
+    temp_path = path + ".tmp"
+    if geometry is not None and len(geometry) == table.num_rows:
+        frame = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+        with open(temp_path, "wb") as f:
+            gpd.GeoDataFrame(frame, geometry=geometry.values, crs=geometry.crs).to_parquet(f, index=False)
+    else:
+        pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+    if sources:
+        _write_signature(_signature_path(path), spatial_db.source_signature(sources))
+
+
+def attribute_columns(file_name: str) -> list[str]:
+    """:return: the non-geometry columns of a cached layer"""
+    return [name for name in pq.read_schema(parquet_path(file_name)).names if name != "geometry"]
+
+
+def count_records(file_name: str) -> int:
+    """:return: number of records of a cached layer, from the Parquet metadata"""
+    return pq.ParquetFile(parquet_path(file_name)).metadata.num_rows
+
+
+def iter_records(file_name: str, columns: list[str] | None = None, start: int = 0, stop: int | None = None):
+    """
+    Stream the attribute records of a cached layer, reading only *columns*.
+
+    Batches before *start* are skipped without being decoded.
+
+    :return: iterator of dicts
+    """
+    columns = columns or attribute_columns(file_name)
+    parquet_file = pq.ParquetFile(parquet_path(file_name))
+    offset = 0
+    for batch in parquet_file.iter_batches(batch_size=READ_BATCH_SIZE, columns=columns):
+        if stop is not None and offset >= stop:
+            break
+        end = offset + batch.num_rows
+        if end > start:
+            first = max(start - offset, 0)
+            last = batch.num_rows if stop is None else min(stop - offset, batch.num_rows)
+            yield from batch.slice(first, last - first).to_pylist()
+        offset = end
+
+
+def read_frame(file_name: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read the attributes of a cached layer, optionally only the given columns."""
+    return pd.read_parquet(parquet_path(file_name), columns=columns or attribute_columns(file_name))
+
+
+def read_geodataframe(file_name: str, columns: list[str] | None = None) -> gpd.GeoDataFrame:
+    """Read a cached layer with its geometry, optionally only the given attribute columns."""
+    if columns is not None:
+        columns = [*columns, "geometry"]
+    return gpd.read_parquet(parquet_path(file_name), columns=columns)
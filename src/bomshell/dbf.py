@@ -0,0 +1,195 @@
+"""Memory-mapped DBF reader backed by NumPy structured arrays.
+
+The fixed-width records of a DBF file are mapped straight from disk as a
+structured array, one byte-string field per column. Columns are decoded in
+bulk when first asked for. Iterating decodes the records a window at a time
+and builds the row dicts from that, so memory does not grow with the table.
+Values match dbfread: stripped strings, int/float/None numbers,
+datetime.date, True/False/None logicals, and deleted records are skipped.
+
+Tables with field types this reader does not decode (memo, currency,
+timestamp, ...) are read with dbfread instead, see open_dbf.
+"""
+
+import datetime
+import os
+
+import dbfread
+import numpy as np
+import pandas as pd
+
+# Field types decoded here, anything else goes through dbfread
+SUPPORTED_TYPES = "CNFDLIO"
+
+# Whitespace and the overflow padding dbfread strips from numeric fields
+NUMERIC_STRIP = b" \t\n\r\x0b\x0c*"
+
+# Records decoded at a time while iterating
+READ_BATCH_SIZE = 10_000
+
+LIVE_RECORD = b" "
+END_OF_FILE = b"\x1a"
+
+
+class UnsupportedFieldType(ValueError):
+    """The table has a field type the NumPy reader does not decode."""
+
+
+class DBF:
+    """
+    A DBF table mapped into memory.
+
+    Iterating yields one dict per live record, like dbfread.DBF. Use column()
+    or to_frame() to get whole columns without building the rows.
+    """
+
+    def __init__(self, path: str, encoding: str | None = None):
+        # dbfread parses the header and field descriptors only, records are not loaded
+        header = dbfread.DBF(path, encoding=encoding)
+        unsupported = sorted({field.type for field in header.fields if field.type not in SUPPORTED_TYPES})
+        if unsupported:
+            raise UnsupportedFieldType(f"{path}: unsupported DBF field types {', '.join(unsupported)}")
+
+        self.path = header.filename
+        self.encoding = header.encoding
+        self.fields = header.fields
+        self.field_names = header.field_names
+        self.records = self._map_records(header)
+        self._columns: dict[str, np.ndarray] = {}
+
+    def _map_records(self, header) -> np.ndarray:
+        record_length = header.header.recordlen
+        names, formats, offsets = ["_flag"], ["S1"], [0]
+        offset = 1
+        for index, field in enumerate(self.fields):
+            names.append(f"f{index}")
+            formats.append("<i4" if field.type == "I" else "<f8" if field.type == "O" else f"S{field.length}")
+            offsets.append(offset)
+            offset += field.length
+        dtype = np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": max(record_length, offset)})
+
+        size = os.path.getsize(self.path)
+        count = min(header.header.numrecords, max(size - header.header.headerlen, 0) // dtype.itemsize)
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        records = np.ndarray(shape=(count,), dtype=dtype, buffer=data, offset=header.header.headerlen)
+
+        flags = records["_flag"]
+        end = np.flatnonzero(flags == END_OF_FILE)
+        if end.size:
+            records, flags = records[: end[0]], flags[: end[0]]
+        live = flags == LIVE_RECORD
+        return records if live.all() else records[live]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Decode one column.
+
+        :return: int64/float64 array for numeric columns without blanks, else an object array
+        :raises KeyError: if the table has no such field
+        """
+        if name not in self._columns:
+            self._columns[name] = self._decode_window(name, self.records)
+        return self._columns[name]
+
+    def _decode_window(self, name: str, records: np.ndarray) -> np.ndarray:
+        if name not in self.field_names:
+            raise KeyError(name)
+        index = self.field_names.index(name)
+        return self._decode(self.fields[index], records[f"f{index}"])
+
+    def _decode(self, field, raw: np.ndarray) -> np.ndarray:
+        if field.type in "IO":
+            return np.asarray(raw, dtype=np.int64 if field.type == "I" else np.float64)
+        if field.type == "C":
+            return self._decode_text(raw)
+        if field.type in "NF":
+            return _decode_numeric(raw, as_float=field.type == "F" or field.decimal_count > 0)
+        if field.type == "D":
+            return _decode_dates(raw)
+        return _decode_logical(raw)
+
+    def _decode_text(self, raw: np.ndarray) -> np.ndarray:
+        if not len(raw):
+            return np.empty(0, dtype=object)
+        # BOM layers repeat few distinct values, decode each of them once
+        unique, inverse = np.unique(np.char.rstrip(raw, b"\0 "), return_inverse=True)
+        decoded = np.array([value.decode(self.encoding) for value in unique.tolist()], dtype=object)
+        return decoded[inverse.reshape(-1)]
+
+    def to_frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Decode the table, or only *columns*, as a DataFrame."""
+        names = self.field_names if columns is None else columns
+        return pd.DataFrame({name: self.column(name) for name in names}, columns=names)
+
+    def iter_records(self, columns: list[str] | None = None, start: int = 0, stop: int | None = None):
+        """
+        Yield the live records as dicts, decoding only *columns* if given.
+
+        Records between *start* and *stop* are decoded READ_BATCH_SIZE at a time,
+        straight from the mapped file, without keeping the decoded columns.
+        """
+        names = self.field_names if columns is None else columns
+        records = self.records[start:stop]
+        for offset in range(0, len(records), READ_BATCH_SIZE):
+            window = records[offset : offset + READ_BATCH_SIZE]
+            values = [self._decode_window(name, window).tolist() for name in names]
+            for row in zip(*values, strict=True):
+                yield dict(zip(names, row, strict=True))
+
+    def __iter__(self):
+        return self.iter_records()
+
+
+def _with_blanks(values: np.ndarray, blank: np.ndarray) -> np.ndarray:
+    if not blank.any():
+        return values
+    result = values.astype(object)
+    result[blank] = None
+    return result
+
+
+def _decode_numeric(raw: np.ndarray, as_float: bool) -> np.ndarray:
+    stripped = np.char.strip(raw, NUMERIC_STRIP)
+    blank = stripped == b""
+    filled = np.where(blank, b"0", stripped)
+    if not as_float:
+        try:
+            return _with_blanks(filled.astype(np.int64), blank)
+        except ValueError:
+            pass
+    return _with_blanks(np.char.replace(filled, b",", b".").astype(np.float64), blank)
+
+
+def _decode_dates(raw: np.ndarray) -> np.ndarray:
+    values = np.empty(len(raw), dtype=object)
+    for index, value in enumerate(raw.tolist()):
+        if value.strip(b" 0") == b"":
+            values[index] = None
+        else:
+            values[index] = datetime.date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    return values
+
+
+def _decode_logical(raw: np.ndarray) -> np.ndarray:
+    values = np.full(len(raw), None, dtype=object)
+    values[np.isin(raw, [b"T", b"t", b"Y", b"y"])] = True
+    values[np.isin(raw, [b"F", b"f", b"N", b"n"])] = False
+    return values
+
+
+def open_dbf(path: str, encoding: str | None = None):
+    """
+    Open a DBF table with the NumPy reader, or with dbfread if it has field
+    types the NumPy reader does not decode.
+
+    :return: DBF or dbfread.DBF, both iterate over record dicts and have field_names
+    """
+    try:
+        return DBF(path, encoding=encoding)
+    except UnsupportedFieldType:
+        return dbfread.DBF(path, encoding=encoding)
@@ -1,47 +1,293 @@
 import csv
+import itertools
+import json
+import re
 import sys
 
-import dbfread
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typer
 from rich.console import Console
 from rich.table import Table
 
+from . import columnar
+from . import dbf
+from .fetch_gis import bom_source
 from .fetch_gis import get_source_file_name
 from .output import emit_json
 from .output import is_json_mode
+from .output import print_success
 
+# Rows per Parquet row group, bounds the memory of a dump
+PARQUET_ROW_GROUP_SIZE = 50_000
 
-def dump_to_csv(data_type):
+# Records per tabledump page
+DEFAULT_PAGE_SIZE = 50
+
+# Records sampled to size the tabledump columns, and the widest a column gets
+WIDTH_SAMPLE_SIZE = 200
+MAX_COLUMN_WIDTH = 40
+
+# Buffer of the text writers used for --output files
+WRITE_BUFFER_SIZE = 1 << 20
+
+FILTER_PATTERN = re.compile(r"^\s*([^=!]+?)\s*(!=|=)\s*(.*?)\s*$")
+
+
+def read_records(data_type, columns=None, start=0, stop=None):
     """
-    Write spatial data to stdout
+    Read the attribute records of a spatial layer, from its GeoParquet copy
+    when that is fresh, else from the DBF file.
+
     :param data_type:
-    :return:
+    :param columns: decode only these columns, where the source allows
+    :param start: index of the first record to read
+    :param stop: index after the last record to read, default the end
+    :return: (field names, iterator of records)
+    """
+    file_name = bom_source[data_type][0]
+    if columnar.is_fresh(file_name):
+        return columnar.attribute_columns(file_name), columnar.iter_records(file_name, columns, start, stop)
+    table = dbf.open_dbf(get_source_file_name(data_type))
+    if isinstance(table, dbf.DBF):
+        return table.field_names, table.iter_records(columns, start, stop)
+    return table.field_names, itertools.islice(table, start, stop)
+
+
+def count_records(data_type):
+    """:return: number of records of a spatial layer"""
+    file_name = bom_source[data_type][0]
+    if columnar.is_fresh(file_name):
+        return columnar.count_records(file_name)
+    table = dbf.open_dbf(get_source_file_name(data_type))
+    return len(table) if isinstance(table, dbf.DBF) else sum(1 for _ in table)
+
+
+def _match_columns(names, field_names):
+    """
+    :return: *names* spelled as in *field_names*, matched case-insensitively
+    :raises ValueError: for names that are not fields
+    """
+    lookup = {field.lower(): field for field in field_names}
+    unknown = [name for name in names if name.lower() not in lookup]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(field_names)}")
+    return [lookup[name.lower()] for name in names]
+
+
+def parse_filters(expressions, field_names):
+    """
+    Parse ``COLUMN=VALUE`` and ``COLUMN!=VALUE`` filters. Values may be quoted
+    and are compared with the text of the field.
+
+    :return: list of (field name, negate, value)
+    :raises ValueError: for malformed filters and unknown columns
     """
-    source_file = get_source_file_name(data_type)
-    table = dbfread.DBF(source_file)
-    writer = csv.writer(sys.stdout)
+    filters = []
+    for expression in expressions:
+        match = FILTER_PATTERN.match(expression)
+        if match is None:
+            raise ValueError(f"Invalid filter '{expression}', expected COLUMN=VALUE or COLUMN!=VALUE")
+        column, operator, value = match.groups()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        filters.append((_match_columns([column], field_names)[0], operator == "!=", value))
+    return filters
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _matches(record, filters):
+    return all((_text(record.get(column)) == value) != negate for column, negate, value in filters)
+
 
-    writer.writerow(table.field_names)
-    for record in table:
-        writer.writerow(list(record.values()))
+def _write_csv(field_names, records, out):
+    writer = csv.writer(out)
+    writer.writerow(field_names)
+    for record in records:
+        writer.writerow([record.get(name) for name in field_names])
 
 
-def dump_to_table(data_type):
+def _write_ndjson(field_names, records, out):
+    for record in records:
+        out.write(json.dumps({name: record.get(name) for name in field_names}, default=str, ensure_ascii=False) + "\n")
+
+
+def _parquet_schema(rows, field_names):
+    """Infer the schema from the first row group, columns that are all empty there become strings."""
+    if not rows:
+        return pa.schema([(name, pa.string()) for name in field_names])
+    schema = pa.Table.from_pylist(rows).select(field_names).schema
+    return pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema])
+
+
+def _write_parquet(field_names, records, out):
+    records = iter(records)
+    writer = None
+    try:
+        while True:
+            rows = [{name: record.get(name) for name in field_names} for record in itertools.islice(records, PARQUET_ROW_GROUP_SIZE)]
+            if writer is None:
+                writer = pq.ParquetWriter(out, _parquet_schema(rows, field_names))
+            if not rows:
+                break
+            writer.write_table(pa.Table.from_pylist(rows, schema=writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_records(field_names, records, out, output_format="csv"):
+    """
+    Stream records to *out* as they come.
+
+    :param field_names: columns to write, in order
+    :param records: iterable of dicts
+    :param out: text stream, binary stream for parquet
+    :param output_format: "csv", "ndjson" or "parquet", which writes a row group per PARQUET_ROW_GROUP_SIZE records
+    """
+    if output_format == "parquet":
+        _write_parquet(field_names, records, out)
+    elif output_format == "ndjson":
+        _write_ndjson(field_names, records, out)
+    else:
+        _write_csv(field_names, records, out)
+    out.flush()
+
+
+def dump_to_csv(data_type, columns=None, where=None, output_format="csv", output_path=None):
+    """
+    Write spatial data to stdout or a file, in constant memory.
+
+    :param data_type:
+    :param columns: columns to write, case-insensitive, default all
+    :param where: list of COLUMN=VALUE / COLUMN!=VALUE filters, all must match
+    :param output_format: "csv", "ndjson" or "parquet"
+    :param output_path: file to write, default stdout
+    :raises ValueError: for unknown columns and malformed filters
+    """
+    # records are read lazily, only the field names are needed to resolve the projection
+    field_names, _ = read_records(data_type)
+    selected = _match_columns(columns, field_names) if columns else field_names
+    filters = parse_filters(where or [], field_names)
+    needed = list(dict.fromkeys([*selected, *(column for column, _n, _v in filters)]))
+
+    _, records = read_records(data_type, columns=needed)
+    if filters:
+        records = (record for record in records if _matches(record, filters))
+
+    if output_path is None:
+        out = sys.stdout.buffer if output_format == "parquet" else sys.stdout
+        write_records(selected, records, out, output_format)
+        return
+    if output_format == "parquet":
+        with open(output_path, "wb") as out:
+            write_records(selected, records, out, output_format)
+    else:
+        with open(output_path, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as out:
+            write_records(selected, records, out, output_format)
+    print_success(f"Wrote {output_path}")
+
+
+def _column_widths(field_names, sample):
+    """Size the table columns from a sample of records, capped at MAX_COLUMN_WIDTH."""
+    widths = {name: len(name) for name in field_names}
+    for record in sample:
+        for name in field_names:
+            widths[name] = max(widths[name], len(str(record.get(name))))
+    return {name: min(width, MAX_COLUMN_WIDTH) for name, width in widths.items()}
+
+
+def _build_table(field_names, records, widths=None, caption=None):
+    """Without *widths* Rich sizes the columns and wraps long values, with them values are cut to fit."""
+    rich_table = Table(show_header=True, header_style="bold cyan", caption=caption)
+    for name in field_names:
+        if widths is None:
+            rich_table.add_column(name)
+        else:
+            rich_table.add_column(name, width=widths[name], no_wrap=True, overflow="ellipsis")
+    for record in records:
+        rich_table.add_row(*[str(record.get(name)) for name in field_names])
+    return rich_table
+
+
+def _page_count(page_size, total):
+    return max((total + page_size - 1) // page_size, 1)
+
+
+def _page_caption(page, page_size, total):
+    pages = _page_count(page_size, total)
+    first = min((page - 1) * page_size + 1, total)
+    last = min(page * page_size, total)
+    return f"Page {page} of {pages}, rows {first}-{last} of {total}"
+
+
+def _run_pager(data_type, field_names, widths, page_size, total, console, page=1):
+    """Show one page at a time, reading only its records, until the user quits."""
+    pages = _page_count(page_size, total)
+    page = min(page, pages)
+    while True:
+        _, records = read_records(data_type, start=(page - 1) * page_size, stop=page * page_size)
+        console.clear()
+        console.print(_build_table(field_names, records, widths, caption=_page_caption(page, page_size, total)))
+        console.print("n/space next, p previous, g first, G last, q quit", style="cyan")
+        key = typer.getchar()
+        if key in ("q", "Q", "\x1b", "\x03"):
+            return
+        if key in ("n", " ", "j", "\r", "\x1b[C", "\x1b[B"):
+            page = min(page + 1, pages)
+        elif key in ("p", "b", "k", "\x1b[D", "\x1b[A"):
+            page = max(page - 1, 1)
+        elif key == "g":
+            page = 1
+        elif key == "G":
+            page = pages
+
+
+def dump_to_table(data_type, page=None, page_size=None, interactive=False):
     """
     Write spatial data as a Rich table, or JSON in --json mode.
+
+    With *page* only that page of records is read and shown, and *interactive*
+    pages through the layer on a terminal, one page in memory at a time. Pages
+    share column widths taken from the first WIDTH_SAMPLE_SIZE records, the
+    whole table wraps long values instead.
+
     :param data_type:
+    :param page: 1-based page to show, default the whole table
+    :param page_size: records per page, default DEFAULT_PAGE_SIZE
+    :param interactive: run the pager, when stdout is a terminal
     :return:
+    :raises ValueError: if *page* is past the last page, outside the pager
     """
-    source_file = get_source_file_name(data_type)
-    dbf = dbfread.DBF(source_file)
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    start, stop = ((page - 1) * page_size, page * page_size) if page else (0, None)
+    console = Console()
+    # the pager opens a page past the end on the last page instead
+    interactive = interactive and console.is_terminal and not is_json_mode()
+    if page and not interactive:
+        pages = _page_count(page_size, count_records(data_type))
+        if page > pages:
+            raise ValueError(f"Page {page} is past the last page, {data_type} has {pages} page(s) of {page_size} rows")
 
     if is_json_mode():
-        emit_json([dict(record) for record in dbf])
+        _, records = read_records(data_type, start=start, stop=stop)
+        emit_json(dict(record) for record in records)
         return
 
-    rich_table = Table(show_header=True, header_style="bold cyan")
-    for name in dbf.field_names:
-        rich_table.add_column(name)
-    for record in dbf:
-        rich_table.add_row(*[str(v) for v in record.values()])
+    if not page and not interactive:
+        field_names, records = read_records(data_type)
+        console.print(_build_table(field_names, records))
+        return
+
+    field_names, sample = read_records(data_type, stop=WIDTH_SAMPLE_SIZE)
+    widths = _column_widths(field_names, sample)
+
+    if interactive:
+        _run_pager(data_type, field_names, widths, page_size, count_records(data_type), console, page or 1)
+        return
 
-    Console().print(rich_table)
+    _, records = read_records(data_type, start=start, stop=stop)
+    console.print(_build_table(field_names, records, widths, caption=_page_caption(page, page_size, count_records(data_type))))
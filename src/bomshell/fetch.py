@@ -1,57 +1,226 @@
+import contextlib
 import os
+import posixpath
+import shutil
+import threading
 
 import ftputil
 import ftputil.error
 
 from . import settings
-from .output import print_error
 from .output import print_warning
 
+# Suffix of in-flight downloads, renamed into place when complete
+PARTIAL_SUFFIX = ".part"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
-def remove_existing_file(cache_file_name, overwrite):
+
+class FetchError(Exception):
+    """A file could not be fetched from the FTP server."""
+
+    def __init__(self, filename, reason):
+        super().__init__(f"{filename}: {reason}")
+        self.filename = filename
+        self.reason = reason
+
+
+class FTPSession:
+    """A single FTP login that is reused for every download from one server.
+
+    The connection is opened lazily on first use and kept alive until the
+    session is closed. If the server drops the link mid-run, the operation is
+    retried once on a fresh connection.
+    """
+
+    def __init__(self, ftp_server, ftp_user="anonymous", ftp_password=""):
+        self.ftp_server = ftp_server
+        self.ftp_user = ftp_user
+        self.ftp_password = ftp_password
+        self._host = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def host(self):
+        """The live ``ftputil.FTPHost``, connecting if needed."""
+        if self._host is None:
+            self._host = ftputil.FTPHost(
+                host=self.ftp_server,
+                user=self.ftp_user,
+                passwd=self.ftp_password,
+                timeout=settings.FTP_TIMEOUT,
+            )
+        return self._host
+
+    def close(self):
+        if self._host is not None:
+            with contextlib.suppress(ftputil.error.FTPError):
+                self._host.close()  # the link may already be gone
+            self._host = None
+
+    def run(self, operation):
+        """
+        Call ``operation(host)``, reconnecting once if the link was dropped.
+
+        :param operation: callable taking an ``ftputil.FTPHost``
+        :return: whatever ``operation`` returns
+        """
+        try:
+            return operation(self.host)
+        except ftputil.error.FTPOSError:
+            self.close()
+            if settings.VERBOSE:
+                print_warning(f"Lost connection to {self.ftp_server}, reconnecting")
+            return operation(self.host)
+
+
+class FTPSessionPool:
+    """Hands each worker thread its own FTPSession, one control connection per thread."""
+
+    def __init__(self, ftp_server, ftp_user="anonymous", ftp_password=""):
+        self.ftp_server = ftp_server
+        self.ftp_user = ftp_user
+        self.ftp_password = ftp_password
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def session(self):
+        """The calling thread's session, created on first use."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = FTPSession(self.ftp_server, ftp_user=self.ftp_user, ftp_password=self.ftp_password)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+
+def needs_download(cache_file_name, overwrite):
     """Check if file exists and handle accordingly.
 
+    An existing file is never removed here, it is only replaced once a complete
+    download is in place.
+
     Returns True if we should proceed with download, False to skip.
     """
-    if os.path.isfile(cache_file_name):
-        if overwrite:
-            os.remove(cache_file_name)
-            return True
-        else:
-            if settings.VERBOSE:
-                print_warning(f"Skipping {cache_file_name} (already exists)")
-            return False
+    if os.path.isfile(cache_file_name) and not overwrite:
+        if settings.VERBOSE:
+            print_warning(f"Skipping {cache_file_name} (already exists)")
+        return False
     return True
 
 
-def get_file(directory, filename, ftp_server, ftp_user="anonymous", ftp_password=""):
+def stat_remote(session, directory, filenames):
+    """
+    Look up size and modification time of remote files.
+
+    ftputil caches the directory listing, so this costs one LIST per directory
+    no matter how many files are asked for.
+
+    :param session: an open FTPSession
+    :param directory: remote directory
+    :param filenames: names of the files in that directory
+    :return: dict of filename to {"size": bytes, "mtime": epoch seconds}, missing files are left out
+    :raises FetchError: if the server could not be reached
+    """
+
+    def stat(ftp_host):
+        stats = {}
+        for filename in filenames:
+            remote_file = posixpath.join(directory, filename)
+            if ftp_host.path.exists(remote_file):
+                stats[filename] = {
+                    "size": ftp_host.path.getsize(remote_file),
+                    "mtime": ftp_host.path.getmtime(remote_file),
+                }
+        return stats
+
+    try:
+        return session.run(stat)
+    except ftputil.error.FTPOSError as e:
+        raise FetchError(directory, "FTP timeout") from e
+
+
+def get_file(directory, filename, ftp_server, ftp_user="anonymous", ftp_password="", session=None, overwrite=None):
     """
-    :param config:
     :param directory:
     :param filename:
     :param ftp_server:
     :param ftp_user:
     :param ftp_password:
-    :return:
+    :param session: an open FTPSession to reuse, a one-off session is used if None
+    :param overwrite: replace a cached copy, defaults to settings.OVERWRITE
+    :return: True if the file is in the cache, False if it is not on the server
+    :raises FetchError: if the transfer failed
     """
 
     os.makedirs(settings.SPATIAL_CACHE, exist_ok=True)
     target_file = os.path.join(settings.SPATIAL_CACHE, filename)
 
-    if not remove_existing_file(target_file, settings.OVERWRITE):
+    if overwrite is None:
+        overwrite = settings.OVERWRITE
+    if not needs_download(target_file, overwrite):
         return True  # File exists and we're not overwriting, skip
 
+    if session is None:
+        with FTPSession(ftp_server, ftp_user=ftp_user, ftp_password=ftp_password) as session:
+            return _download(session, directory, filename, target_file)
+    return _download(session, directory, filename, target_file)
+
+
+def _download(session, directory, filename, target_file):
+    """
+    Download into ``target_file + PARTIAL_SUFFIX`` and rename it into place once
+    complete. A partial file left by an interrupted transfer is resumed with
+    FTP REST, unless the remote file changed since it was written.
+    """
+    remote_file = posixpath.join(directory, filename)
+    partial_file = target_file + PARTIAL_SUFFIX
+
+    def download(ftp_host):
+        if not ftp_host.path.exists(remote_file):
+            if settings.VERBOSE:
+                print_warning(f"File not found on server: {filename}")
+            return False
+
+        remote_size = ftp_host.path.getsize(remote_file)
+        offset = os.path.getsize(partial_file) if os.path.isfile(partial_file) else 0
+        if offset and (offset > remote_size or os.path.getmtime(partial_file) < ftp_host.path.getmtime(remote_file)):
+            offset = 0  # stale partial download of an older version
+        if offset and settings.VERBOSE:
+            print_warning(f"Resuming {filename} at {offset} of {remote_size} bytes")
+
+        with open(partial_file, "ab" if offset else "wb") as target:
+            if offset < remote_size:
+                with ftp_host.open(remote_file, "rb", rest=offset or None) as source:
+                    shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+
+        local_size = os.path.getsize(partial_file)
+        if local_size != remote_size:
+            if local_size > remote_size:
+                os.remove(partial_file)
+            raise FetchError(filename, f"size mismatch, got {local_size} of {remote_size} bytes")
+        os.replace(partial_file, target_file)
+        return True
+
     try:
-        with ftputil.FTPHost(host=ftp_server, user=ftp_user, passwd=ftp_password, timeout=settings.FTP_TIMEOUT) as ftp_host:
-            ftp_host.chdir(directory)
-            if not ftp_host.path.exists(filename):
-                if settings.VERBOSE:
-                    print_warning(f"File not found on server: {filename}")
-                return False
-            ftp_host.download(filename, target_file)
-            return True
-    except ftputil.error.FTPOSError:
-        print_error(f"FTP timeout fetching {filename}")
-        print_error("Consider using the --ftp-timeout option")
-        print_error("or increasing the FTP_TIMEOUT value in .bomshell")
-        return False
+        return session.run(download)
+    except ftputil.error.FTPOSError as e:
+        raise FetchError(filename, "FTP timeout") from e
@@ -1,12 +1,30 @@
+import json
 import os
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from itertools import islice
 
 import dataset
-import dbfread
+import geopandas as gpd
+import shapely
 
+from . import columnar
+from . import dbf
 from . import fetch
+from . import map_cache
 from . import settings
+from . import spatial_db
+from .output import emit_json
+from .output import is_json_mode
 from .output import print_error
 from .output import print_info
+from .output import print_success
+from .output import print_warning
+from .visualize import SPATIAL_CONFIGS
 
 # spatial database directives, from here a single sqllite db is built
 bom_source = {
@@ -29,6 +47,22 @@ spatial_root = "/anon/home/adfd/spatial/"
 # Shapefile components to fetch
 SHAPEFILE_EXTENSIONS = [".dbf", ".shp", ".shx", ".prj"]
 
+# Rows per executemany when packing a layer into the database
+INSERT_BATCH_SIZE = 5000
+
+# Page size of a new database, an existing one keeps its own as changing it takes a VACUUM
+NEW_DATABASE_PRAGMAS = [
+    "PRAGMA page_size = 8192",
+]
+
+# SQLite tuning for the bulk build, the database is rebuilt from the cache on failure
+BUILD_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+]
+
 
 def get_gis_types():
     """
@@ -46,44 +80,317 @@ def get_source_file_name(data_type, file_extention=".dbf"):
     return os.path.join(settings.SPATIAL_CACHE, source_file + file_extention)
 
 
-def __fetch_file(file_name, file_extention=".dbf"):
+def __fetch_file(file_name, file_extention=".dbf", session=None, overwrite=None):
     """
     :param file_name: Fetch file
+    :param session: FTPSession to fetch with
+    :param overwrite: replace a cached copy, defaults to settings.OVERWRITE
+    :return: True if the file is in the cache, False if it is not on the server
     """
 
     file_name = file_name + file_extention
-    fetch.get_file(filename=file_name, directory=spatial_root, ftp_server=ftp_server)
+    return fetch.get_file(filename=file_name, directory=spatial_root, ftp_server=ftp_server, session=session, overwrite=overwrite)
+
+
+def __fetch_files(jobs, workers=None, overwrite=None):
+    """
+    Download shapefile components on a pool of worker threads, each holding its
+    own FTP control connection. Failures are collected and reported once all
+    transfers are done.
+
+    :param jobs: list of (file_name, file_extention, description)
+    :param workers: number of concurrent downloads, defaults to settings.FTP_WORKERS
+    :param overwrite: replace cached copies, defaults to settings.OVERWRITE
+    :return: list of FetchError for the files that could not be fetched
+    """
+    workers = max(1, workers or settings.FTP_WORKERS)
+    errors = []
 
+    with fetch.FTPSessionPool(ftp_server) as pool, ThreadPoolExecutor(max_workers=workers) as executor:
 
-def fetch_spatial_data(lookup_source=bom_source):
+        def fetch_one(file_name, ext):
+            return __fetch_file(file_name, file_extention=ext, session=pool.session(), overwrite=overwrite)
+
+        futures = {executor.submit(fetch_one, file_name, ext): (file_name + ext, description) for file_name, ext, description in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            file_name, description = futures[future]
+            try:
+                status = "ok" if future.result() else "not on server"
+            except fetch.FetchError as e:
+                errors.append(e)
+                status = e.reason
+            print_info(f"[{done}/{len(jobs)}] {description}: {file_name} {status}")
+
+    if errors:
+        print_error(f"Failed to fetch {len(errors)} of {len(jobs)} files:")
+        for e in sorted(errors, key=lambda e: e.filename):
+            print_error(f"  {e}")
+        print_error("Consider using the --ftp-timeout option")
+        print_error("or increasing the FTP_TIMEOUT value in .bomshell")
+    return errors
+
+
+def fetch_spatial_data(lookup_source=bom_source, workers=None):
     """
     Fetches the spatial data from BOM including all shapefile components.
 
-    :param cache: Where to drop the file
+    The remote size and modification time of each downloaded file go into the
+    manifest, so a following sync only transfers what changed since.
+
     :param lookup_source: A lookup dict specifying where on BOM's site the lookups are
+    :param workers: number of concurrent downloads, defaults to settings.FTP_WORKERS
+    :return: list of FetchError for the files that could not be fetched
     """
     print_info(f"Writing spatial data to: {settings.SPATIAL_CACHE}")
-    for _name, (file_name, description) in lookup_source.items():
-        print_info(f"Fetching {description}")
-        for ext in SHAPEFILE_EXTENSIONS:
-            __fetch_file(file_name, file_extention=ext)
+    jobs = [(file_name, ext, description) for file_name, description in lookup_source.values() for ext in SHAPEFILE_EXTENSIONS]
+    names = [file_name + ext for file_name, ext, _description in jobs]
+
+    with fetch.FTPSession(ftp_server) as session:
+        try:
+            remote = fetch.stat_remote(session, spatial_root, names)
+        except fetch.FetchError as e:
+            print_error(f"Could not list {spatial_root} on {ftp_server}: {e.reason}")
+            return [e]
+
+    # cached copies kept without overwriting were not fetched now, their manifest entries stay as they are
+    kept = set() if settings.OVERWRITE else {name for name in names if os.path.isfile(os.path.join(settings.SPATIAL_CACHE, name))}
+    errors = __fetch_files(jobs, workers=workers)
+    failed = {e.filename for e in errors}
+
+    manifest = load_manifest()
+    for name in names:
+        if name in remote and name not in failed and name not in kept:
+            manifest[name] = remote[name]
+    save_manifest(manifest)
+    return errors
+
+
+def load_manifest(manifest=None):
+    """
+    :param manifest: manifest path, defaults to settings.SPATIAL_MANIFEST
+    :return: dict of cached file name to the remote {"size", "mtime"} it was fetched at
+    """
+    manifest = manifest or settings.SPATIAL_MANIFEST
+    try:
+        with open(manifest) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(entries, manifest=None):
+    """
+    :param entries: dict of cached file name to remote {"size", "mtime"}
+    :param manifest: manifest path, defaults to settings.SPATIAL_MANIFEST
+    """
+    manifest = manifest or settings.SPATIAL_MANIFEST
+    os.makedirs(os.path.dirname(manifest), exist_ok=True)
+    temp_file = manifest + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(temp_file, manifest)
+
+
+def sync_spatial_data(lookup_source=bom_source, workers=None):
+    """
+    Bring the spatial cache up to date with BOM, downloading only the files
+    whose remote size or modification time differ from the local manifest.
+
+    :param lookup_source: A lookup dict specifying where on BOM's site the lookups are
+    :param workers: number of concurrent downloads, defaults to settings.FTP_WORKERS
+    :return: list of FetchError for the files that could not be fetched
+    """
+    print_info(f"Syncing spatial data in: {settings.SPATIAL_CACHE}")
+    descriptions = {file_name + ext: description for file_name, description in lookup_source.values() for ext in SHAPEFILE_EXTENSIONS}
 
+    with fetch.FTPSession(ftp_server) as session:
+        try:
+            remote = fetch.stat_remote(session, spatial_root, list(descriptions))
+        except fetch.FetchError as e:
+            print_error(f"Could not list {spatial_root} on {ftp_server}: {e.reason}")
+            return [e]
 
-def create_spatial_database(database=settings.SPATIAL_DB, file_extention=".dbf"):
+    manifest = load_manifest()
+    changed = sorted(
+        name
+        for name, stat in remote.items()
+        if manifest.get(name) != stat or not os.path.isfile(os.path.join(settings.SPATIAL_CACHE, name))
+    )
+    removed = sorted(name for name in manifest if name in descriptions and name not in remote)
+
+    jobs = [(os.path.splitext(name)[0], os.path.splitext(name)[1], descriptions[name]) for name in changed]
+    errors = __fetch_files(jobs, workers=workers, overwrite=True) if jobs else []
+    failed = {e.filename for e in errors}
+
+    for name in changed:
+        if name not in failed:
+            manifest[name] = remote[name]
+    for name in removed:
+        del manifest[name]
+    save_manifest(manifest)
+
+    updated = [name for name in changed if name not in failed]
+    map_cache.invalidate(sorted({os.path.splitext(name)[0] for name in updated + removed}))
+    if is_json_mode():
+        emit_json({"updated": updated, "removed": removed, "failed": sorted(failed), "unchanged": len(remote) - len(changed)})
+    else:
+        for name in updated:
+            print_success(f"Updated {name} ({descriptions[name]})")
+        for name in removed:
+            print_warning(f"Removed on server {name} ({descriptions[name]})")
+        print_info(f"{len(updated)} updated, {len(removed)} removed, {len(remote) - len(changed)} unchanged")
+    return errors
+
+
+def _record_batches(records, size=INSERT_BATCH_SIZE):
+    """Yield lists of at most *size* records."""
+    records = iter(records)
+    while batch := list(islice(records, size)):
+        yield batch
+
+
+def _read_geometries(shape_file):
+    """Read the feature geometries of a shapefile as WGS84, in file order."""
+    gdf = gpd.read_file(shape_file, columns=[])
+    if gdf.crs and gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    return gdf.geometry
+
+
+def _geometry_rows(geometry):
+    """
+    :return: list of (fid, minx, miny, maxx, maxy, wkb), fid counts features from 1 in file order
+    """
+    rows = []
+    for fid, (shape, bounds) in enumerate(zip(geometry, geometry.bounds.itertuples(index=False), strict=True), 1):
+        if shape is None or shape.is_empty:
+            continue
+        rows.append((fid, *bounds, shapely.to_wkb(shape)))
+    return rows
+
+
+def _decode_layer(source_file, shape_file=None, parquet_file=None, parquet_sources=None):
+    """
+    Decode a DBF file into record batches, and the geometries of its shapefile
+    if there is one. Runs in a build worker process, which also writes the
+    layer's GeoParquet copy when *parquet_file* is given, recording the
+    signature of *parquet_sources* with it (see columnar.source_files).
+
+    :return: (list of record batches, list of geometry rows, seconds spent decoding)
+    """
+    start = time.perf_counter()
+    records = list(dbf.open_dbf(source_file))
+    batches = list(_record_batches({key.lower(): value for key, value in record.items()} for record in records))
+    geometry = _read_geometries(shape_file) if shape_file else None
+    if parquet_file:
+        columnar.write_layer(parquet_file, records, geometry, sources=parquet_sources)
+    geometries = _geometry_rows(geometry) if geometry is not None else []
+    return batches, geometries, time.perf_counter() - start
+
+
+def _decoded_layers(executor, layers, window):
+    """
+    Decode *layers* on *executor*, yielding (layer, future) in order. At most
+    *window* layers are submitted ahead of the one being yielded, so decoded
+    layers waiting for the writer do not pile up in memory.
+    """
+    pending = deque()
+    for layer in layers:
+        pending.append((layer, executor.submit(_decode_layer, *layer[2:4], *layer[5:7])))
+        if len(pending) > window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+
+def _layer_sources(file_name, file_extention=".dbf"):
+    """
+    :return: (attribute file, shape file or None, all files the layer is built from)
+    """
+    source_file = os.path.join(settings.SPATIAL_CACHE, file_name + file_extention)
+    shape_file = os.path.join(settings.SPATIAL_CACHE, file_name + ".shp")
+    if not os.path.isfile(shape_file):
+        return source_file, None, [source_file]
+    prj_file = os.path.join(settings.SPATIAL_CACHE, file_name + ".prj")
+    return source_file, shape_file, [source_file, shape_file] + ([prj_file] if os.path.isfile(prj_file) else [])
+
+
+def create_spatial_database(database=None, file_extention=".dbf", workers=None, force=False):
     """
     Create a SQL spatial database from the BOM spatial database
 
-    :param: destination
+    Each layer gets its attribute table plus, when the shapefile was fetched,
+    a WGS84 geometry table and an R-tree over the feature bounding boxes (see
+    spatial_db). Every layer is also written as GeoParquet (see columnar).
+
+    Only layers whose source files changed since they were last packed are
+    dropped and reloaded, so rebuilding is idempotent and cheap after a sync.
+    Stale layers are decoded in parallel by a pool of worker processes and
+    handed to a single writer in ``bom_source`` order, so the result does not
+    depend on scheduling. Only about one layer per worker is decoded ahead of
+    the writer. All layers are written over one connection, each
+    layer in a single transaction with batched inserts.
+
+    :param database: destination, defaults to settings.SPATIAL_DB
+    :param workers: decoding processes, defaults to settings.BUILD_WORKERS, 0 is one per CPU
+    :param force: reload every layer even if its source is unchanged
     """
+    database = database or settings.SPATIAL_DB
+    workers = settings.BUILD_WORKERS if workers is None else workers
     print_info(f"Building database: {database}")
-    for name, (file_name, description) in bom_source.items():
-        print_info(f"Packing {description} into local DB")
-        source_file = os.path.join(settings.SPATIAL_CACHE, file_name + file_extention)
-        db = dataset.connect("sqlite:///" + database)
-        table = db[name]
+    build_start = time.perf_counter()
+    pragmas = BUILD_PRAGMAS if os.path.exists(database) else NEW_DATABASE_PRAGMAS + BUILD_PRAGMAS
+    db = dataset.connect("sqlite:///" + database, on_connect_statements=list(pragmas))
 
-        for record in dbfread.DBF(source_file, lowernames=True):
-            try:
-                table.insert(record)
-            except Exception as e:
-                print_error(f"{e.args[0]} ")
+    try:
+        spatial_db.ensure_schema(db)
+        layers = []
+        for name, (file_name, description) in bom_source.items():
+            source_file, shape_file, source_files = _layer_sources(file_name, file_extention)
+            if not os.path.isfile(source_file):
+                print_warning(f"Skipping {description}, {source_file} has not been fetched")
+            elif not force and spatial_db.is_layer_current(db, name, source_files) and columnar.is_fresh(file_name):
+                print_info(f"{description} is up to date")
+            else:
+                parquet = (columnar.parquet_path(file_name), columnar.source_files(file_name))
+                layers.append((name, description, source_file, shape_file, source_files, *parquet))
+
+        # a single worker decodes on a thread, overlapping with the writer without process start-up cost
+        executor_class = ThreadPoolExecutor if workers == 1 else ProcessPoolExecutor
+        with executor_class(max_workers=workers or None) as executor:
+            decoded = _decoded_layers(executor, layers, window=workers or os.cpu_count() or 1)
+            for (name, description, _source_file, shape_file, source_files, *_parquet), future in decoded:
+                try:
+                    batches, geometries, decode_seconds = future.result()
+                    write_start = time.perf_counter()
+                    count = sum(len(batch) for batch in batches)
+                    # the old tables are dropped in the same transaction, so a failed reload keeps them
+                    with db, warnings.catch_warnings():
+                        # dataset warns on DDL inside a transaction while threads run, but only this one uses db
+                        warnings.filterwarnings("ignore", "Changing the database schema", RuntimeWarning)
+                        spatial_db.clear_layer(db, name)
+                        table = db[name]
+                        for column, value in (batches[0][0] if batches else {}).items():
+                            table.create_column_by_example(column, value)
+                        if shape_file:
+                            spatial_db.create_geometry_tables(db, name)
+                        # ids count from 1 in DBF order, matching the geometry fids
+                        for batch in batches:
+                            table.insert_many(batch, chunk_size=INSERT_BATCH_SIZE)
+                        spatial_db.insert_geometries(db, name, geometries)
+                        spatial_db.create_column_indexes(db, name, table.columns)
+                        name_column = SPATIAL_CONFIGS[name]["name"].lower()
+                        records = (record for batch in batches for record in batch)
+                        spatial_db.insert_names(db, name, [(fid, r.get(name_column)) for fid, r in enumerate(records, 1)])
+                        spatial_db.set_layer_state(db, name, source_files, records=count)
+                except Exception as e:
+                    print_error(f"Failed to pack {description}: {e}")
+                    continue
+                print_info(
+                    f"Packed {description} into local DB ({count} records, {len(geometries)} geometries, "
+                    f"decoded in {decode_seconds:.2f}s, written in {time.perf_counter() - write_start:.2f}s)"
+                )
+    finally:
+        db.close()
+
+    print_success(f"Built {database} in {time.perf_counter() - build_start:.2f}s")
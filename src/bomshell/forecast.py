@@ -2,17 +2,28 @@ from datetime import datetime
 
 import requests
 
+from . import http_cache
+from . import settings
+
 BOM_API_BASE = "https://api.weather.bom.gov.au/v1"
 _SESSION = requests.Session()
 _SESSION.headers.update({"Accept": "application/json"})
 
 
 def search_location(query: str) -> list[dict]:
-    """Search BOM for a location by name."""
-    resp = _SESSION.get(f"{BOM_API_BASE}/locations", params={"search": query})
-    resp.raise_for_status()
-    data = resp.json().get("data", [])
-    return [
+    """Search BOM for a location by name, cached for settings.LOCATION_CACHE_TTL."""
+    return fetch_locations(query)[0]
+
+
+def fetch_locations(query: str) -> tuple[list[dict], str]:
+    """
+    Search BOM for a location by name, see search_location.
+
+    :return: (locations, how the cache answered: http_cache.HIT, REVALIDATED, MISS or STALE)
+    """
+    body, status = http_cache.get_json(_SESSION, f"{BOM_API_BASE}/locations", params={"search": query}, ttl=settings.LOCATION_CACHE_TTL)
+    data = body.get("data", [])
+    locations = [
         {
             "geohash": loc["geohash"],
             "name": loc["name"],
@@ -21,13 +32,21 @@ def search_location(query: str) -> list[dict]:
         }
         for loc in data
     ]
+    return locations, status
 
 
 def get_daily_forecast(geohash: str) -> dict:
-    """Fetch the 7-day daily forecast for a location geohash."""
-    resp = _SESSION.get(f"{BOM_API_BASE}/locations/{geohash}/forecasts/daily")
-    resp.raise_for_status()
-    return resp.json()
+    """Fetch the 7-day daily forecast for a location geohash, cached for settings.FORECAST_CACHE_TTL."""
+    return fetch_daily_forecast(geohash)[0]
+
+
+def fetch_daily_forecast(geohash: str) -> tuple[dict, str]:
+    """
+    Fetch the 7-day daily forecast for a location geohash, see get_daily_forecast.
+
+    :return: (forecast, how the cache answered: http_cache.HIT, REVALIDATED, MISS or STALE)
+    """
+    return http_cache.get_json(_SESSION, f"{BOM_API_BASE}/locations/{geohash}/forecasts/daily", ttl=settings.FORECAST_CACHE_TTL)
 
 
 def format_forecast(location: dict, forecast_data: dict) -> str:
@@ -0,0 +1,156 @@
+"""On-disk cache of BOM API responses.
+
+Every JSON response is stored under settings.HTTP_CACHE with the time it
+stays fresh and its ETag / Last-Modified validators. A fresh entry is
+returned without a request. A stale one is revalidated with If-None-Match /
+If-Modified-Since, and a 304 answer refreshes it without transferring the
+body again.
+
+Freshness comes from the response's Cache-Control max-age or Expires header,
+else the TTL the caller passes; ``no-store`` responses are not cached and
+``no-cache`` ones are revalidated every time, as is every entry when
+settings.HTTP_CACHE_REFRESH is set. When the API cannot be reached
+a stale entry is returned rather than failing. The cache is kept under
+settings.HTTP_CACHE_MB, dropping the least recently used entries first.
+"""
+
+import contextlib
+import email.utils
+import hashlib
+import json
+import os
+import time
+from typing import Any
+
+import requests
+
+from . import settings
+
+# How a response was answered, see get_json
+HIT = "hit"
+REVALIDATED = "revalidated"
+MISS = "miss"
+STALE = "stale"
+
+
+def _entry_path(url: str, params: dict | None) -> str:
+    key = json.dumps([url, sorted((params or {}).items())])
+    return os.path.join(settings.HTTP_CACHE, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _read_entry(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(path: str, entry: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    os.replace(temp_path, path)
+
+
+def _lifetime(headers, ttl: int) -> int | None:
+    """
+    :return: seconds a response stays fresh, None if it must not be stored
+    """
+    directives = {}
+    for part in headers.get("Cache-Control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    with contextlib.suppress(ValueError):
+        if "max-age" in directives:
+            return max(int(directives["max-age"]), 0)
+    with contextlib.suppress(TypeError, ValueError):
+        if "Expires" in headers:
+            expires = email.utils.parsedate_to_datetime(headers["Expires"]).timestamp()
+            date = email.utils.parsedate_to_datetime(headers["Date"]).timestamp() if "Date" in headers else time.time()
+            return max(int(expires - date), 0)
+    return ttl
+
+
+def get_json(session: requests.Session, url: str, params: dict | None = None, ttl: int = 0) -> tuple[Any, str]:
+    """
+    GET a JSON document through the cache.
+
+    :param session: session to make requests with
+    :param params: query parameters, part of the cache key
+    :param ttl: seconds a response stays fresh when it has no Cache-Control max-age or Expires
+    :return: (decoded JSON, HIT, REVALIDATED, MISS or STALE)
+    :raises requests.RequestException: if the request fails and nothing is cached
+    """
+    path = _entry_path(url, params)
+    entry = _read_entry(path)
+    now = time.time()
+    if entry is not None and not settings.HTTP_CACHE_REFRESH and now < entry["expires"]:
+        _touch(path)
+        return entry["body"], HIT
+
+    kwargs: dict[str, Any] = {}
+    if params is not None:
+        kwargs["params"] = params
+    if entry is not None:
+        validators = {"If-None-Match": entry.get("etag"), "If-Modified-Since": entry.get("last_modified")}
+        headers = {name: value for name, value in validators.items() if value}
+        if headers:
+            kwargs["headers"] = headers
+
+    try:
+        resp = session.get(url, **kwargs)
+        if entry is not None and resp.status_code == 304:
+            entry["expires"] = now + (_lifetime(resp.headers, ttl) or 0)
+            entry["etag"] = resp.headers.get("ETag", entry.get("etag"))
+            entry["last_modified"] = resp.headers.get("Last-Modified", entry.get("last_modified"))
+            _write_entry(path, entry)
+            return entry["body"], REVALIDATED
+        resp.raise_for_status()
+        body = resp.json()
+    except requests.RequestException:
+        if entry is None:
+            raise
+        return entry["body"], STALE
+
+    if resp.status_code == 200:
+        lifetime = _lifetime(resp.headers, ttl)
+        if lifetime is not None:
+            entry = {
+                "url": url,
+                "params": params,
+                "expires": now + lifetime,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "body": body,
+            }
+            _write_entry(path, entry)
+            evict()
+    return body, MISS
+
+
+def _touch(path: str) -> None:
+    # the mtime orders entries for eviction
+    with contextlib.suppress(OSError):
+        os.utime(path)
+
+
+def evict(max_bytes: int | None = None) -> None:
+    """Drop the least recently used entries until the cache fits in *max_bytes*, default settings.HTTP_CACHE_MB."""
+    max_bytes = settings.HTTP_CACHE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    try:
+        entries = [entry for entry in os.scandir(settings.HTTP_CACHE) if entry.name.endswith(".json")]
+    except FileNotFoundError:
+        return
+    stats = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries), reverse=True)
+    total = sum(size for _mtime, size, _path in stats)
+    while total > max_bytes and stats:
+        _mtime, size, path = stats.pop()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        total -= size
@@ -0,0 +1,244 @@
+"""Point-in-district lookups against the spatial database, single or in bulk."""
+
+import itertools
+import os
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from . import settings
+from . import spatial_db
+from .visualize import SPATIAL_CONFIGS
+from .visualize import read_layer
+
+# Input rows handled per spatial join, bounds the memory of each worker
+LOCATE_CHUNK_SIZE = 50_000
+
+LAT_COLUMNS = ("lat", "latitude", "y")
+LON_COLUMNS = ("lon", "lng", "long", "longitude", "x")
+
+
+def get_polygon_types() -> list[str]:
+    """Return the spatial types made of districts/areas a point can fall in."""
+    return sorted(name for name, config in SPATIAL_CONFIGS.items() if config["type"] == "polygon")
+
+
+class DistrictIndex:
+    """Finds the district of every polygon layer that contains a point.
+
+    Candidates come from the layer R-trees in spatial.sqlite. Their geometries
+    and attributes are decoded and prepared once, so repeated lookups only pay
+    for the R-tree probe and a prepared point-in-polygon test.
+    """
+
+    def __init__(self, database=None, layers=None):
+        """
+        :param layers: polygon layers to search, default all, those built without geometry are skipped
+        :raises FileNotFoundError: if the database has not been built, or none of the layers has geometry
+        """
+        self.conn = spatial_db.connect(database)
+        self.layers = [name for name in (layers or get_polygon_types()) if spatial_db.has_geometry(self.conn, name)]
+        if not self.layers:
+            self.conn.close()
+            raise FileNotFoundError(
+                f"No polygon layer in {database or settings.SPATIAL_DB} has geometry. "
+                "Run 'bomshell spatial fetch' and 'bomshell spatial build' first."
+            )
+        self._geometries = {}
+        self._records = {}
+
+    def _geometry(self, name, fid, wkb):
+        key = (name, fid)
+        geometry = self._geometries.get(key)
+        if geometry is None:
+            geometry = shapely.from_wkb(wkb)
+            shapely.prepare(geometry)
+            self._geometries[key] = geometry
+        return geometry
+
+    def _record(self, name, fid):
+        key = (name, fid)
+        record = self._records.get(key)
+        if record is None:
+            record = spatial_db.get_record(self.conn, name, fid)
+            self._records[key] = record
+        return record
+
+    def locate(self, lat: float, lon: float) -> dict[str, list[dict]]:
+        """
+        :return: dict of layer name to the records of the features covering the point
+        """
+        found = {}
+        for name in self.layers:
+            rows = spatial_db.bbox_candidates(self.conn, name, lon, lat, lon, lat)
+            found[name] = [self._record(name, fid) for fid, wkb in rows if shapely.intersects_xy(self._geometry(name, fid, wkb), lon, lat)]
+        return found
+
+
+_index_cache: dict[tuple, DistrictIndex] = {}
+
+
+def get_index(layers: list[str] | None = None) -> DistrictIndex:
+    """Return a warm DistrictIndex over settings.SPATIAL_DB, shared between calls."""
+    key = (settings.SPATIAL_DB, tuple(layers or ()))
+    if key not in _index_cache:
+        _index_cache[key] = DistrictIndex(layers=layers)
+    return _index_cache[key]
+
+
+def locate(lat: float, lon: float, layers: list[str] | None = None) -> dict[str, list[dict]]:
+    """
+    Find the districts containing a WGS84 coordinate.
+
+    :param lat: latitude in degrees
+    :param lon: longitude in degrees
+    :param layers: polygon layers to search, default all built ones
+    :return: dict of layer name to the matching district records
+    """
+    return get_index(layers).locate(lat, lon)
+
+
+def format_location(lat: float, lon: float, found: dict[str, list[dict]]) -> str:
+    """Format a locate result for terminal display."""
+    lines = [f"{lat}, {lon}", ""]
+    for name, records in found.items():
+        config = SPATIAL_CONFIGS[name]
+        names = [str(record.get(config["name"].lower(), "")) for record in records]
+        aacs = [record.get("aac") for record in records]
+        labels = [f"{n} ({a})" if a else n for n, a in zip(names, aacs, strict=True)]
+        lines.append(f"{config['label']}: {', '.join(labels) if labels else '-'}")
+    return "\n".join(lines)
+
+
+def _polygon_sources(layers: list[str] | None = None) -> dict[str, str]:
+    """
+    :return: dict of polygon layer name to its cached shapefile, for the fetched layers
+    :raises FileNotFoundError: if none of the layers has been fetched
+    """
+    sources = {}
+    for name in layers or get_polygon_types():
+        shp_path = os.path.join(settings.SPATIAL_CACHE, f"{SPATIAL_CONFIGS[name]['file']}.shp")
+        if os.path.exists(shp_path):
+            sources[name] = shp_path
+    if not sources:
+        raise FileNotFoundError(f"No polygon shapefiles in {settings.SPATIAL_CACHE}. Run 'bomshell spatial fetch' first.")
+    return sources
+
+
+def _load_polygons(sources: dict[str, str]) -> dict[str, gpd.GeoDataFrame]:
+    """Load polygon layers with their name (and AAC) columns renamed after the layer."""
+    polygons = {}
+    for name, shp_path in sources.items():
+        config = SPATIAL_CONFIGS[name]
+        columns = {config["name"]: name}
+        if "AAC" in config["popup_fields"]:
+            columns["AAC"] = f"{name}_aac"
+        gdf = read_layer(shp_path, columns=list(columns))
+        gdf = gdf.rename(columns=columns)[[*columns.values(), "geometry"]]
+        _ = gdf.sindex  # build the STRtree once, sjoin reuses it for every chunk
+        polygons[name] = gdf
+    return polygons
+
+
+_worker_polygons: dict[str, gpd.GeoDataFrame] = {}
+
+
+def _init_worker(sources: dict[str, str]) -> None:
+    global _worker_polygons
+    _worker_polygons = _load_polygons(sources)
+
+
+def _locate_chunk(chunk: pd.DataFrame, lat_column: str, lon_column: str) -> pd.DataFrame:
+    """Spatially join a chunk of coordinates against every loaded polygon layer."""
+    points = gpd.GeoDataFrame(
+        index=chunk.index,
+        geometry=gpd.points_from_xy(chunk[lon_column], chunk[lat_column]),
+        crs="EPSG:4326",
+    )
+    result = chunk.copy()
+    for polygons in _worker_polygons.values():
+        joined = gpd.sjoin(points, polygons, how="left", predicate="intersects")
+        # a point on a shared boundary matches both neighbours, keep the first
+        joined = joined[~joined.index.duplicated(keep="first")]
+        for column in polygons.columns.drop("geometry"):
+            result[column] = joined[column]
+    return result
+
+
+def find_column(columns, candidates: tuple[str, ...]) -> str:
+    for column in columns:
+        if str(column).strip().lower() in candidates:
+            return column
+    raise ValueError(f"Input needs one of the columns: {', '.join(candidates)}")
+
+
+def locate_batch(
+    source: str | IO,
+    layers: list[str] | None = None,
+    chunk_size: int = LOCATE_CHUNK_SIZE,
+    workers: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Assign districts to a stream of coordinates with vectorized spatial joins.
+
+    The CSV input is read in chunks of *chunk_size* rows. Each chunk is joined
+    against the polygon layers on a pool of worker processes, with at most two
+    chunks per worker in flight, and yielded in input order. Input needing a
+    single chunk is joined in-process.
+
+    :param source: CSV path or file object with a header, containing lat and lon columns
+    :param layers: polygon layers to join, default all fetched ones
+    :param chunk_size: rows per spatial join
+    :param workers: worker processes, defaults to settings.LOCATE_WORKERS, 0 is one per CPU
+    :return: iterator of the input chunks with a ``<layer>`` (and ``<layer>_aac``) column per layer
+    """
+    sources = _polygon_sources(layers)
+    workers = settings.LOCATE_WORKERS if workers is None else workers
+    workers = workers or os.cpu_count() or 1
+
+    chunks = iter(pd.read_csv(source, chunksize=chunk_size))
+    first = next(chunks, None)
+    if first is None:
+        return
+    lat_column = find_column(first.columns, LAT_COLUMNS)
+    lon_column = find_column(first.columns, LON_COLUMNS)
+    second = next(chunks, None)
+
+    if workers == 1 or second is None:
+        _init_worker(sources)
+        for chunk in itertools.chain([first], [second] if second is not None else [], chunks):
+            yield _locate_chunk(chunk, lat_column, lon_column)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sources,)) as executor:
+        pending = deque()
+        for chunk in itertools.chain([first, second], chunks):
+            pending.append(executor.submit(_locate_chunk, chunk, lat_column, lon_column))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_batch(frames: Iterator[pd.DataFrame], out: IO, output_format: str = "csv") -> None:
+    """
+    Stream batch locate results to *out* as they are produced.
+
+    :param frames: chunks from locate_batch
+    :param output_format: "csv" or "ndjson"
+    """
+    for index, frame in enumerate(frames):
+        if output_format == "ndjson":
+            # without a path to_json returns the text, empty for an empty frame
+            lines = frame.to_json(orient="records", lines=True, force_ascii=False) or ""
+            if lines and not lines.endswith("\n"):
+                lines += "\n"
+            out.write(lines)
+        else:
+            frame.to_csv(out, index=False, header=index == 0)
+        out.flush()
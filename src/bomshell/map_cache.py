@@ -0,0 +1,86 @@
+"""On-disk cache of the WGS84 GeoJSON that spatial maps are built from.
+
+Every layer variant (full resolution or simplified to a tolerance) is stored
+as ``<file>-<tolerance>.geojson`` under settings.MAP_CACHE, next to a
+``<file>.json`` record of the source files it was made from. A variant is
+reused while the sources have the same size and mtime, or failing that the
+same content hash, so maps are re-rendered without reading, reprojecting or
+simplifying the shapefile. ``spatial sync`` drops the variants of every file
+it updates.
+"""
+
+import contextlib
+import glob
+import json
+import os
+
+from . import settings
+from . import spatial_db
+
+SOURCE_EXTENSIONS = (".shp", ".dbf", ".prj")
+
+
+def source_files(file_name: str) -> list[str]:
+    """:return: the fetched source files of a BOM layer such as IDM00001"""
+    paths = (os.path.join(settings.SPATIAL_CACHE, file_name + ext) for ext in SOURCE_EXTENSIONS)
+    return [path for path in paths if os.path.exists(path)]
+
+
+def variant_path(file_name: str, tolerance: float) -> str:
+    return os.path.join(settings.MAP_CACHE, f"{file_name}-{tolerance:g}.geojson")
+
+
+def _state_path(file_name: str) -> str:
+    return os.path.join(settings.MAP_CACHE, f"{file_name}.json")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def _is_current(file_name: str, sources: list[str]) -> bool:
+    """Check the cached variants of *file_name* were made from *sources* as they are now, see spatial_db.sources_unchanged."""
+    try:
+        with open(_state_path(file_name), encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return spatial_db.sources_unchanged(state, sources, lambda stat: _write_atomic(_state_path(file_name), json.dumps({**state, **stat})))
+
+
+def get(file_name: str, tolerance: float) -> str | None:
+    """
+    :return: the cached GeoJSON of a layer variant, None if missing or stale
+    """
+    sources = source_files(file_name)
+    if not sources or not _is_current(file_name, sources):
+        return None
+    try:
+        with open(variant_path(file_name, tolerance), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def put(file_name: str, tolerance: float, text: str) -> None:
+    """Cache the GeoJSON of a layer variant, dropping variants made from older sources."""
+    sources = source_files(file_name)
+    if not sources:
+        return
+    if not _is_current(file_name, sources):
+        invalidate([file_name])
+        _write_atomic(_state_path(file_name), json.dumps(spatial_db.source_signature(sources)))
+    _write_atomic(variant_path(file_name, tolerance), text)
+
+
+def invalidate(file_names) -> None:
+    """Drop every cached variant of the given layers, e.g. IDM00001."""
+    for file_name in file_names:
+        paths = [_state_path(file_name), *glob.glob(os.path.join(glob.escape(settings.MAP_CACHE), f"{glob.escape(file_name)}-*.geojson"))]
+        for path in paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
@@ -0,0 +1,192 @@
+"""Nearest radar / point-place lookups with a KD-tree on great-circle distance."""
+
+import os
+import pickle
+from collections.abc import Iterator
+from typing import IO
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import KDTree
+
+from . import dbf
+from . import settings
+from .locate import LAT_COLUMNS
+from .locate import LOCATE_CHUNK_SIZE
+from .locate import LON_COLUMNS
+from .locate import find_column
+from .visualize import SPATIAL_CONFIGS
+
+# Mean earth radius (IUGG)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def get_point_types() -> list[str]:
+    """Return the spatial types made of point locations."""
+    return sorted(name for name, config in SPATIAL_CONFIGS.items() if config["type"] == "point")
+
+
+def _to_unit_vectors(lats, lons) -> np.ndarray:
+    """Map WGS84 coordinates onto the unit sphere, where chord length grows with great-circle distance."""
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def _chord_to_km(chord) -> np.ndarray:
+    return 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1)) * EARTH_RADIUS_KM
+
+
+class PointIndex:
+    """A KD-tree over the points of one layer, with the records they came from."""
+
+    def __init__(self, records: list[dict], lats, lons, signature: tuple | None = None):
+        self.records = records
+        self.signature = signature
+        self.tree = KDTree(_to_unit_vectors(lats, lons))
+
+    @classmethod
+    def from_dbf(cls, spatial_type: str, dbf_path: str) -> "PointIndex":
+        config = SPATIAL_CONFIGS[spatial_type]
+        records, lats, lons = [], [], []
+        for record in dbf.open_dbf(dbf_path):
+            lat, lon = record.get(config["lat"]), record.get(config["lon"])
+            if lat is None or lon is None:
+                continue
+            records.append(record)
+            lats.append(float(lat))
+            lons.append(float(lon))
+        return cls(records, lats, lons, signature=_signature(dbf_path))
+
+    def query(self, lats, lons, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Batch k-nearest query.
+
+        :return: (distances in km, record indices), both shaped (len(lats), k)
+        """
+        k = min(k, len(self.records))
+        chords, indices = self.tree.query(_to_unit_vectors(lats, lons), k=k)
+        return _chord_to_km(chords).reshape(-1, k), np.asarray(indices).reshape(-1, k)
+
+
+def _signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def _index_path(spatial_type: str) -> str:
+    return os.path.join(settings.CACHE, "nearest", f"{spatial_type}.pickle")
+
+
+_index_cache: dict[str, PointIndex] = {}
+
+
+def get_index(spatial_type: str) -> PointIndex:
+    """
+    Return the KD-tree of a point layer, built once and persisted in the cache.
+
+    The persisted tree is rebuilt when the layer's DBF changes.
+
+    :raises FileNotFoundError: if the layer has not been fetched
+    """
+    dbf_path = os.path.join(settings.SPATIAL_CACHE, f"{SPATIAL_CONFIGS[spatial_type]['file']}.dbf")
+    if not os.path.exists(dbf_path):
+        raise FileNotFoundError(f"Data file not found: {dbf_path}. Run 'bomshell spatial fetch' first.")
+    signature = _signature(dbf_path)
+
+    index = _index_cache.get(dbf_path)
+    if index is not None and index.signature == signature:
+        return index
+
+    index_path = _index_path(spatial_type)
+    try:
+        with open(index_path, "rb") as f:
+            index = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+        # a truncated pickle, or one written by another scipy/numpy version, is rebuilt
+        index = None
+    if not isinstance(index, PointIndex):
+        index = None
+
+    if index is None or index.signature != signature:
+        index = PointIndex.from_dbf(spatial_type, dbf_path)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, index_path)
+
+    _index_cache[dbf_path] = index
+    return index
+
+
+def nearest(lat: float, lon: float, spatial_type: str = "radar_location", k: int = 1) -> list[dict]:
+    """
+    Find the k nearest points of a layer to a WGS84 coordinate.
+
+    :return: the nearest records, closest first, each with a ``distance_km`` key
+    """
+    return nearest_batch([lat], [lon], spatial_type, k)[0]
+
+
+def nearest_batch(lats, lons, spatial_type: str = "radar_location", k: int = 1) -> list[list[dict]]:
+    """
+    Find the k nearest points of a layer to each of many coordinates in one vectorized query.
+
+    :return: per input coordinate, the nearest records closest first, each with a ``distance_km`` key
+    """
+    index = get_index(spatial_type)
+    if not index.records:
+        return [[] for _ in lats]
+    distances, indices = index.query(lats, lons, k)
+    return [
+        [{**index.records[i], "distance_km": round(float(d), 3)} for d, i in zip(row_d, row_i, strict=True)]
+        for row_d, row_i in zip(distances, indices, strict=True)
+    ]
+
+
+def nearest_frames(
+    source: str | IO,
+    spatial_type: str = "radar_location",
+    k: int = 1,
+    chunk_size: int = LOCATE_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Find the k nearest points for a CSV stream of coordinates, one vectorized query per chunk.
+
+    Rows with a blank or invalid coordinate are passed through with the added columns empty.
+
+    :param source: CSV path or file object with a header, containing lat and lon columns
+    :return: iterator of the input chunks with ``<layer>_<rank>`` name and ``<layer>_<rank>_km`` columns
+    """
+    index = get_index(spatial_type)
+    name_field = SPATIAL_CONFIGS[spatial_type]["name"]
+    ranks = min(k, len(index.records))
+    lat_column = lon_column = None
+    for chunk in pd.read_csv(source, chunksize=chunk_size):
+        if lat_column is None:
+            lat_column = find_column(chunk.columns, LAT_COLUMNS)
+            lon_column = find_column(chunk.columns, LON_COLUMNS)
+        lats = pd.to_numeric(chunk[lat_column], errors="coerce").to_numpy(dtype=float)
+        lons = pd.to_numeric(chunk[lon_column], errors="coerce").to_numpy(dtype=float)
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        names = np.full((len(chunk), ranks), None, dtype=object)
+        distances = np.full((len(chunk), ranks), np.nan)
+        if ranks and valid.any():
+            found_distances, found_indices = index.query(lats[valid], lons[valid], ranks)
+            names[valid] = [[index.records[i].get(name_field) for i in row] for row in found_indices]
+            distances[valid] = found_distances.round(3)
+        result = chunk.copy()
+        for rank in range(ranks):
+            result[f"{spatial_type}_{rank + 1}"] = names[:, rank]
+            result[f"{spatial_type}_{rank + 1}_km"] = distances[:, rank]
+        yield result
+
+
+def format_nearest(lat: float, lon: float, spatial_type: str, found: list[dict]) -> str:
+    """Format a nearest result for terminal display."""
+    config = SPATIAL_CONFIGS[spatial_type]
+    lines = [f"{config['label']} nearest to {lat}, {lon}", ""]
+    for rank, record in enumerate(found, 1):
+        lines.append(f"{rank}. {record.get(config['name'], '')} ({record['distance_km']:.1f} km)")
+    return "\n".join(lines)
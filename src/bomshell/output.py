@@ -3,9 +3,17 @@
 All user-facing output goes through these helpers. When ``--json`` mode
 is active, informational messages are suppressed and structured data is
 emitted as JSON to stdout.
+
+JSON is pretty printed by default. The ``compact`` format drops the
+indentation and ``ndjson`` writes one compact JSON document per line, one
+per item for lists. Iterators are streamed item by item as they are
+produced, so large payloads are emitted in constant memory.
 """
 
 import json
+import sys
+from collections.abc import Iterable
+from collections.abc import Iterator
 from typing import Any
 
 from rich.console import Console
@@ -15,6 +23,9 @@ _err_console = Console(stderr=True)
 
 _json_mode: bool = False
 
+JSON_FORMATS = ("pretty", "compact", "ndjson")
+_json_format: str = "pretty"
+
 
 def set_json_mode(enabled: bool) -> None:
     global _json_mode
@@ -25,9 +36,65 @@ def is_json_mode() -> bool:
     return _json_mode
 
 
+def set_json_format(json_format: str) -> None:
+    """
+    :param json_format: one of JSON_FORMATS
+    :raises ValueError: for an unknown format
+    """
+    global _json_format
+    if json_format not in JSON_FORMATS:
+        raise ValueError(f"Unknown JSON format {json_format}, use one of: {', '.join(JSON_FORMATS)}")
+    _json_format = json_format
+
+
+def get_json_format() -> str:
+    return _json_format
+
+
+def _dumps(data: Any, indent: int | None = None) -> str:
+    separators = None if indent else (",", ":")
+    return json.dumps(data, default=str, ensure_ascii=False, indent=indent, separators=separators)
+
+
 def emit_json(data: Any) -> None:
-    """Print *data* as JSON to stdout (always, regardless of mode)."""
-    print(json.dumps(data, default=str, ensure_ascii=False, indent=2))
+    """
+    Print *data* as JSON to stdout (always, regardless of mode), in the
+    current JSON format. Iterators are streamed, see emit_json_stream.
+    """
+    if isinstance(data, Iterator) or (_json_format == "ndjson" and isinstance(data, list)):
+        emit_json_stream(data)
+    elif _json_format == "pretty":
+        print(_dumps(data, indent=2))
+    else:
+        print(_dumps(data))
+
+
+def emit_json_stream(items: Iterable[Any]) -> None:
+    """
+    Stream *items* to stdout as one JSON array, or one line per item in
+    ndjson format. Each item is written as soon as it is produced, and the
+    output is flushed after the first one.
+
+    Pretty output is the same as emit_json of the whole list.
+    """
+    out = sys.stdout
+    ndjson = _json_format == "ndjson"
+    indent = 2 if _json_format == "pretty" else None
+    first = True
+    for item in items:
+        if ndjson:
+            out.write(_dumps(item) + "\n")
+        elif indent:
+            text = _dumps(item, indent=indent).replace("\n", "\n  ")
+            out.write(("[\n  " if first else ",\n  ") + text)
+        else:
+            out.write(("[" if first else ",") + _dumps(item))
+        if first:
+            out.flush()
+            first = False
+    if not ndjson:
+        out.write("[]\n" if first else ("\n]\n" if indent else "]\n"))
+    out.flush()
 
 
 def print_info(msg: str) -> None:
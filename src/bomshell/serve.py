@@ -0,0 +1,387 @@
+"""Local HTTP server of the spatial layers, for maps of full-detail data.
+
+Static maps have to ship every feature of a layer. The server instead
+answers per viewport: features are picked with an STRtree, clipped to the
+requested box and simplified to about a pixel at the requested zoom, so a
+browser only downloads what it shows. Endpoints:
+
+``/``
+    Leaflet page drawing the layers from tiles, click for names
+``/layers``
+    JSON list of the served layers
+``/layers/<type>?bbox=minx,miny,maxx,maxy[&zoom=z]``
+    GeoJSON of a layer's features in a WGS84 box, full detail without zoom
+``/tiles/<type>/<z>/<x>/<y>.geojson``
+    GeoJSON of a layer's features in a slippy map tile, kept in an LRU cache
+
+Layers are read on first use, simplified once per zoom level and shared by
+all requests.
+"""
+
+import functools
+import gzip
+import json
+import math
+import threading
+import urllib.parse
+import webbrowser
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import cast
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from . import settings
+from . import visualize
+from .output import print_info
+from .output import print_success
+
+TILE_SIZE = 256
+
+# Pixels of neighbouring tiles included in a tile, so outlines continue across tile edges
+TILE_BUFFER = 8
+
+# Zoom levels up to which layers are simplified, deeper zooms get the full geometry
+MAX_SIMPLIFY_ZOOM = 14
+MAX_ZOOM = 22
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+class UnknownLayer(LookupError):
+    """The requested layer is not served."""
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """
+    :return: WGS84 (minx, miny, maxx, maxy) of a slippy map tile
+    :raises ValueError: for tiles outside the zoom level
+    """
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        raise ValueError(f"No tile {z}/{x}/{y}")
+    n = 2**z
+
+    def latitude(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, latitude(y + 1), (x + 1) / n * 360.0 - 180.0, latitude(y)
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """:return: degrees of longitude per pixel at *zoom*, the simplification tolerance of that zoom"""
+    return 360.0 / (TILE_SIZE * 2**zoom)
+
+
+def parse_bbox(text: str) -> tuple[float, float, float, float]:
+    """
+    Parse ``minx,miny,maxx,maxy``.
+
+    :raises ValueError: for anything else
+    """
+    try:
+        minx, miny, maxx, maxy = (float(value) for value in text.split(","))
+    except ValueError:
+        raise ValueError(f"Invalid bbox '{text}', expected minx,miny,maxx,maxy") from None
+    if minx > maxx or miny > maxy:
+        raise ValueError(f"Invalid bbox '{text}', min is greater than max")
+    return minx, miny, maxx, maxy
+
+
+class Layer:
+    """
+    A spatial layer indexed for box queries.
+
+    The geometry and the name and popup fields are read on first use, as WGS84,
+    with an STRtree over the full-detail geometry. Simplified copies are made
+    once per zoom level.
+    """
+
+    def __init__(self, spatial_type: str):
+        self.spatial_type = spatial_type
+        self.config = visualize.SPATIAL_CONFIGS[spatial_type]
+        self.shp_path = visualize.layer_source_path(self.config)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._simplified: dict[int, np.ndarray] = {}
+
+    def _load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            config = self.config
+            if config["type"] == "point":
+                frame = visualize.read_points(config, self.shp_path)
+                geometry = gpd.points_from_xy(frame[config["lon"]].astype(float), frame[config["lat"]].astype(float), crs="EPSG:4326")
+                gdf = gpd.GeoDataFrame(frame, geometry=geometry)
+            else:
+                gdf = visualize.read_layer(self.shp_path)
+            self.fields = [field for field in dict.fromkeys([config["name"], *config["popup_fields"]]) if field in gdf.columns]
+            self.records = visualize.nan_to_none(gdf[self.fields]).to_dict("records")
+            self.geometries = np.asarray(gdf.geometry.values, dtype=object)
+            self.tree = shapely.STRtree(self.geometries)
+            self._loaded = True
+
+    def geometries_at(self, zoom: int | None) -> np.ndarray:
+        """:return: the geometries simplified for *zoom*, full detail for None and deep zooms"""
+        self._load()
+        if zoom is None or zoom > MAX_SIMPLIFY_ZOOM or self.config["type"] == "point":
+            return self.geometries
+        with self._lock:
+            if zoom not in self._simplified:
+                series = gpd.GeoSeries(self.geometries, crs="EPSG:4326")
+                self._simplified[zoom] = np.asarray(visualize.simplify_geometries(series, zoom_tolerance(zoom)).values, dtype=object)
+            return self._simplified[zoom]
+
+    def query(self, bbox: tuple[float, float, float, float], zoom: int | None = None, clip: tuple | None = None, names_only=False) -> str:
+        """
+        :param bbox: WGS84 (minx, miny, maxx, maxy) the features intersect
+        :param zoom: simplify for this zoom level, default full detail
+        :param clip: box to clip the geometries to, default *bbox*
+        :param names_only: only include the name field in the properties
+        :return: GeoJSON FeatureCollection text, features in layer order
+        """
+        self._load()
+        index = np.sort(self.tree.query(shapely.box(*bbox), predicate="intersects"))
+        geometries = shapely.clip_by_rect(self.geometries_at(zoom)[index], *(clip or bbox))
+        keep = ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+        index, geometries = index[keep], geometries[keep]
+
+        fields = [self.config["name"]] if names_only and self.config["name"] in self.fields else self.fields
+        features = [
+            f'{{"type":"Feature","id":{position},"geometry":{geometry},"properties":{json.dumps({f: self.records[position][f] for f in fields}, default=str)}}}'
+            for position, geometry in zip(index.tolist(), shapely.to_geojson(geometries).tolist(), strict=True)
+        ]
+        return '{"type":"FeatureCollection","features":[' + ",".join(features) + "]}"
+
+    def info(self) -> dict:
+        config = self.config
+        return {
+            "name": self.spatial_type,
+            "label": config["label"],
+            "type": config["type"],
+            "color": config.get("line_color", "blue") if config["type"] == "polygon" else config["color"],
+            "name_field": config["name"],
+            "popup_fields": config["popup_fields"],
+        }
+
+
+class SpatialServer(ThreadingHTTPServer):
+    """HTTP server of a set of layers, see SpatialRequestHandler."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], spatial_types: list[str], tile_cache_size: int | None = None):
+        """
+        :raises FileNotFoundError: if a layer has not been fetched
+        """
+        self.layers = {spatial_type: Layer(spatial_type) for spatial_type in spatial_types}
+        tile_cache_size = settings.SERVE_TILE_CACHE if tile_cache_size is None else tile_cache_size
+        self.tile = functools.lru_cache(maxsize=tile_cache_size)(self._render_tile)
+        super().__init__(address, SpatialRequestHandler)
+
+    def layer(self, spatial_type: str) -> Layer:
+        try:
+            return self.layers[spatial_type]
+        except KeyError:
+            raise UnknownLayer(f"Layer {spatial_type} is not served, available: {', '.join(self.layers)}") from None
+
+    def _render_tile(self, spatial_type: str, z: int, x: int, y: int) -> bytes:
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        buffer_x = (maxx - minx) / TILE_SIZE * TILE_BUFFER
+        buffer_y = (maxy - miny) / TILE_SIZE * TILE_BUFFER
+        buffered = (minx - buffer_x, miny - buffer_y, maxx + buffer_x, maxy + buffer_y)
+        return self.layer(spatial_type).query(buffered, zoom=z, names_only=True).encode("utf-8")
+
+
+class SpatialRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        server = cast(SpatialServer, self.server)
+        url = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(part) for part in url.path.split("/") if part]
+        params = urllib.parse.parse_qs(url.query)
+        try:
+            if not parts:
+                self._send(PAGE.encode("utf-8"), "text/html; charset=utf-8")
+            elif parts == ["layers"]:
+                self._send_json(json.dumps([layer.info() for layer in server.layers.values()]).encode("utf-8"))
+            elif len(parts) == 2 and parts[0] == "layers":
+                if "bbox" not in params:
+                    raise ValueError("Missing bbox=minx,miny,maxx,maxy")
+                zoom = int(params["zoom"][0]) if "zoom" in params else None
+                self._send_json(server.layer(parts[1]).query(parse_bbox(params["bbox"][0]), zoom=zoom).encode("utf-8"))
+            elif len(parts) == 5 and parts[0] == "tiles" and parts[4].endswith(".geojson"):
+                server.layer(parts[1])
+                z, x, y = int(parts[2]), int(parts[3]), int(parts[4].removesuffix(".geojson"))
+                self._send_json(server.tile(parts[1], z, x, y))
+            else:
+                self._send_error(404, f"Not found: {url.path}")
+        except (UnknownLayer, FileNotFoundError) as e:
+            self._send_error(404, str(e))
+        except ValueError as e:
+            self._send_error(400, str(e))
+
+    def _send(self, body: bytes, content_type: str, status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if len(body) >= GZIP_MIN_SIZE and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, body: bytes) -> None:
+        self._send(body, "application/json")
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send(json.dumps({"error": message}).encode("utf-8"), "application/json", status)
+
+    def log_message(self, format: str, *args) -> None:
+        if settings.VERBOSE:
+            print_info(f"{self.address_string()} {format % args}")
+
+
+def serve(spatial_types: list[str], host: str, port: int, tile_cache_size: int | None = None, open_browser: bool = True) -> None:
+    """
+    Serve *spatial_types* until interrupted.
+
+    :raises FileNotFoundError: if a layer has not been fetched
+    """
+    server = SpatialServer((host, port), spatial_types, tile_cache_size)
+    url = f"http://{host}:{server.server_port}/"
+    print_success(f"Serving {len(spatial_types)} layers at {url}, Ctrl-C to stop")
+    if open_browser:
+        webbrowser.open(url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>bomshell spatial</title>
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map { height: 100%; margin: 0; }</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map("map").setView([-25.0, 135.0], 4);
+L.tileLayer("https://tile.openstreetmap.org/{z}/{x}/{y}.png", {
+    maxZoom: 19,
+    attribution: "&copy; OpenStreetMap contributors"
+}).addTo(map);
+
+function escapeHtml(value) {
+    return String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+}
+
+// Draws the GeoJSON of each tile on its own canvas, the canvas edge clips the buffered features
+var VectorTiles = L.GridLayer.extend({
+    createTile: function (coords, done) {
+        var tile = document.createElement("canvas");
+        var size = this.getTileSize();
+        tile.width = size.x;
+        tile.height = size.y;
+        var self = this;
+        fetch("tiles/" + this.options.layer.name + "/" + coords.z + "/" + coords.x + "/" + coords.y + ".geojson")
+            .then(function (response) { return response.json(); })
+            .then(function (data) { self._draw(tile, coords, data); done(null, tile); })
+            .catch(function (error) { done(error, tile); });
+        return tile;
+    },
+
+    _draw: function (tile, coords, data) {
+        var ctx = tile.getContext("2d");
+        var map = this._map;
+        var origin = coords.scaleBy(this.getTileSize());
+        var layer = this.options.layer;
+        ctx.strokeStyle = ctx.fillStyle = layer.color;
+        ctx.lineWidth = 2;
+
+        function moveAlong(ring) {
+            ring.forEach(function (coordinate, i) {
+                var p = map.project([coordinate[1], coordinate[0]], coords.z);
+                if (i === 0) ctx.moveTo(p.x - origin.x, p.y - origin.y);
+                else ctx.lineTo(p.x - origin.x, p.y - origin.y);
+            });
+        }
+
+        function draw(geometry) {
+            var type = geometry.type, c = geometry.coordinates;
+            if (type === "GeometryCollection") return geometry.geometries.forEach(draw);
+            if (type === "Point" || type === "MultiPoint") {
+                (type === "Point" ? [c] : c).forEach(function (coordinate) {
+                    var p = map.project([coordinate[1], coordinate[0]], coords.z);
+                    ctx.beginPath();
+                    ctx.arc(p.x - origin.x, p.y - origin.y, 4, 0, 2 * Math.PI);
+                    ctx.globalAlpha = 0.8;
+                    ctx.fill();
+                });
+                return;
+            }
+            var lines = type === "LineString" ? [c] : type === "MultiLineString" ? c : null;
+            var polygons = type === "Polygon" ? [c] : type === "MultiPolygon" ? c : [];
+            ctx.beginPath();
+            if (lines) lines.forEach(moveAlong);
+            polygons.forEach(function (rings) {
+                rings.forEach(function (ring) { moveAlong(ring); ctx.closePath(); });
+            });
+            if (polygons.length) {
+                ctx.globalAlpha = 0.3;
+                ctx.fill("evenodd");
+            }
+            ctx.globalAlpha = 1;
+            ctx.stroke();
+        }
+
+        data.features.forEach(function (feature) { if (feature.geometry) draw(feature.geometry); });
+    }
+});
+
+fetch("layers").then(function (response) { return response.json(); }).then(function (layers) {
+    var overlays = {};
+    var shown = [];
+    layers.forEach(function (layer) {
+        var tiles = new VectorTiles({layer: layer, zIndex: layer.type === "point" ? 20 : 10});
+        overlays[layer.label] = tiles;
+        shown.push([layer, tiles]);
+        tiles.addTo(map);
+    });
+    L.control.layers(null, overlays, {collapsed: false}).addTo(map);
+
+    // Features under a click, from the full-detail bbox endpoint
+    map.on("click", function (e) {
+        var d = 5 * 360 / (256 * Math.pow(2, map.getZoom()));
+        var bbox = [e.latlng.lng - d, e.latlng.lat - d, e.latlng.lng + d, e.latlng.lat + d].join(",");
+        var visible = shown.filter(function (pair) { return map.hasLayer(pair[1]); });
+        Promise.all(visible.map(function (pair) {
+            return fetch("layers/" + pair[0].name + "?bbox=" + bbox).then(function (response) { return response.json(); });
+        })).then(function (results) {
+            var lines = [];
+            results.forEach(function (data, i) {
+                var layer = visible[i][0];
+                data.features.slice(0, 5).forEach(function (feature) {
+                    var values = layer.popup_fields.filter(function (field) { return feature.properties[field]; })
+                        .map(function (field) { return "<b>" + field + ":</b> " + escapeHtml(feature.properties[field]); });
+                    lines.push("<i>" + escapeHtml(layer.label) + "</i><br>" + values.join("<br>"));
+                });
+            });
+            if (lines.length) L.popup().setLatLng(e.latlng).setContent(lines.join("<hr>")).openOn(map);
+        });
+    });
+});
+</script>
+</body>
+</html>
+"""
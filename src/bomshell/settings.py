@@ -16,8 +16,34 @@ CACHE = get_string("BOM_CACHE", os.path.join(xdg_cache_home, NAME))
 
 SPATIAL_CACHE = os.path.join(CACHE, "spatial_cache/")
 SPATIAL_DB = os.path.join(CACHE, "spatial.sqlite")
+SPATIAL_PARQUET = os.path.join(CACHE, "parquet_cache/")
+SPATIAL_MANIFEST = os.path.join(CACHE, "spatial_manifest.json")
+MAP_CACHE = os.path.join(CACHE, "map_cache/")
+HTTP_CACHE = os.path.join(CACHE, "http_cache/")
 
 OVERWRITE = get_bool("BOM_OVERWRITE_EXISTING_SPATIAL_DATA", False)
 VERBOSE: int = 0
+# pretty, compact or ndjson, see output.JSON_FORMATS
+JSON_FORMAT = get_string("BOM_JSON_FORMAT", "pretty")
+
+# Seconds BOM API responses are reused without a request, unless the API says otherwise
+FORECAST_CACHE_TTL = get_int("BOM_FORECAST_CACHE_TTL", 600)
+LOCATION_CACHE_TTL = get_int("BOM_LOCATION_CACHE_TTL", 7 * 24 * 3600)
+# Size limit of the API response cache in MB, least recently used responses are dropped
+HTTP_CACHE_MB = get_int("BOM_HTTP_CACHE_MB", 16)
+# Revalidate cached API responses even while fresh, set by forecast --refresh
+HTTP_CACHE_REFRESH: bool = False
 
 FTP_TIMEOUT = get_int("BOM_FTP_TIMEOUT", 5)
+FTP_WORKERS = get_int("BOM_FTP_WORKERS", 4)
+# Processes decoding layers during a database build, 0 is one per CPU
+BUILD_WORKERS = get_int("BOM_BUILD_WORKERS", 0)
+# Processes joining coordinates in a batch locate, 0 is one per CPU
+LOCATE_WORKERS = get_int("BOM_LOCATE_WORKERS", 0)
+# Threads preparing the layers of a spatial map, 0 is one per layer
+MAP_WORKERS = get_int("BOM_MAP_WORKERS", 0)
+# Port of spatial serve, and the GeoJSON tiles it keeps in memory
+SERVE_PORT = get_int("BOM_SERVE_PORT", 8765)
+SERVE_TILE_CACHE = get_int("BOM_SERVE_TILE_CACHE", 2048)
+# Polygon detail of spatial maps: low, medium or full
+MAP_DETAIL = get_string("BOM_MAP_DETAIL", "medium")
@@ -0,0 +1,385 @@
+"""Bookkeeping, geometry storage and queries for the local spatial database (spatial.sqlite).
+
+Each layer is stored as three tables:
+
+* ``<layer>`` holds the DBF attributes, one row per feature keyed by ``id``
+* ``<layer>_geometry`` holds the feature geometry as WGS84 WKB plus its bounding box, keyed by ``fid`` = ``id``
+* ``<layer>_rtree`` is an SQLite R-tree over the bounding boxes
+
+Key BOM columns (AAC, DIST_NAME, STATE_CODE, PT_NAME) are indexed, and the
+feature names of all layers go into one FTS5 table for name search.
+"""
+
+import difflib
+import hashlib
+import os
+import re
+import sqlite3
+
+import shapely
+from sqlalchemy import text
+
+from . import settings
+
+# Bumped when the layout of the layer tables changes, forcing a full reload
+SCHEMA_VERSION = 2
+
+# Records which source files each layer table was built from
+LAYERS_TABLE = "_layers"
+
+LAYERS_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {LAYERS_TABLE} (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    records INTEGER NOT NULL
+)
+"""
+
+# Full text index over the feature names of every layer
+NAMES_TABLE = "names_fts"
+
+NAMES_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {NAMES_TABLE} USING fts5(
+    name,
+    layer UNINDEXED,
+    fid UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# Lowercased BOM columns that get a B-tree index when a layer has them
+INDEXED_COLUMNS = ("aac", "dist_name", "state_code", "pt_name")
+
+GEOMETRY_SCHEMA = """
+CREATE TABLE {geometry} (
+    fid INTEGER PRIMARY KEY,
+    minx REAL NOT NULL,
+    miny REAL NOT NULL,
+    maxx REAL NOT NULL,
+    maxy REAL NOT NULL,
+    wkb BLOB NOT NULL
+)
+"""
+
+RTREE_SCHEMA = "CREATE VIRTUAL TABLE {rtree} USING rtree(fid, minx, maxx, miny, maxy)"
+
+# Rows fetched from SQLite at a time when streaming a layer query
+QUERY_FETCH_SIZE = 1000
+
+
+def geometry_table(name):
+    return f"{name}_geometry"
+
+
+def rtree_table(name):
+    return f"{name}_rtree"
+
+
+def source_stat(source_files):
+    """
+    :param source_files: files a layer is built from
+    :return: combined {"size", "mtime"} of the files
+    """
+    stats = [os.stat(path) for path in source_files]
+    return {"size": sum(s.st_size for s in stats), "mtime": max(s.st_mtime for s in stats)}
+
+
+def source_hash(source_files):
+    """
+    :param source_files: files a layer is built from
+    :return: sha256 hex digest over the contents of all files
+    """
+    digest = hashlib.sha256()
+    for path in source_files:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda f=f: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_signature(source_files):
+    """
+    :param source_files: files something is built from
+    :return: {"size", "mtime", "sha256"} of the files, to record with what is built
+    """
+    return {**source_stat(source_files), "sha256": source_hash(source_files)}
+
+
+def sources_unchanged(signature, source_files, refresh=None):
+    """
+    Check whether *source_files* are as they were when *signature* was taken.
+
+    Size and mtime are compared first, the content hash only if those differ,
+    so a touched or re-downloaded but identical file is unchanged. *refresh*
+    is then called with the new {"size", "mtime"}, for the caller to record so
+    the next check does not hash again.
+
+    :param signature: a source_signature, or a record holding its keys
+    :param refresh: callable taking the new stat
+    """
+    stat = source_stat(source_files)
+    if stat["size"] == signature.get("size") and stat["mtime"] == signature.get("mtime"):
+        return True
+    if source_hash(source_files) != signature.get("sha256"):
+        return False
+    if refresh is not None:
+        refresh(stat)
+    return True
+
+
+def ensure_schema(db):
+    """
+    Create the layer bookkeeping and name search tables in a dataset database if
+    missing. A database from an older layout has its bookkeeping cleared, so
+    every layer is reloaded.
+    """
+    version = next(iter(db.query("PRAGMA user_version")))["user_version"]
+    db.query(LAYERS_SCHEMA)
+    db.query(NAMES_SCHEMA)
+    if version < SCHEMA_VERSION:
+        db.query(f"DELETE FROM {LAYERS_TABLE}")
+        db.query(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def get_layer_state(db, name):
+    """
+    :return: the bookkeeping row of layer *name*, None if it was never built
+    """
+    return db[LAYERS_TABLE].find_one(name=name)
+
+
+def is_layer_current(db, name, source_files):
+    """
+    Check whether the table of layer *name* was built from *source_files* as
+    they are now, see sources_unchanged.
+    """
+    state = get_layer_state(db, name)
+    if state is None or name not in db.tables:
+        return False
+    return sources_unchanged(state, source_files, lambda stat: db[LAYERS_TABLE].upsert({"name": name, **stat}, ["name"]))
+
+
+def set_layer_state(db, name, source_files, records):
+    """Record that layer *name* was built from *source_files*."""
+    row = {"name": name, **source_signature(source_files), "records": records}
+    db[LAYERS_TABLE].upsert(row, ["name"])
+
+
+def clear_layer(db, name):
+    """Drop the tables of layer *name* and forget how it was built."""
+    db[LAYERS_TABLE].delete(name=name)
+    db.executable.execute(text(f"DELETE FROM {NAMES_TABLE} WHERE layer = :layer"), {"layer": name})
+    if name in db.tables:
+        db[name].drop()
+    db.query(f"DROP TABLE IF EXISTS {rtree_table(name)}")
+    db.query(f"DROP TABLE IF EXISTS {geometry_table(name)}")
+
+
+def create_geometry_tables(db, name):
+    """Create the (empty) geometry and R-tree tables of layer *name*."""
+    db.query(GEOMETRY_SCHEMA.format(geometry=geometry_table(name)))
+    db.query(RTREE_SCHEMA.format(rtree=rtree_table(name)))
+
+
+def insert_geometries(db, name, rows):
+    """
+    Bulk insert feature geometries of layer *name* and index their bounding boxes.
+
+    :param rows: list of (fid, minx, miny, maxx, maxy, wkb)
+    """
+    if not rows:
+        return
+    keys = ("fid", "minx", "miny", "maxx", "maxy", "wkb")
+    params = [dict(zip(keys, row, strict=True)) for row in rows]
+    db.executable.execute(
+        text(f"INSERT INTO {geometry_table(name)} VALUES (:fid, :minx, :miny, :maxx, :maxy, :wkb)"),
+        params,
+    )
+    db.executable.execute(
+        text(f"INSERT INTO {rtree_table(name)} VALUES (:fid, :minx, :maxx, :miny, :maxy)"),
+        params,
+    )
+
+
+def create_column_indexes(db, name, columns):
+    """Index the key BOM columns among *columns* of layer table *name*."""
+    for column in INDEXED_COLUMNS:
+        if column in columns:
+            db.query(f'CREATE INDEX IF NOT EXISTS "ix_{name}_{column}" ON "{name}" ("{column}")')
+
+
+def insert_names(db, name, names):
+    """
+    Add the feature names of layer *name* to the name search index.
+
+    :param names: list of (fid, feature name)
+    """
+    params = [{"name": str(value), "layer": name, "fid": fid} for fid, value in names if value]
+    if params:
+        db.executable.execute(text(f"INSERT INTO {NAMES_TABLE} (name, layer, fid) VALUES (:name, :layer, :fid)"), params)
+
+
+def connect(database=None):
+    """
+    Open the spatial database read-only for queries.
+
+    :param database: defaults to settings.SPATIAL_DB
+    :raises FileNotFoundError: if the database has not been built
+    """
+    database = database or settings.SPATIAL_DB
+    if not os.path.isfile(database):
+        raise FileNotFoundError(f"Spatial database not found: {database}. Run 'bomshell spatial build' first.")
+    return sqlite3.connect(f"file:{database}?mode=ro", uri=True, check_same_thread=False)
+
+
+def has_geometry(conn, name):
+    """Whether layer *name* was built with geometries."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (rtree_table(name),)).fetchone()
+    return row is not None
+
+
+def bbox_candidates(conn, name, minx, miny, maxx, maxy):
+    """
+    Probe the R-tree of layer *name* with a WGS84 box.
+
+    :return: list of (fid, wkb) of the features whose bounding box intersects it
+    """
+    return conn.execute(
+        f"SELECT g.fid, g.wkb FROM {rtree_table(name)} AS r JOIN {geometry_table(name)} AS g ON g.fid = r.fid "
+        "WHERE r.minx <= ? AND r.maxx >= ? AND r.miny <= ? AND r.maxy >= ? ORDER BY g.fid",
+        (maxx, minx, maxy, miny),
+    ).fetchall()
+
+
+def query_bbox(conn, name, minx, miny, maxx, maxy):
+    """
+    Features of layer *name* whose bounding box intersects the given WGS84 box.
+
+    :return: list of (fid, shapely geometry)
+    """
+    return [(fid, shapely.from_wkb(wkb)) for fid, wkb in bbox_candidates(conn, name, minx, miny, maxx, maxy)]
+
+
+def query_intersects(conn, name, geometry):
+    """
+    Features of layer *name* that intersect *geometry*, filtered by the R-tree first.
+
+    :return: list of (fid, shapely geometry)
+    """
+    candidates = query_bbox(conn, name, *geometry.bounds)
+    return [(fid, geom) for fid, geom in candidates if geom.intersects(geometry)]
+
+
+def _fts_query(query):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_names(conn, query, layers=None, limit=10, fuzzy=True):
+    """
+    Search feature names of all (or some) layers.
+
+    Words are matched as prefixes through the FTS5 index, best matches first.
+    When nothing matches and *fuzzy* is set, the closest names by edit
+    similarity are returned instead.
+
+    :return: list of {"layer", "fid", "name"}
+    :raises FileNotFoundError: if the database was built before names were indexed
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (NAMES_TABLE,)).fetchone() is None:
+        raise FileNotFoundError("The spatial database has no name index. Run 'bomshell spatial build' to update it.")
+    layer_filter = ""
+    params = []
+    if layers:
+        layer_filter = f" AND layer IN ({', '.join('?' * len(layers))})"
+        params = list(layers)
+
+    fts_query = _fts_query(query)
+    rows = []
+    if fts_query:
+        rows = conn.execute(
+            f"SELECT layer, fid, name FROM {NAMES_TABLE} WHERE {NAMES_TABLE} MATCH ?{layer_filter} ORDER BY rank LIMIT ?",
+            [fts_query, *params, limit],
+        ).fetchall()
+
+    if not rows and fuzzy:
+        candidates = conn.execute(f"SELECT layer, fid, name FROM {NAMES_TABLE} WHERE 1{layer_filter}", params).fetchall()
+        by_name = {}
+        for layer, fid, name in candidates:
+            by_name.setdefault(name.lower(), []).append((layer, fid, name))
+        for match in difflib.get_close_matches(query.lower(), list(by_name), n=limit, cutoff=0.6):
+            rows.extend(by_name[match])
+        rows = rows[:limit]
+
+    return [{"layer": layer, "fid": fid, "name": name} for layer, fid, name in rows]
+
+
+def get_record(conn, name, fid):
+    """
+    :return: the attribute record of feature *fid* in layer *name*, without the id
+    """
+    cursor = conn.execute(f'SELECT * FROM "{name}" WHERE id = ?', (fid,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return {c[0]: v for c, v in zip(cursor.description, row, strict=True) if c[0] != "id"}
+
+
+def layer_columns(conn, name):
+    """
+    :return: the attribute columns of layer *name*, without the id
+    :raises ValueError: if the layer is not in the database
+    """
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{name}")')]
+    if not columns:
+        raise ValueError(f"Layer {name} is not in the spatial database. Run 'bomshell spatial build' first.")
+    return [column for column in columns if column != "id"]
+
+
+def query_layer(conn, name, columns=None, where=None, limit=None):
+    """
+    Stream the attribute records of layer *name*, reading only what is asked for.
+
+    The projection, filter and limit all go to SQLite, so a filter on an
+    indexed column (see INDEXED_COLUMNS) is an index lookup rather than a scan.
+    Records come in file order and are fetched QUERY_FETCH_SIZE at a time.
+
+    :param columns: columns to return, case-insensitive, default all
+    :param where: SQL filter expression, e.g. ``state_code = 'WA'``
+    :param limit: maximum number of records
+    :return: (column names, iterator of records)
+    :raises ValueError: if the layer or a column does not exist, or the filter is invalid
+    """
+    available = layer_columns(conn, name)
+    if columns:
+        lookup = {column.lower(): column for column in available}
+        unknown = [column for column in columns if column.lower() not in lookup]
+        if unknown:
+            raise ValueError(f"Unknown columns for {name}: {', '.join(unknown)}. Available: {', '.join(available)}")
+        columns = [lookup[column.lower()] for column in columns]
+    else:
+        columns = available
+
+    projection = ", ".join(f'"{column}"' for column in columns)
+    sql = f'SELECT {projection} FROM "{name}"'
+    params = []
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    try:
+        cursor = conn.execute(sql, params)
+    except sqlite3.Error as e:
+        raise ValueError(f"Invalid query: {e}") from None
+
+    def records():
+        while rows := cursor.fetchmany(QUERY_FETCH_SIZE):
+            for row in rows:
+                yield dict(zip(columns, row, strict=True))
+
+    return columns, records()
@@ -1,12 +1,25 @@
 """Visualization utilities for BOM spatial data."""
 
+import gzip
+import json
+import math
 import os
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 import folium
 import geopandas as gpd
-
+import numpy as np
+import pandas as pd
+import shapely
+from folium.elements import JSCSSMixin
+from folium.elements import Template
+from folium.utilities import JsCode
+
+from . import columnar
+from . import dbf
+from . import map_cache
 from . import settings
 
 # Spatial types configuration
@@ -127,100 +140,240 @@ SPATIAL_CONFIGS: dict[str, dict[str, Any]] = {
 AUSTRALIA_CENTER = [-25.0, 135.0]
 DEFAULT_ZOOM = 4
 
+# Polygon simplification tolerance in degrees per map detail level, 0.01 degrees is about 1 km
+DETAIL_TOLERANCES = {"low": 0.01, "medium": 0.001, "full": 0.0}
+
+# Decimals kept of unsimplified coordinates, about 0.1 m
+FULL_PRECISION = 6
+
+# shapely type ids of Polygon and MultiPolygon
+POLYGON_TYPE_IDS = (3, 6)
+
+# Point layers with more markers than this are clustered, if their config asks for it
+CLUSTER_THRESHOLD = 50
+
 
 def get_visualizable_types() -> list[str]:
     """Return list of spatial types that can be visualized."""
     return sorted(SPATIAL_CONFIGS.keys())
 
 
-def _build_popup_html(record: dict, fields: list[str]) -> str:
-    """Build HTML popup content from record fields."""
-    lines = []
-    for field in fields:
-        value = record.get(field, "")
-        if value:
-            lines.append(f"<b>{field}:</b> {value}")
-    return "<br>".join(lines)
+def _popup_js(fields: list[str]) -> str:
+    """
+    JavaScript function turning a feature's properties into popup HTML, one
+    bold "field: value" line per non-empty field.
+    """
+    return f"""function (props) {{
+        var fields = {json.dumps(fields)};
+        var lines = [];
+        for (var i = 0; i < fields.length; i++) {{
+            var value = props[fields[i]];
+            if (!value) continue;
+            var text = String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+            lines.push("<b>" + fields[i] + ":</b> " + text);
+        }}
+        return lines.join("<br>");
+    }}"""
+
+
+def nan_to_none(frame: pd.DataFrame) -> pd.DataFrame:
+    """NaN is not valid JSON, replace it with None so empty values go out as null."""
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def read_points(config: dict, shp_path: str) -> pd.DataFrame:
+    """Read the coordinates, name and popup fields of a point layer, dropping records without a location."""
+    file_name = os.path.splitext(os.path.basename(shp_path))[0]
+    wanted = list(dict.fromkeys([config["lat"], config["lon"], config["name"], *config["popup_fields"]]))
+    if columnar.is_fresh(file_name):
+        available = columnar.attribute_columns(file_name)
+        frame = columnar.read_frame(file_name, [c for c in wanted if c in available])
+    else:
+        table = dbf.open_dbf(shp_path.replace(".shp", ".dbf"))
+        columns = [c for c in wanted if c in table.field_names]
+        frame = table.to_frame(columns) if isinstance(table, dbf.DBF) else pd.DataFrame(list(table), columns=table.field_names)[columns]
+    return nan_to_none(frame.dropna(subset=[config["lat"], config["lon"]]))
 
 
-def _add_point_layer(feature_group: folium.FeatureGroup, config: dict, shp_path: str) -> None:
-    """Add point markers to a feature group."""
-    import dbfread
-    from folium.plugins import MarkerCluster
+def _point_features(config: dict, frame: pd.DataFrame) -> dict:
+    """:return: a GeoJSON FeatureCollection of the points read by read_points"""
+    lats = frame[config["lat"]].astype(float).tolist()
+    lons = frame[config["lon"]].astype(float).tolist()
+    properties = frame.drop(columns=[config["lat"], config["lon"]], errors="ignore").to_dict("records")
+    features = [
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props}
+        for lat, lon, props in zip(lats, lons, properties, strict=True)
+    ]
+    return {"type": "FeatureCollection", "features": features}
 
-    dbf_path = shp_path.replace(".shp", ".dbf")
-    records = list(dbfread.DBF(dbf_path))
 
-    # Use marker cluster for large datasets
-    use_cluster = config.get("cluster", False) and len(records) > 50
-    if use_cluster:
-        marker_target = MarkerCluster(name=config["label"])
-        marker_target.add_to(feature_group)
-    else:
-        marker_target = feature_group
+def _marker_icon(config: dict) -> dict:
+    """:return: L.AwesomeMarkers.icon options of a point layer"""
+    return {"icon": config["icon"], "prefix": "fa", "markerColor": config["color"]}
 
-    for record in records:
-        lat = record.get(config["lat"])
-        lon = record.get(config["lon"])
 
-        if lat is None or lon is None:
-            continue
+def _is_clustered(config: dict, count: int) -> bool:
+    return config.get("cluster", False) and count > CLUSTER_THRESHOLD
 
-        popup_html = _build_popup_html(record, config["popup_fields"])
-        tooltip = str(record.get(config["name"], ""))
 
-        folium.Marker(
-            location=[float(lat), float(lon)],
-            popup=folium.Popup(popup_html, max_width=300),
-            tooltip=tooltip,
-            icon=folium.Icon(color=config["color"], icon=config["icon"], prefix="fa"),
-        ).add_to(marker_target)
+def _add_point_layer(feature_group: folium.FeatureGroup, layer: dict) -> None:
+    """
+    Add point markers to a feature group.
 
+    The points go into the page as one data array, popups and tooltips are
+    templated in the browser. Large clustered layers use FastMarkerCluster,
+    others a single GeoJSON layer.
+    """
+    from folium.plugins import FastMarkerCluster
 
-def _add_polygon_layer(feature_group: folium.FeatureGroup, config: dict, shp_path: str) -> None:
-    """Add polygon shapes to a feature group."""
-    gdf = gpd.read_file(shp_path)
+    config, frame = layer["config"], layer["frame"]
+    fields = [field for field in config["popup_fields"] if field in frame.columns]
+    name_field = config["name"] if config["name"] in frame.columns else None
+
+    # Use marker cluster for large datasets
+    if layer["cluster"]:
+        lats = frame[config["lat"]].astype(float).tolist()
+        lons = frame[config["lon"]].astype(float).tolist()
+        columns = list(dict.fromkeys([*fields, *([name_field] if name_field else [])]))
+        rows = [[lat, lon, *values] for lat, lon, values in zip(lats, lons, frame[columns].values.tolist(), strict=True)]
+        callback = f"""function (row) {{
+            var columns = {json.dumps(columns)};
+            var props = {{}};
+            for (var i = 0; i < columns.length; i++) props[columns[i]] = row[i + 2];
+            var marker = L.marker(new L.LatLng(row[0], row[1]), {{icon: L.AwesomeMarkers.icon({json.dumps(_marker_icon(config))})}});
+            marker.bindPopup(({_popup_js(fields)})(props), {{maxWidth: 300}});
+            marker.bindTooltip(String(props[{json.dumps(name_field)}] || ""));
+            return marker;
+        }}"""
+        FastMarkerCluster(rows, callback=callback, name=config["label"]).add_to(feature_group)
+        return
+
+    on_each_feature = JsCode(f"""function (feature, layer) {{
+        layer.bindPopup(({_popup_js(fields)})(feature.properties), {{maxWidth: 300}});
+        layer.bindTooltip(String(feature.properties[{json.dumps(name_field)}] || ""));
+    }}""")
+    folium.GeoJson(
+        layer["data"],
+        marker=folium.Marker(icon=folium.Icon(color=config["color"], icon=config["icon"], prefix="fa")),
+        on_each_feature=on_each_feature,
+    ).add_to(feature_group)
+
+
+def read_layer(shp_path: str, columns: list[str] | None = None) -> gpd.GeoDataFrame:
+    """
+    Read a shapefile as WGS84, optionally only the given attribute columns.
+    The layer's GeoParquet copy is read instead when it is fresh.
+    """
+    file_name = os.path.splitext(os.path.basename(shp_path))[0]
+    if columnar.is_fresh(file_name):
+        return columnar.read_geodataframe(file_name, columns)
+    gdf = gpd.read_file(shp_path, columns=columns)
 
     # Convert to WGS84 if needed
     if gdf.crs and gdf.crs != "EPSG:4326":
         gdf = gdf.to_crs("EPSG:4326")
+    return gdf
+
+
+def coordinate_precision(tolerance: float) -> int:
+    """Decimals to round simplified coordinates to, a tenth of the tolerance."""
+    if tolerance <= 0:
+        return FULL_PRECISION
+    return min(FULL_PRECISION, max(0, math.ceil(-math.log10(tolerance)) + 1))
+
+
+def simplify_geometries(geometries: gpd.GeoSeries, tolerance: float) -> gpd.GeoSeries:
+    """
+    Simplify polygons for display and round their coordinates.
+
+    When the polygons form a valid coverage (no overlaps, matching shared
+    edges) every shared edge is simplified once, so neighbouring districts
+    still meet without gaps. Otherwise each polygon is simplified on its own,
+    preserving its topology.
+
+    :param tolerance: maximum distance in degrees a simplified edge may move, 0 only rounds
+    """
+    values = np.asarray(geometries.values, dtype=object)
+    present = ~shapely.is_missing(values)
+    if tolerance > 0 and present.any():
+        shapes = values[present]
+        polygonal = np.isin(shapely.get_type_id(shapes), POLYGON_TYPE_IDS).all()
+        try:
+            if polygonal and shapely.coverage_is_valid(shapes):
+                shapes = shapely.coverage_simplify(shapes, tolerance)
+            else:
+                shapes = shapely.simplify(shapes, tolerance, preserve_topology=True)
+        except (AttributeError, shapely.errors.UnsupportedGEOSVersionError):
+            # coverage operations need shapely 2.1 with GEOS 3.12
+            shapes = shapely.simplify(shapes, tolerance, preserve_topology=True)
+        values = values.copy()
+        values[present] = shapes
+    digits = coordinate_precision(tolerance)
+    values = shapely.transform(values, lambda coords: np.round(coords, digits))
+    return gpd.GeoSeries(values, index=geometries.index, crs=geometries.crs)
+
+
+def polygon_geojson(config: dict, shp_path: str, tolerance: float = 0.0) -> str:
+    """
+    WGS84 GeoJSON of a polygon layer, simplified to *tolerance* and holding only
+    the name and popup fields. Cached per tolerance until the shapefile changes,
+    see map_cache.
+    """
+    file_name = config["file"]
+    text = map_cache.get(file_name, tolerance)
+    if text is not None:
+        return text
+
+    gdf = read_layer(shp_path)
+    fields = [field for field in dict.fromkeys([config["name"], *config["popup_fields"]]) if field in gdf.columns]
+    gdf = gdf[fields].set_geometry(simplify_geometries(gdf.geometry, tolerance))
+    text = gdf.to_json(drop_id=True)
+    map_cache.put(file_name, tolerance, text)
+    return text
+
+
+def _polygon_style(config: dict, highlight: bool = False) -> dict:
+    return {
+        "fillColor": config.get("line_color", "blue"),
+        "color": config.get("line_color", "blue"),
+        "weight": 3 if highlight else 2,
+        "fillOpacity": 0.6 if highlight else 0.3,
+    }
+
+
+def _add_polygon_layer(feature_group: folium.FeatureGroup, layer: dict) -> None:
+    """Add polygon shapes to a feature group."""
+    config, data = layer["config"], layer["data"]
+    columns = data["features"][0]["properties"] if data["features"] else {}
 
     # Create a GeoJson layer with styling
     def style_function(_feature: dict) -> dict:
-        return {
-            "fillColor": config.get("line_color", "blue"),
-            "color": config.get("line_color", "blue"),
-            "weight": 2,
-            "fillOpacity": 0.3,
-        }
+        return _polygon_style(config)
 
     def highlight_function(_feature: dict) -> dict:
-        return {
-            "fillColor": config.get("line_color", "blue"),
-            "color": config.get("line_color", "blue"),
-            "weight": 3,
-            "fillOpacity": 0.6,
-        }
+        return _polygon_style(config, highlight=True)
 
     # Add GeoJson layer
     name_field = config["name"]
 
     geojson = folium.GeoJson(
-        gdf,
+        data,
         style_function=style_function,
         highlight_function=highlight_function,
         tooltip=folium.GeoJsonTooltip(
-            fields=[name_field] if name_field in gdf.columns else [],
-            aliases=["Name:"] if name_field in gdf.columns else [],
+            fields=[name_field] if name_field in columns else [],
+            aliases=["Name:"] if name_field in columns else [],
         ),
     )
 
     geojson.add_to(feature_group)
 
 
-def _add_layer(m: folium.Map, spatial_type: str, show: bool = True) -> None:
-    """Add a spatial layer to the map."""
-    config = SPATIAL_CONFIGS[spatial_type]
+def layer_source_path(config: dict) -> str:
+    """
+    :return: the shapefile path of a layer
+    :raises FileNotFoundError: if the layer has not been fetched
+    """
     shp_path = os.path.join(settings.SPATIAL_CACHE, f"{config['file']}.shp")
     dbf_path = os.path.join(settings.SPATIAL_CACHE, f"{config['file']}.dbf")
 
@@ -229,25 +382,260 @@ def _add_layer(m: folium.Map, spatial_type: str, show: bool = True) -> None:
         raise FileNotFoundError(f"Shapefile not found: {shp_path}. Run 'bomshell spatial fetch' first.")
     if not os.path.exists(dbf_path):
         raise FileNotFoundError(f"Data file not found: {dbf_path}. Run 'bomshell spatial fetch' first.")
+    return shp_path
+
+
+def _prepare_layer(spatial_type: str, tolerance: float = 0.0, external: bool = False, compress: bool = False) -> dict:
+    """
+    Read, reproject, simplify and serialize a layer, everything short of adding
+    it to a map. Layers are independent, so this runs on worker threads.
+
+    :param tolerance: polygon simplification in degrees
+    :param external: serialize to GeoJSON text for a layer file instead of a dict for folium
+    :param compress: with *external*, also gzip the text
+    :return: dict of spatial_type, config, frame (points), cluster, and data, or text and gz with *external*
+    :raises FileNotFoundError: if the layer has not been fetched
+    """
+    config = SPATIAL_CONFIGS[spatial_type]
+    shp_path = layer_source_path(config)
+    layer = {"spatial_type": spatial_type, "config": config, "frame": None, "cluster": False, "data": None, "text": None, "gz": None}
+
+    if config["type"] == "point":
+        frame = read_points(config, shp_path)
+        layer["frame"] = frame
+        layer["cluster"] = _is_clustered(config, len(frame))
+        if external:
+            layer["text"] = json.dumps(_point_features(config, frame), separators=(",", ":"), default=str)
+        elif not layer["cluster"]:
+            layer["data"] = _point_features(config, frame)
+    else:
+        text = polygon_geojson(config, shp_path, tolerance)
+        if external:
+            layer["text"] = text
+        else:
+            layer["data"] = json.loads(text)
+
+    text = layer["text"]
+    if compress and text is not None:
+        layer["gz"] = gzip.compress(text.encode("utf-8"), mtime=0)
+    return layer
+
+
+def prepare_layers(
+    spatial_types: list[str], tolerance: float = 0.0, external: bool = False, compress: bool = False, workers: int | None = None
+) -> list[dict]:
+    """
+    Prepare layers concurrently, see _prepare_layer. Reading and simplifying
+    are mostly I/O and GEOS work that release the GIL, so threads overlap them.
+
+    :param workers: threads, defaults to settings.MAP_WORKERS, 0 is one per layer
+    :return: the prepared layers in the order of *spatial_types*
+    :raises FileNotFoundError: for the first layer, in order, that has not been fetched
+    """
+    workers = settings.MAP_WORKERS if workers is None else workers
+    workers = min(workers or len(spatial_types), len(spatial_types))
+    if workers <= 1:
+        return [_prepare_layer(spatial_type, tolerance, external, compress) for spatial_type in spatial_types]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda spatial_type: _prepare_layer(spatial_type, tolerance, external, compress), spatial_types))
+
+
+def _add_layer(m: folium.Map, layer: dict, show: bool = True) -> None:
+    """Add a prepared layer to the map."""
+    config = layer["config"]
 
     # Create feature group for this layer
     feature_group = folium.FeatureGroup(name=config["label"], show=show)
 
     # Add appropriate layer based on type
     if config["type"] == "point":
-        _add_point_layer(feature_group, config, shp_path)
+        _add_point_layer(feature_group, layer)
     else:
-        _add_polygon_layer(feature_group, config, shp_path)
+        _add_polygon_layer(feature_group, layer)
 
     feature_group.add_to(m)
 
 
-def create_map(spatial_types: str | list[str], output_path: str | None = None) -> str:
+class LazyLayers(JSCSSMixin):
+    """
+    Loads the layers of a map from their own files, each when it is first
+    switched on in the layer control.
+
+    A layer is a ``.js`` file that assigns its GeoJSON to
+    ``window.bomshellLayers``, loaded with a script tag so the map also works
+    from file:// URLs. When a ``.geojson.gz`` copy was written and the page is
+    served over http(s), that is fetched and unpacked with DecompressionStream
+    instead, falling back to the script on any error.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var loaded = window.bomshellLayers = window.bomshellLayers || {};
+
+            function escapeHtml(value) {
+                return String(value).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;");
+            }
+
+            function loadScript(spec, done) {
+                var script = document.createElement("script");
+                script.src = spec.js;
+                script.onload = function () { done(loaded[spec.id]); };
+                document.head.appendChild(script);
+            }
+
+            function loadLayer(spec, done) {
+                if (!spec.gz || location.protocol.indexOf("http") !== 0 || !window.DecompressionStream) {
+                    loadScript(spec, done);
+                    return;
+                }
+                fetch(spec.gz).then(function (response) {
+                    if (!response.ok) throw new Error(response.statusText);
+                    return new Response(response.body.pipeThrough(new DecompressionStream("gzip"))).json();
+                }).then(done).catch(function () { loadScript(spec, done); });
+            }
+
+            function render(spec, data) {
+                var options = {};
+                if (spec.kind === "polygon") {
+                    options.style = function () { return spec.style; };
+                    options.onEachFeature = function (feature, layer) {
+                        var name = feature.properties[spec.name];
+                        if (name !== undefined && name !== null) layer.bindTooltip("<b>Name:</b> " + escapeHtml(name));
+                        layer.on("mouseover", function () { layer.setStyle(spec.highlight); });
+                        layer.on("mouseout", function () { layer.setStyle(spec.style); });
+                    };
+                } else {
+                    options.pointToLayer = function (feature, latlng) {
+                        return L.marker(latlng, {icon: L.AwesomeMarkers.icon(spec.icon)});
+                    };
+                    options.onEachFeature = function (feature, layer) {
+                        layer.bindPopup(spec.popup(feature.properties), {maxWidth: 300});
+                        layer.bindTooltip(String(feature.properties[spec.name] || ""));
+                    };
+                }
+                var layer = L.geoJSON(data, options);
+                if (spec.cluster) layer = L.markerClusterGroup().addLayer(layer);
+                spec.group.addLayer(layer);
+            }
+
+            var specs = [
+            {%- for layer in this.layers %}
+                {
+                    group: {{ layer.group }},
+                    id: {{ layer.id|tojson }},
+                    js: {{ layer.js|tojson }},
+                    gz: {{ layer.gz|tojson }},
+                    kind: {{ layer.kind|tojson }},
+                    name: {{ layer.name|tojson }},
+                    style: {{ layer.style|tojson }},
+                    highlight: {{ layer.highlight|tojson }},
+                    icon: {{ layer.icon|tojson }},
+                    cluster: {{ layer.cluster|tojson }},
+                    popup: {{ layer.popup }}
+                },
+            {%- endfor %}
+            ];
+
+            specs.forEach(function (spec) {
+                function load() {
+                    if (spec.requested) return;
+                    spec.requested = true;
+                    loadLayer(spec, function (data) { render(spec, data); });
+                }
+                map.on("overlayadd", function (e) { if (e.layer === spec.group) load(); });
+                if (map.hasLayer(spec.group)) load();
+            });
+        })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, layers: list[dict]):
+        super().__init__()
+        self._name = "LazyLayers"
+        self.layers = layers
+        # per instance, add_js_link would otherwise change the class lists
+        self.default_js = []
+        self.default_css = []
+        if any(layer["cluster"] for layer in layers):
+            from folium.plugins import MarkerCluster
+
+            self.default_js = list(MarkerCluster.default_js)
+            self.default_css = list(MarkerCluster.default_css)
+
+
+def layers_directory(output_path: str) -> str:
+    """:return: the directory the layer files of an external map are written to, next to the HTML"""
+    return os.path.splitext(output_path)[0] + "_layers"
+
+
+def _add_external_layer(m: folium.Map, layer: dict, layers_dir: str, show: bool) -> dict:
+    """
+    Write a prepared layer to its own files and add an empty feature group for it.
+
+    :return: the LazyLayers entry of the layer
+    """
+    spatial_type, config = layer["spatial_type"], layer["config"]
+    frame = layer["frame"]
+    fields = [field for field in config["popup_fields"] if field in frame.columns] if frame is not None else []
+
+    os.makedirs(layers_dir, exist_ok=True)
+    js_path = os.path.join(layers_dir, f"{spatial_type}.js")
+    gz_path = os.path.join(layers_dir, f"{spatial_type}.geojson.gz")
+    with open(js_path, "w", encoding="utf-8") as f:
+        f.write(f"(window.bomshellLayers = window.bomshellLayers || {{}})[{json.dumps(spatial_type)}] = {layer['text']};\n")
+    if layer["gz"] is not None:
+        with open(gz_path, "wb") as f:
+            f.write(layer["gz"])
+    elif os.path.exists(gz_path):
+        # a copy left by an earlier run would be loaded instead of the new data
+        os.remove(gz_path)
+
+    feature_group = folium.FeatureGroup(name=config["label"], show=show)
+    feature_group.add_to(m)
+    url = os.path.basename(layers_dir) + "/" + spatial_type
+    return {
+        "group": feature_group.get_name(),
+        "id": spatial_type,
+        "js": f"{url}.js",
+        "gz": f"{url}.geojson.gz" if layer["gz"] is not None else None,
+        "kind": config["type"],
+        "name": config["name"],
+        "style": _polygon_style(config) if config["type"] == "polygon" else None,
+        "highlight": _polygon_style(config, highlight=True) if config["type"] == "polygon" else None,
+        "icon": _marker_icon(config) if config["type"] == "point" else None,
+        "cluster": layer["cluster"],
+        "popup": _popup_js(fields) if config["type"] == "point" else "null",
+    }
+
+
+def create_map(
+    spatial_types: str | list[str],
+    output_path: str | None = None,
+    tolerance: float = 0.0,
+    external: bool = False,
+    compress: bool = False,
+    workers: int | None = None,
+) -> str:
     """
     Create a folium map for one or more spatial types.
 
+    With *external* the HTML is only a shell: each layer is written to its own
+    file in layers_directory() and loaded when switched on, see LazyLayers.
+    Only the first layer starts switched on.
+
+    Layers are prepared concurrently, then added to the map one by one in a
+    fixed order, so the output does not depend on which layer is read first.
+
     :param spatial_types: Single type or list of spatial data types to visualize
     :param output_path: Output HTML file path (default: based on types in cache)
+    :param tolerance: Polygon simplification in degrees, see DETAIL_TOLERANCES
+    :param external: write the layers to separate files, loaded on demand
+    :param compress: with *external*, also write gzip-compressed GeoJSON for maps served over http
+    :param workers: threads preparing layers, see prepare_layers
     :return: Path to the generated HTML file
     """
     # Normalize to list
@@ -266,13 +654,6 @@ def create_map(spatial_types: str | list[str], output_path: str | None = None) -
     polygon_types = [t for t in spatial_types if SPATIAL_CONFIGS[t]["type"] == "polygon"]
     point_types = [t for t in spatial_types if SPATIAL_CONFIGS[t]["type"] == "point"]
 
-    for spatial_type in polygon_types + point_types:
-        _add_layer(m, spatial_type, show=True)
-
-    # Add layer control if multiple layers
-    if len(spatial_types) > 1:
-        folium.LayerControl(collapsed=False).add_to(m)
-
     # Determine output path
     if output_path is None:
         if len(spatial_types) == 1:
@@ -280,6 +661,22 @@ def create_map(spatial_types: str | list[str], output_path: str | None = None) -
         else:
             output_path = os.path.join(settings.CACHE, "combined_map.html")
 
+    layers = prepare_layers(polygon_types + point_types, tolerance, external, compress, workers)
+
+    if external:
+        layers_dir = layers_directory(output_path)
+        entries = [_add_external_layer(m, layer, layers_dir, index == 0) for index, layer in enumerate(layers)]
+        # the layer control is how the other layers get loaded
+        folium.LayerControl(collapsed=False).add_to(m)
+        LazyLayers(entries).add_to(m)
+    else:
+        for layer in layers:
+            _add_layer(m, layer, show=True)
+
+        # Add layer control if multiple layers
+        if len(spatial_types) > 1:
+            folium.LayerControl(collapsed=False).add_to(m)
+
     m.save(output_path)
     return output_path
 
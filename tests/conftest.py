@@ -0,0 +1,65 @@
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+from shapely.geometry import box
+
+from bomshell import settings
+
+
+def write_layer(directory, file_name, records, geometries):
+    """Write a small BOM style shapefile (.shp, .shx, .dbf, .prj) into *directory*."""
+    gdf = gpd.GeoDataFrame(records, geometry=geometries, crs="EPSG:4326")
+    gdf.to_file(directory / f"{file_name}.shp", driver="ESRI Shapefile")
+
+
+@pytest.fixture(autouse=True)
+def http_cache_dir(tmp_path):
+    """Keep cached BOM API responses out of the user's cache."""
+    old = (settings.HTTP_CACHE, settings.HTTP_CACHE_REFRESH)
+    settings.HTTP_CACHE = str(tmp_path / "http_cache")
+    settings.HTTP_CACHE_REFRESH = False
+    yield tmp_path / "http_cache"
+    settings.HTTP_CACHE, settings.HTTP_CACHE_REFRESH = old
+
+
+@pytest.fixture()
+def shapefile_writer():
+    return write_layer
+
+
+@pytest.fixture()
+def spatial_cache(tmp_path):
+    """A spatial cache holding a forecast_districts and a point_places layer."""
+    cache = tmp_path / "spatial_cache"
+    cache.mkdir()
+    write_layer(
+        cache,
+        "IDM00001",
+        {
+            "AAC": ["WA_PW001", "WA_PW002", "NSW_PW001"],
+            "DIST_NAME": ["Perth", "Lower West", "Sydney"],
+            "STATE_CODE": ["WA", "WA", "NSW"],
+        },
+        [box(115.0, -33.0, 116.5, -31.0), box(116.5, -33.0, 118.0, -31.0), box(150.0, -34.5, 151.5, -33.0)],
+    )
+    write_layer(
+        cache,
+        "IDM00013",
+        {
+            "PT_NAME": ["Perth", "Perth Airport", "Mandurah", "Sydney"],
+            "STATE_NAME": ["WA", "WA", "WA", "NSW"],
+            "LAT": [-31.95, -31.93, -32.53, -33.87],
+            "LON": [115.86, 115.97, 115.72, 151.21],
+            "ELEVATION": [20.0, 15.0, 5.0, 39.0],
+        },
+        [Point(115.86, -31.95), Point(115.97, -31.93), Point(115.72, -32.53), Point(151.21, -33.87)],
+    )
+
+    old = (settings.CACHE, settings.SPATIAL_CACHE, settings.SPATIAL_DB, settings.SPATIAL_PARQUET, settings.MAP_CACHE)
+    settings.CACHE = str(tmp_path)
+    settings.SPATIAL_CACHE = str(cache)
+    settings.SPATIAL_DB = str(tmp_path / "spatial.sqlite")
+    settings.SPATIAL_PARQUET = str(tmp_path / "parquet_cache")
+    settings.MAP_CACHE = str(tmp_path / "map_cache")
+    yield cache
+    settings.CACHE, settings.SPATIAL_CACHE, settings.SPATIAL_DB, settings.SPATIAL_PARQUET, settings.MAP_CACHE = old
@@ -30,8 +30,8 @@ FORECAST_DATA = {
 class TestForecastCommand:
     def test_single_match(self):
         with (
-            patch("bomshell.forecast.search_location", return_value=LOCATIONS_ONE) as mock_search,
-            patch("bomshell.forecast.get_daily_forecast", return_value=FORECAST_DATA) as mock_fc,
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "miss")) as mock_search,
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "miss")) as mock_fc,
         ):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast", "Roleystone"])
@@ -44,8 +44,8 @@ class TestForecastCommand:
 
     def test_multiple_matches_shows_list(self):
         with (
-            patch("bomshell.forecast.search_location", return_value=LOCATIONS_MULTI),
-            patch("bomshell.forecast.get_daily_forecast", return_value=FORECAST_DATA),
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_MULTI, "miss")),
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "miss")),
         ):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast", "Roleystone"])
@@ -56,7 +56,7 @@ class TestForecastCommand:
             assert "2. Roleystone South" in result.output
 
     def test_no_matches(self):
-        with patch("bomshell.forecast.search_location", return_value=[]):
+        with patch("bomshell.forecast.fetch_locations", return_value=([], "miss")):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast", "nonexistent_xyz"])
 
@@ -64,7 +64,7 @@ class TestForecastCommand:
             assert "No locations found" in result.output
 
     def test_search_api_error(self):
-        with patch("bomshell.forecast.search_location", side_effect=requests.HTTPError("500")):
+        with patch("bomshell.forecast.fetch_locations", side_effect=requests.HTTPError("500")):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast", "Roleystone"])
 
@@ -73,8 +73,8 @@ class TestForecastCommand:
 
     def test_forecast_api_error(self):
         with (
-            patch("bomshell.forecast.search_location", return_value=LOCATIONS_ONE),
-            patch("bomshell.forecast.get_daily_forecast", side_effect=requests.ConnectionError("timeout")),
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "miss")),
+            patch("bomshell.forecast.fetch_daily_forecast", side_effect=requests.ConnectionError("timeout")),
         ):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast", "Roleystone"])
@@ -84,8 +84,8 @@ class TestForecastCommand:
 
     def test_default_town_is_roleystone(self):
         with (
-            patch("bomshell.forecast.search_location", return_value=LOCATIONS_ONE) as mock_search,
-            patch("bomshell.forecast.get_daily_forecast", return_value=FORECAST_DATA),
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "miss")) as mock_search,
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "miss")),
         ):
             runner = CliRunner()
             result = runner.invoke(app, ["forecast"])
@@ -102,8 +102,8 @@ class TestForecastCommand:
 
     def test_json_forecast(self):
         with (
-            patch("bomshell.forecast.search_location", return_value=LOCATIONS_ONE),
-            patch("bomshell.forecast.get_daily_forecast", return_value=FORECAST_DATA),
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "miss")),
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "miss")),
         ):
             runner = CliRunner()
             result = runner.invoke(app, ["--json", "forecast", "Roleystone"])
@@ -113,3 +113,25 @@ class TestForecastCommand:
             assert "location" in data
             assert "forecast" in data
             assert data["location"]["name"] == "Roleystone"
+
+    def test_json_reports_the_cache(self):
+        with (
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "hit")),
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "revalidated")),
+        ):
+            result = CliRunner().invoke(app, ["--json", "forecast", "Roleystone"])
+
+            assert result.exit_code == 0
+            assert json.loads(result.output)["cache"] == {"locations": "hit", "forecast": "revalidated"}
+
+    def test_refresh(self):
+        from bomshell import settings
+
+        with (
+            patch("bomshell.forecast.fetch_locations", return_value=(LOCATIONS_ONE, "miss")),
+            patch("bomshell.forecast.fetch_daily_forecast", return_value=(FORECAST_DATA, "miss")),
+        ):
+            CliRunner().invoke(app, ["forecast", "Roleystone"])
+            assert settings.HTTP_CACHE_REFRESH is False
+            CliRunner().invoke(app, ["forecast", "Roleystone", "--refresh"])
+            assert settings.HTTP_CACHE_REFRESH is True
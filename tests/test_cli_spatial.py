@@ -6,20 +6,39 @@ from bomshell.cli import app
 
 
 class TestSpatialFetch:
-    @patch("bomshell.fetch_gis.fetch_spatial_data")
+    @patch("bomshell.fetch_gis.fetch_spatial_data", return_value=[])
     def test_fetch(self, mock_fetch):
         runner = CliRunner()
         result = runner.invoke(app, ["spatial", "fetch"])
         assert result.exit_code == 0
         mock_fetch.assert_called_once()
 
-    @patch("bomshell.fetch_gis.fetch_spatial_data")
-    def test_sync_sets_overwrite(self, mock_fetch):
+    @patch("bomshell.fetch_gis.sync_spatial_data", return_value=[])
+    def test_sync(self, mock_fetch):
         runner = CliRunner()
         result = runner.invoke(app, ["spatial", "sync"])
         assert result.exit_code == 0
         mock_fetch.assert_called_once()
 
+    @patch("bomshell.fetch_gis.fetch_spatial_data", return_value=["failure"])
+    def test_fetch_failures_exit_nonzero(self, mock_fetch):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "fetch"])
+        assert result.exit_code == 1
+
+    @patch("bomshell.fetch_gis.fetch_spatial_data", return_value=[])
+    def test_ftp_workers_option(self, mock_fetch):
+        from bomshell import settings
+
+        old_workers = settings.FTP_WORKERS
+        try:
+            runner = CliRunner()
+            result = runner.invoke(app, ["spatial", "--ftp-workers", "8", "fetch"])
+            assert result.exit_code == 0
+            assert settings.FTP_WORKERS == 8
+        finally:
+            settings.FTP_WORKERS = old_workers
+
     @patch("bomshell.fetch_gis.create_spatial_database")
     def test_build(self, mock_build):
         runner = CliRunner()
@@ -27,6 +46,13 @@ class TestSpatialFetch:
         assert result.exit_code == 0
         mock_build.assert_called_once()
 
+    @patch("bomshell.fetch_gis.create_spatial_database")
+    def test_build_workers(self, mock_build):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "build", "--workers", "3"])
+        assert result.exit_code == 0
+        mock_build.assert_called_once_with(workers=3, force=False)
+
 
 class TestSpatialCsvdump:
     def test_no_spatial_type_shows_help(self):
@@ -39,7 +65,37 @@ class TestSpatialCsvdump:
         runner = CliRunner()
         result = runner.invoke(app, ["spatial", "csvdump", "-s", "forecast_districts"])
         assert result.exit_code == 0
-        mock_dump.assert_called_once_with("forecast_districts")
+        mock_dump.assert_called_once_with("forecast_districts", columns=None, where=None, output_format="csv", output_path=None)
+
+    @patch("bomshell.dump_gis.dump_to_csv")
+    def test_options(self, mock_dump):
+        runner = CliRunner()
+        result = runner.invoke(
+            app,
+            [
+                "spatial",
+                "csvdump",
+                "-s",
+                "forecast_districts",
+                "-c",
+                "aac, dist_name",
+                "-w",
+                "STATE_CODE=WA",
+                "-f",
+                "parquet",
+                "-o",
+                "out.parquet",
+            ],
+        )
+        assert result.exit_code == 0
+        mock_dump.assert_called_once_with(
+            "forecast_districts", columns=["aac", "dist_name"], where=["STATE_CODE=WA"], output_format="parquet", output_path="out.parquet"
+        )
+
+    def test_unknown_column(self, spatial_cache):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "csvdump", "-s", "forecast_districts", "-c", "nope"])
+        assert result.exit_code == 1
 
 
 class TestSpatialTabledump:
@@ -53,7 +109,40 @@ class TestSpatialTabledump:
         runner = CliRunner()
         result = runner.invoke(app, ["spatial", "tabledump", "-s", "forecast_districts"])
         assert result.exit_code == 0
-        mock_dump.assert_called_once_with("forecast_districts")
+        mock_dump.assert_called_once_with("forecast_districts", page=None, page_size=50, interactive=False)
+
+    @patch("bomshell.dump_gis.dump_to_table")
+    def test_paging_options(self, mock_dump):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "tabledump", "-s", "point_places", "--page", "2", "--page-size", "10", "-i"])
+        assert result.exit_code == 0
+        mock_dump.assert_called_once_with("point_places", page=2, page_size=10, interactive=True)
+
+    def test_page_out_of_range(self, spatial_cache):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "tabledump", "-s", "point_places", "--page", "9", "--page-size", "3"])
+        assert result.exit_code == 1
+        assert "past the last page" in result.output
+
+
+class TestSpatialTabledumpJson:
+    def test_json_formats(self, spatial_cache):
+        import json
+
+        from bomshell import output
+
+        runner = CliRunner()
+        result = runner.invoke(app, ["--json", "spatial", "tabledump", "-s", "point_places"])
+        assert result.exit_code == 0
+        assert [r["PT_NAME"] for r in json.loads(result.output)] == ["Perth", "Perth Airport", "Mandurah", "Sydney"]
+
+        try:
+            result = runner.invoke(app, ["--json-format", "ndjson", "spatial", "tabledump", "-s", "point_places"])
+            assert result.exit_code == 0
+            assert json.loads(result.output.splitlines()[-1])["PT_NAME"] == "Sydney"
+        finally:
+            output.set_json_mode(False)
+            output.set_json_format("pretty")
 
 
 class TestSpatialMap:
@@ -70,6 +159,33 @@ class TestSpatialMap:
         assert result.exit_code == 0
         assert "Map saved to" in result.output
 
+    @patch("bomshell.visualize.create_map", return_value="/tmp/test.html")
+    def test_detail_and_simplify(self, mock_create):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "map", "-s", "marine_zones", "--no-open", "--detail", "low"])
+        assert result.exit_code == 0
+        assert mock_create.call_args.kwargs["tolerance"] == 0.01
+        result = runner.invoke(app, ["spatial", "map", "-s", "marine_zones", "--no-open", "-d", "low", "--simplify", "0.05"])
+        assert mock_create.call_args.kwargs["tolerance"] == 0.05
+
+    @patch("bomshell.visualize.create_map", return_value="/tmp/test.html")
+    def test_gzip_implies_external(self, mock_create):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "map", "-s", "marine_zones", "--no-open"])
+        assert mock_create.call_args.kwargs["external"] is False
+        result = runner.invoke(app, ["spatial", "map", "-s", "marine_zones", "--no-open", "--gzip"])
+        assert result.exit_code == 0
+        assert mock_create.call_args.kwargs["external"] is True
+        assert mock_create.call_args.kwargs["compress"] is True
+        assert "/tmp/test_layers" in result.output
+
+    @patch("bomshell.visualize.create_map", return_value="/tmp/test.html")
+    def test_workers(self, mock_create):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "map", "-s", "marine_zones", "--no-open", "-w", "2"])
+        assert result.exit_code == 0
+        assert mock_create.call_args.kwargs["workers"] == 2
+
     @patch("bomshell.visualize.create_map", side_effect=FileNotFoundError("not found"))
     def test_missing_data_shows_error(self, mock_create):
         runner = CliRunner()
@@ -94,6 +210,144 @@ class TestSpatialMap:
         assert "layer control" in result.output
 
 
+class TestSpatialLocate:
+    @patch("bomshell.locate.locate", return_value={"forecast_districts": [{"dist_name": "Perth", "aac": "WA_PW001"}]})
+    def test_negative_latitude(self, mock_locate):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "locate", "-31.95", "115.86"])
+        assert result.exit_code == 0
+        mock_locate.assert_called_once_with(-31.95, 115.86, None)
+        assert "Perth (WA_PW001)" in result.output
+
+    @patch("bomshell.locate.locate", return_value={"forecast_districts": []})
+    def test_json(self, mock_locate):
+        import json
+
+        runner = CliRunner()
+        result = runner.invoke(app, ["--json", "spatial", "locate", "-31.95", "115.86", "-s", "forecast_districts"])
+        assert result.exit_code == 0
+        mock_locate.assert_called_once_with(-31.95, 115.86, ["forecast_districts"])
+        assert json.loads(result.output)["districts"] == {"forecast_districts": []}
+
+    @patch("bomshell.locate.locate", side_effect=FileNotFoundError("Spatial database not found"))
+    def test_missing_database(self, mock_locate):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "locate", "-31.95", "115.86"])
+        assert result.exit_code == 1
+        assert "not found" in result.output
+
+
+class TestSpatialLocateBatch:
+    @patch("bomshell.locate.write_batch")
+    @patch("bomshell.locate.locate_batch", return_value=iter([]))
+    def test_input_file(self, mock_batch, mock_write):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "locate", "--input", "coords.csv", "--format", "ndjson", "-w", "2"])
+        assert result.exit_code == 0
+        mock_batch.assert_called_once_with("coords.csv", None, chunk_size=50_000, workers=2)
+        assert mock_write.call_args[0][2] == "ndjson"
+
+    def test_no_coordinate_or_input(self):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "locate"])
+        assert result.exit_code == 1
+        assert "--input" in result.output
+
+
+class TestSpatialNearest:
+    @patch("bomshell.nearest.nearest", return_value=[{"Full_Name": "Perth (Serpentine)", "distance_km": 48.2}])
+    def test_k_nearest(self, mock_nearest):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "nearest", "-31.95", "115.86", "-k", "3"])
+        assert result.exit_code == 0
+        mock_nearest.assert_called_once_with(-31.95, 115.86, "radar_location", 3)
+        assert "Perth (Serpentine)" in result.output
+
+    @patch("bomshell.locate.write_batch")
+    @patch("bomshell.nearest.nearest_frames", return_value=iter([]))
+    def test_input_file(self, mock_frames, mock_write):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "nearest", "--input", "coords.csv", "-s", "point_places"])
+        assert result.exit_code == 0
+        mock_frames.assert_called_once_with("coords.csv", "point_places", 1)
+
+    @patch("bomshell.nearest.nearest", side_effect=FileNotFoundError("Data file not found"))
+    def test_missing_data(self, mock_nearest):
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "nearest", "-31.95", "115.86"])
+        assert result.exit_code == 1
+
+
+class TestSpatialQuery:
+    def test_streams_csv(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        runner = CliRunner()
+        result = runner.invoke(
+            app, ["spatial", "query", "-s", "forecast_districts", "--where", "state_code='WA'", "--columns", "aac,dist_name"]
+        )
+        assert result.exit_code == 0
+        assert result.output.splitlines() == ["aac,dist_name", "WA_PW001,Perth", "WA_PW002,Lower West"]
+
+    def test_ndjson_limit(self, spatial_cache):
+        import json
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "query", "-s", "point_places", "-c", "pt_name", "-n", "2", "-f", "ndjson"])
+        assert result.exit_code == 0
+        assert [json.loads(line) for line in result.output.splitlines()] == [{"pt_name": "Perth"}, {"pt_name": "Perth Airport"}]
+
+    def test_bad_column(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "query", "-s", "point_places", "-c", "nope"])
+        assert result.exit_code == 1
+
+
+class TestSpatialSearch:
+    def test_search(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "search", "perth"])
+        assert result.exit_code == 0
+        assert "Perth Airport (point_places)  WA" in result.output
+        assert "Perth (forecast_districts)  WA_PW001, WA" in result.output
+
+    def test_missing_database(self, tmp_path):
+        from bomshell import settings
+
+        old_db = settings.SPATIAL_DB
+        try:
+            settings.SPATIAL_DB = str(tmp_path / "nope.sqlite")
+            runner = CliRunner()
+            result = runner.invoke(app, ["spatial", "search", "perth"])
+            assert result.exit_code == 1
+        finally:
+            settings.SPATIAL_DB = old_db
+
+    def test_database_without_name_index(self, spatial_cache):
+        import sqlite3
+
+        from bomshell import settings
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            db.execute("DROP TABLE names_fts")
+        runner = CliRunner()
+        result = runner.invoke(app, ["spatial", "search", "perth"])
+        assert result.exit_code == 1
+        assert "spatial build" in result.output
+
+
 class TestSpatialHelp:
     def test_spatial_help(self):
         runner = CliRunner()
@@ -0,0 +1,88 @@
+import json
+import os
+
+from bomshell import columnar
+from bomshell import settings
+from bomshell.fetch_gis import create_spatial_database
+
+
+class TestBuildWritesParquet:
+    def test_layers_written_with_geometry(self, spatial_cache):
+        create_spatial_database(workers=1)
+        assert columnar.is_fresh("IDM00001")
+        gdf = columnar.read_geodataframe("IDM00001")
+        assert list(gdf["DIST_NAME"]) == ["Perth", "Lower West", "Sydney"]
+        assert gdf.crs == "EPSG:4326"
+        assert gdf.geometry.notna().all()
+
+    def test_missing_parquet_forces_rebuild(self, spatial_cache):
+        create_spatial_database(workers=1)
+        os.remove(columnar.parquet_path("IDM00013"))
+        create_spatial_database(workers=1)
+        assert columnar.is_fresh("IDM00013")
+
+
+class TestFreshness:
+    def test_stale_when_source_changed(self, spatial_cache, shapefile_writer):
+        from shapely.geometry import Point
+
+        create_spatial_database(workers=1)
+        shapefile_writer(
+            spatial_cache,
+            "IDM00013",
+            {"PT_NAME": ["Darwin"], "STATE_NAME": ["NT"], "LAT": [-12.46], "LON": [130.84], "ELEVATION": [30.0]},
+            [Point(130.84, -12.46)],
+        )
+        assert not columnar.is_fresh("IDM00013")
+        assert columnar.is_fresh("IDM00001")
+
+    def test_touched_but_identical_source_is_fresh(self, spatial_cache):
+        create_spatial_database(workers=1)
+        dbf_path = os.path.join(settings.SPATIAL_CACHE, "IDM00001.dbf")
+        parquet_mtime = os.path.getmtime(columnar.parquet_path("IDM00001"))
+        os.utime(dbf_path, (parquet_mtime + 10, parquet_mtime + 10))
+        assert columnar.is_fresh("IDM00001")
+        with open(os.path.join(settings.SPATIAL_PARQUET, "IDM00001.json"), encoding="utf-8") as f:
+            assert json.load(f)["mtime"] == parquet_mtime + 10
+
+    def test_written_without_sources_is_not_fresh(self, spatial_cache):
+        columnar.write_layer(columnar.parquet_path("IDM00001"), [{"AAC": "WA_PW001"}])
+        assert not columnar.is_fresh("IDM00001")
+
+    def test_never_built_is_not_fresh(self, spatial_cache):
+        assert not columnar.is_fresh("IDM00001")
+
+
+class TestReaders:
+    def test_iter_records_selects_columns(self, spatial_cache):
+        create_spatial_database(workers=1)
+        records = list(columnar.iter_records("IDM00013", columns=["PT_NAME"]))
+        assert records[0] == {"PT_NAME": "Perth"}
+        assert len(records) == 4
+
+    def test_attribute_columns_keep_dbf_names(self, spatial_cache):
+        create_spatial_database(workers=1)
+        assert columnar.attribute_columns("IDM00001") == ["AAC", "DIST_NAME", "STATE_CODE"]
+
+    def test_dump_reads_parquet_when_fresh(self, spatial_cache):
+        from bomshell.dump_gis import read_records
+
+        create_spatial_database(workers=1)
+        field_names, records = read_records("forecast_districts")
+        assert field_names == ["AAC", "DIST_NAME", "STATE_CODE"]
+        assert next(records)["AAC"] == "WA_PW001"
+
+
+class TestWriteLayer:
+    def test_integers_with_blanks_stay_integers(self, tmp_path, monkeypatch):
+        import geopandas as gpd
+        from shapely.geometry import Point
+
+        monkeypatch.setattr(settings, "SPATIAL_PARQUET", str(tmp_path))
+        records = [{"ID": 12, "NAME": "a"}, {"ID": None, "NAME": "b"}]
+        geometry = gpd.GeoSeries([Point(0, 0), Point(1, 1)], crs="EPSG:4326")
+        for file_name, layer_geometry in (("with_geometry", geometry), ("without_geometry", None)):
+            columnar.write_layer(columnar.parquet_path(file_name), records, layer_geometry)
+            assert list(columnar.iter_records(file_name)) == records
+        assert str(columnar.read_frame("with_geometry")["ID"].dtype) == "Int64"
+        assert list(columnar.read_geodataframe("with_geometry").geometry) == list(geometry)
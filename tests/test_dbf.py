@@ -0,0 +1,96 @@
+import datetime
+import struct
+
+import dbfread
+import numpy as np
+import pytest
+
+from bomshell import dbf
+
+
+def _write_dbf(path, fields, rows):
+    """
+    Write a minimal dBase III file.
+
+    :param fields: list of (name, type, length, decimal count)
+    :param rows: list of (deletion flag, list of raw field bytes)
+    """
+    header_length = 32 + 32 * len(fields) + 1
+    record_length = 1 + sum(length for _n, _t, length, _d in fields)
+    data = struct.pack("<BBBBIHH20x", 3, 124, 1, 1, len(rows), header_length, record_length)
+    for name, field_type, length, decimals in fields:
+        data += struct.pack("<11sc4xBB14x", name.encode(), field_type.encode(), length, decimals)
+    data += b"\r"
+    for flag, values in rows:
+        data += flag + b"".join(value.ljust(length) for value, (_n, _t, length, _d) in zip(values, fields, strict=True))
+    path.write_bytes(data + b"\x1a")
+    return str(path)
+
+
+FIELDS = [("NAME", "C", 8, 0), ("COUNT", "N", 5, 0), ("LAT", "N", 8, 3), ("DAY", "D", 8, 0), ("OK", "L", 1, 0)]
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    return _write_dbf(
+        tmp_path / "t.dbf",
+        FIELDS,
+        [
+            (b" ", [b"Perth", b"   12", b" -31.950", b"20240102", b"T"]),
+            (b"*", [b"Gone", b"    1", b"   0.000", b"20240101", b"F"]),
+            (b" ", [b"", b"     ", b"", b"        ", b"?"]),
+            (b" ", [b"Sydney", b"*****", b" -33.870", b"00000000", b"n"]),
+        ],
+    )
+
+
+class TestDBF:
+    def test_matches_dbfread(self, table_path):
+        assert list(dbf.DBF(table_path)) == [dict(record) for record in dbfread.DBF(table_path)]
+
+    def test_decodes_values(self, table_path):
+        records = list(dbf.DBF(table_path))
+        assert records[0] == {"NAME": "Perth", "COUNT": 12, "LAT": -31.95, "DAY": datetime.date(2024, 1, 2), "OK": True}
+        assert records[1] == {"NAME": "", "COUNT": None, "LAT": None, "DAY": None, "OK": None}
+        assert records[2]["OK"] is False
+
+    def test_skips_deleted_records(self, table_path):
+        table = dbf.DBF(table_path)
+        assert len(table) == 3
+        assert "Gone" not in list(table.column("NAME"))
+
+    def test_numeric_column_without_blanks_is_an_array(self, tmp_path):
+        path = _write_dbf(tmp_path / "n.dbf", [("LAT", "N", 8, 3)], [(b" ", [b" -31.950"]), (b" ", [b" -33.870"])])
+        column = dbf.DBF(path).column("LAT")
+        assert column.dtype == np.float64
+        assert column.tolist() == [-31.95, -33.87]
+
+    def test_iterates_in_windows(self, table_path, monkeypatch):
+        monkeypatch.setattr(dbf, "READ_BATCH_SIZE", 2)
+        table = dbf.DBF(table_path)
+        assert list(table) == [dict(record) for record in dbfread.DBF(table_path)]
+        assert list(table.iter_records(["NAME"], start=1)) == [{"NAME": ""}, {"NAME": "Sydney"}]
+        assert table._columns == {}
+
+    def test_to_frame_selects_columns(self, table_path):
+        frame = dbf.DBF(table_path).to_frame(["NAME"])
+        assert list(frame.columns) == ["NAME"]
+        assert list(frame["NAME"]) == ["Perth", "", "Sydney"]
+
+    def test_shapefile_layers_match_dbfread(self, spatial_cache):
+        for file_name in ("IDM00001", "IDM00013"):
+            path = str(spatial_cache / f"{file_name}.dbf")
+            assert list(dbf.DBF(path)) == [dict(record) for record in dbfread.DBF(path)]
+
+
+class TestOpenDBF:
+    def test_uses_numpy_reader(self, table_path):
+        assert isinstance(dbf.open_dbf(table_path), dbf.DBF)
+
+    def test_falls_back_to_dbfread(self, tmp_path):
+        path = _write_dbf(tmp_path / "m.dbf", [("NAME", "C", 4, 0), ("PRICE", "Y", 8, 4)], [(b" ", [b"a", b"\0" * 8])])
+        with pytest.raises(dbf.UnsupportedFieldType):
+            dbf.DBF(path)
+        table = dbf.open_dbf(path)
+        assert isinstance(table, dbfread.DBF)
+        assert [record["NAME"] for record in table] == ["a"]
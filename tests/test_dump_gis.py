@@ -0,0 +1,121 @@
+import csv
+import json
+
+import pyarrow.parquet as pq
+import pytest
+
+from bomshell import dump_gis
+from bomshell.fetch_gis import create_spatial_database
+
+
+@pytest.fixture(params=["dbf", "parquet"])
+def layer_source(request, spatial_cache):
+    """Dump from the shapefile DBFs, or from the GeoParquet copies written by a build."""
+    if request.param == "parquet":
+        create_spatial_database(workers=1)
+    return spatial_cache
+
+
+class TestDumpToCsv:
+    def test_whole_table(self, layer_source, tmp_path):
+        out = tmp_path / "out.csv"
+        dump_gis.dump_to_csv("forecast_districts", output_path=str(out))
+        rows = list(csv.reader(out.open()))
+        assert rows[0] == ["AAC", "DIST_NAME", "STATE_CODE"]
+        assert len(rows) == 4
+
+    def test_columns_and_filters(self, layer_source, tmp_path):
+        out = tmp_path / "out.csv"
+        dump_gis.dump_to_csv(
+            "forecast_districts", columns=["dist_name"], where=["state_code = 'WA'", "AAC!=WA_PW002"], output_path=str(out)
+        )
+        assert out.read_text().splitlines() == ["DIST_NAME", "Perth"]
+
+    def test_ndjson(self, layer_source, tmp_path):
+        out = tmp_path / "out.ndjson"
+        dump_gis.dump_to_csv("point_places", columns=["PT_NAME", "LAT"], output_format="ndjson", output_path=str(out))
+        records = [json.loads(line) for line in out.read_text().splitlines()]
+        assert records[0] == {"PT_NAME": "Perth", "LAT": -31.95}
+        assert len(records) == 4
+
+    def test_parquet_row_groups(self, layer_source, tmp_path, monkeypatch):
+        monkeypatch.setattr(dump_gis, "PARQUET_ROW_GROUP_SIZE", 3)
+        out = tmp_path / "out.parquet"
+        dump_gis.dump_to_csv("point_places", columns=["PT_NAME", "ELEVATION"], output_format="parquet", output_path=str(out))
+        parquet_file = pq.ParquetFile(out)
+        assert parquet_file.metadata.num_row_groups == 2
+        assert parquet_file.read().to_pylist()[0] == {"PT_NAME": "Perth", "ELEVATION": 20.0}
+
+    def test_parquet_no_matches(self, layer_source, tmp_path):
+        out = tmp_path / "out.parquet"
+        dump_gis.dump_to_csv("point_places", where=["PT_NAME=Nowhere"], output_format="parquet", output_path=str(out))
+        assert pq.read_table(out).num_rows == 0
+
+    def test_stdout(self, layer_source, capsys):
+        dump_gis.dump_to_csv("forecast_districts", columns=["AAC"], where=["DIST_NAME=Sydney"])
+        assert capsys.readouterr().out.splitlines() == ["AAC", "NSW_PW001"]
+
+
+class TestParseFilters:
+    def test_unknown_column(self):
+        with pytest.raises(ValueError, match="Unknown columns"):
+            dump_gis.parse_filters(["nope=1"], ["AAC"])
+
+    def test_malformed(self):
+        with pytest.raises(ValueError, match="Invalid filter"):
+            dump_gis.parse_filters(["AAC"], ["AAC"])
+
+
+class TestDumpToTable:
+    def test_page(self, layer_source, capsys):
+        dump_gis.dump_to_table("point_places", page=2, page_size=3)
+        out = capsys.readouterr().out
+        assert "Sydney" in out
+        assert "Mandurah" not in out
+        assert "Page 2 of 2, rows 4-4 of 4" in out
+
+    def test_page_past_the_end(self, layer_source):
+        with pytest.raises(ValueError, match="Page 9 is past the last page, point_places has 2 page"):
+            dump_gis.dump_to_table("point_places", page=9, page_size=3)
+
+    def test_last_page_of_exact_fit(self, layer_source, capsys):
+        dump_gis.dump_to_table("point_places", page=2, page_size=2)
+        assert "Page 2 of 2, rows 3-4 of 4" in capsys.readouterr().out
+
+    def test_whole_table(self, layer_source, capsys):
+        dump_gis.dump_to_table("point_places")
+        out = capsys.readouterr().out
+        assert "Perth Airport" in out
+        assert "Page" not in out
+
+    def test_page_widths_from_sample(self, layer_source, monkeypatch, capsys):
+        monkeypatch.setattr(dump_gis, "WIDTH_SAMPLE_SIZE", 1)
+        dump_gis.dump_to_table("point_places", page=1)
+        out = capsys.readouterr().out
+        # sized on the header and "Perth", longer names are cut off
+        assert "Perth Airport" not in out
+        assert "Mandur…" in out
+
+    def test_whole_table_is_not_cut_off(self, layer_source, monkeypatch, capsys):
+        monkeypatch.setattr(dump_gis, "WIDTH_SAMPLE_SIZE", 1)
+        dump_gis.dump_to_table("point_places")
+        out = capsys.readouterr().out
+        assert "Perth Airport" in out
+        assert "…" not in out
+
+    def test_read_window(self, layer_source):
+        _, records = dump_gis.read_records("point_places", columns=["PT_NAME"], start=1, stop=3)
+        assert list(records) == [{"PT_NAME": "Perth Airport"}, {"PT_NAME": "Mandurah"}]
+        assert dump_gis.count_records("point_places") == 4
+
+    def test_pager(self, layer_source, monkeypatch):
+        from rich.console import Console
+
+        keys = iter(["n", "n", "p", "q"])
+        monkeypatch.setattr(dump_gis.typer, "getchar", lambda: next(keys))
+        console = Console(force_terminal=True, record=True, width=200)
+        field_names, sample = dump_gis.read_records("point_places")
+        dump_gis._run_pager("point_places", field_names, dump_gis._column_widths(field_names, sample), 2, 4, console)
+        text = console.export_text()
+        assert text.count("Page 2 of 2") == 2
+        assert "Page 1 of 2" in text
@@ -1,27 +1,34 @@
+import io
+import time
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
-from bomshell.fetch import remove_existing_file
+import ftputil.error
+import pytest
 
+from bomshell.fetch import FTPSession
+from bomshell.fetch import FTPSessionPool
+from bomshell.fetch import needs_download
 
-class TestRemoveExistingFile:
+
+class TestNeedsDownload:
     def test_file_does_not_exist(self, tmp_path):
-        result = remove_existing_file(str(tmp_path / "nope.dbf"), overwrite=False)
+        result = needs_download(str(tmp_path / "nope.dbf"), overwrite=False)
         assert result is True
 
     def test_file_exists_no_overwrite(self, tmp_path):
         f = tmp_path / "existing.dbf"
         f.write_text("data")
-        result = remove_existing_file(str(f), overwrite=False)
+        result = needs_download(str(f), overwrite=False)
         assert result is False
         assert f.exists()
 
-    def test_file_exists_with_overwrite(self, tmp_path):
+    def test_file_exists_with_overwrite_is_kept(self, tmp_path):
         f = tmp_path / "existing.dbf"
         f.write_text("data")
-        result = remove_existing_file(str(f), overwrite=True)
+        result = needs_download(str(f), overwrite=True)
         assert result is True
-        assert not f.exists()
+        assert f.exists()
 
 
 class TestGetFile:
@@ -57,13 +64,171 @@ class TestGetFile:
             settings.SPATIAL_CACHE = str(tmp_path)
             settings.OVERWRITE = False
 
-            mock_host = MagicMock()
-            mock_host.path.exists.return_value = True
-            mock_ftputil.FTPHost.return_value.__enter__ = MagicMock(return_value=mock_host)
-            mock_ftputil.FTPHost.return_value.__exit__ = MagicMock(return_value=False)
+            mock_host = _remote_host(b"remote data")
+            mock_ftputil.FTPHost.return_value = mock_host
 
             result = get_file("/some/dir", "new.dbf", "ftp.example.com")
             assert result is True
+            assert (tmp_path / "new.dbf").read_bytes() == b"remote data"
+            assert not (tmp_path / "new.dbf.part").exists()
+            mock_host.open.assert_called_once_with("/some/dir/new.dbf", "rb", rest=None)
+            mock_host.close.assert_called_once()
         finally:
             settings.SPATIAL_CACHE = old_cache
             settings.OVERWRITE = old_overwrite
+
+
+def _remote_host(data, mtime=0.0):
+    """A mock FTPHost serving *data*, honouring the REST offset."""
+    host = MagicMock()
+    host.path.exists.return_value = True
+    host.path.getsize.return_value = len(data)
+    host.path.getmtime.return_value = mtime
+    host.open.side_effect = lambda path, mode, rest=None: io.BytesIO(data[rest or 0 :])
+    return host
+
+
+def _session(host):
+    session = MagicMock()
+    session.run.side_effect = lambda operation: operation(host)
+    return session
+
+
+class TestDownload:
+    def _get_file(self, tmp_path, session):
+        from bomshell import settings
+        from bomshell.fetch import get_file
+
+        old_cache = settings.SPATIAL_CACHE
+        try:
+            settings.SPATIAL_CACHE = str(tmp_path)
+            return get_file("/some/dir", "layer.shp", "ftp.example.com", session=session, overwrite=True)
+        finally:
+            settings.SPATIAL_CACHE = old_cache
+
+    def test_resumes_partial_download(self, tmp_path):
+        (tmp_path / "layer.shp.part").write_bytes(b"0123")
+        host = _remote_host(b"0123456789")
+
+        assert self._get_file(tmp_path, _session(host)) is True
+        host.open.assert_called_once_with("/some/dir/layer.shp", "rb", rest=4)
+        assert (tmp_path / "layer.shp").read_bytes() == b"0123456789"
+
+    def test_stale_partial_restarts(self, tmp_path):
+        (tmp_path / "layer.shp.part").write_bytes(b"old")
+        host = _remote_host(b"0123456789", mtime=time.time() + 3600)
+
+        assert self._get_file(tmp_path, _session(host)) is True
+        host.open.assert_called_once_with("/some/dir/layer.shp", "rb", rest=None)
+        assert (tmp_path / "layer.shp").read_bytes() == b"0123456789"
+
+    def test_short_transfer_keeps_existing_file(self, tmp_path):
+        from bomshell.fetch import FetchError
+
+        (tmp_path / "layer.shp").write_bytes(b"complete old version")
+        host = _remote_host(b"0123456789")
+        host.open.side_effect = lambda path, mode, rest=None: io.BytesIO(b"01234")
+
+        with pytest.raises(FetchError, match="size mismatch"):
+            self._get_file(tmp_path, _session(host))
+        assert (tmp_path / "layer.shp").read_bytes() == b"complete old version"
+        assert (tmp_path / "layer.shp.part").read_bytes() == b"01234"
+
+    def test_timeout_resumes_on_reconnect(self, tmp_path):
+        from bomshell.fetch import FTPSession
+
+        class DroppingStream(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise ftputil.error.FTPOSError("timed out")
+                return super().read(4)
+
+        dropped = _remote_host(b"0123456789")
+        dropped.open.side_effect = lambda path, mode, rest=None: DroppingStream(b"0123456789")
+        fresh = _remote_host(b"0123456789")
+
+        with patch("bomshell.fetch.ftputil.FTPHost", side_effect=[dropped, fresh]), FTPSession("ftp.example.com") as session:
+            assert self._get_file(tmp_path, session) is True
+        fresh.open.assert_called_once_with("/some/dir/layer.shp", "rb", rest=4)
+        assert (tmp_path / "layer.shp").read_bytes() == b"0123456789"
+
+
+class TestFTPSession:
+    @patch("bomshell.fetch.ftputil.FTPHost")
+    def test_connects_lazily(self, mock_ftp_host):
+        with FTPSession("ftp.example.com"):
+            pass
+        mock_ftp_host.assert_not_called()
+
+    @patch("bomshell.fetch.ftputil.FTPHost")
+    def test_reuses_one_login(self, mock_ftp_host):
+        with FTPSession("ftp.example.com") as session:
+            for _ in range(5):
+                session.run(lambda host: host.download("a", "b"))
+        mock_ftp_host.assert_called_once()
+        mock_ftp_host.return_value.close.assert_called_once()
+
+    @patch("bomshell.fetch.ftputil.FTPHost")
+    def test_reconnects_when_link_dropped(self, mock_ftp_host):
+        dropped = MagicMock()
+        dropped.download.side_effect = ftputil.error.FTPOSError("connection reset")
+        fresh = MagicMock()
+        mock_ftp_host.side_effect = [dropped, fresh]
+
+        with FTPSession("ftp.example.com") as session:
+            session.run(lambda host: host.download("a", "b"))
+
+        assert mock_ftp_host.call_count == 2
+        dropped.close.assert_called_once()
+        fresh.download.assert_called_once_with("a", "b")
+
+    @patch("bomshell.fetch.ftputil")
+    def test_get_file_uses_given_session(self, mock_ftputil, tmp_path):
+        from bomshell import settings
+        from bomshell.fetch import get_file
+
+        old_cache = settings.SPATIAL_CACHE
+        try:
+            settings.SPATIAL_CACHE = str(tmp_path)
+            session = MagicMock()
+            session.run.return_value = True
+
+            assert get_file("/some/dir", "a.dbf", "ftp.example.com", session=session) is True
+            assert get_file("/some/dir", "b.dbf", "ftp.example.com", session=session) is True
+            assert session.run.call_count == 2
+            mock_ftputil.FTPHost.assert_not_called()
+        finally:
+            settings.SPATIAL_CACHE = old_cache
+
+
+class TestFTPSessionPool:
+    @patch("bomshell.fetch.ftputil.FTPHost")
+    def test_one_session_per_thread(self, mock_ftp_host):
+        import threading
+
+        seen = []
+        with FTPSessionPool("ftp.example.com") as pool:
+            seen.append(pool.session())
+            seen.append(pool.session())
+            worker = threading.Thread(target=lambda: seen.append(pool.session()))
+            worker.start()
+            worker.join()
+
+        assert seen[0] is seen[1]
+        assert seen[2] is not seen[0]
+
+
+class TestStatRemote:
+    def test_skips_missing_files(self):
+        from bomshell.fetch import stat_remote
+
+        host = MagicMock()
+        host.path.exists.side_effect = lambda path: path.endswith(".dbf")
+        host.path.getsize.return_value = 10
+        host.path.getmtime.return_value = 1000.0
+        session = MagicMock()
+        session.run.side_effect = lambda operation: operation(host)
+
+        stats = stat_remote(session, "/some/dir", ["a.dbf", "a.prj"])
+        assert stats == {"a.dbf": {"size": 10, "mtime": 1000.0}}
+        host.path.getsize.assert_called_once_with("/some/dir/a.dbf")
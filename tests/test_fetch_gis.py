@@ -1,5 +1,8 @@
+import os
 from unittest.mock import patch
 
+import pytest
+
 from bomshell import settings
 from bomshell.fetch_gis import get_gis_types
 from bomshell.fetch_gis import get_source_file_name
@@ -29,8 +32,15 @@ class TestGetSourceFileName:
 
 
 class TestFetchSpatialData:
+    @pytest.fixture(autouse=True)
+    def spatial_dirs(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "SPATIAL_CACHE", str(tmp_path / "spatial_cache"))
+        monkeypatch.setattr(settings, "SPATIAL_MANIFEST", str(tmp_path / "spatial_manifest.json"))
+        os.makedirs(settings.SPATIAL_CACHE)
+
     @patch("bomshell.fetch_gis.fetch.get_file")
-    def test_fetches_all_shapefile_components(self, mock_get_file):
+    @patch("bomshell.fetch_gis.fetch.stat_remote", return_value={})
+    def test_fetches_all_shapefile_components(self, mock_stat, mock_get_file):
         from bomshell.fetch_gis import SHAPEFILE_EXTENSIONS
         from bomshell.fetch_gis import bom_source
         from bomshell.fetch_gis import fetch_spatial_data
@@ -38,3 +48,307 @@ class TestFetchSpatialData:
         fetch_spatial_data()
         expected_calls = len(bom_source) * len(SHAPEFILE_EXTENSIONS)
         assert mock_get_file.call_count == expected_calls
+
+    @patch("bomshell.fetch_gis.fetch.get_file")
+    @patch("bomshell.fetch_gis.fetch.stat_remote", return_value={})
+    def test_shares_one_session(self, mock_stat, mock_get_file):
+        from bomshell.fetch_gis import fetch_spatial_data
+
+        fetch_spatial_data(workers=1)
+        sessions = {id(c.kwargs["session"]) for c in mock_get_file.call_args_list}
+        assert len(sessions) == 1
+
+    @patch("bomshell.fetch_gis.fetch.get_file")
+    @patch("bomshell.fetch_gis.fetch.stat_remote", return_value={})
+    def test_aggregates_errors(self, mock_stat, mock_get_file):
+        from bomshell.fetch import FetchError
+        from bomshell.fetch_gis import fetch_spatial_data
+
+        def get_file(filename, **kwargs):
+            if filename.endswith(".shp"):
+                raise FetchError(filename, "FTP timeout")
+            return True
+
+        mock_get_file.side_effect = get_file
+        errors = fetch_spatial_data(lookup_source={"a": ("IDA", "a"), "b": ("IDB", "b")}, workers=3)
+        assert sorted(e.filename for e in errors) == ["IDA.shp", "IDB.shp"]
+        assert mock_get_file.call_count == 8
+
+    @patch("bomshell.fetch_gis.fetch.get_file")
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_records_fetched_files_in_manifest(self, mock_stat, mock_get_file):
+        from bomshell.fetch import FetchError
+        from bomshell.fetch_gis import fetch_spatial_data
+        from bomshell.fetch_gis import load_manifest
+
+        def get_file(filename, **kwargs):
+            if filename == "IDA.shp":
+                raise FetchError(filename, "FTP timeout")
+            return True
+
+        mock_get_file.side_effect = get_file
+        mock_stat.return_value = {name: {"size": 4, "mtime": 100.0} for name in ("IDA.dbf", "IDA.shp", "IDB.dbf")}
+        fetch_spatial_data(lookup_source={"a": ("IDA", "a"), "b": ("IDB", "b")}, workers=1)
+        assert load_manifest() == {"IDA.dbf": {"size": 4, "mtime": 100.0}, "IDB.dbf": {"size": 4, "mtime": 100.0}}
+
+    @patch("bomshell.fetch_gis.fetch.get_file", return_value=True)
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_kept_files_are_not_recorded(self, mock_stat, mock_get_file, monkeypatch):
+        from bomshell.fetch_gis import fetch_spatial_data
+        from bomshell.fetch_gis import load_manifest
+
+        monkeypatch.setattr(settings, "OVERWRITE", False)
+        with open(os.path.join(settings.SPATIAL_CACHE, "IDA.dbf"), "w") as f:
+            f.write("old")
+        mock_stat.return_value = {"IDA.dbf": {"size": 4, "mtime": 100.0}, "IDB.dbf": {"size": 4, "mtime": 100.0}}
+        fetch_spatial_data(lookup_source={"a": ("IDA", "a"), "b": ("IDB", "b")}, workers=1)
+        assert list(load_manifest()) == ["IDB.dbf"]
+
+    @patch("bomshell.fetch_gis.fetch.get_file")
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_unreachable_server(self, mock_stat, mock_get_file):
+        from bomshell.fetch import FetchError
+        from bomshell.fetch_gis import fetch_spatial_data
+
+        mock_stat.side_effect = FetchError("/anon/home/adfd/spatial/", "FTP timeout")
+        errors = fetch_spatial_data(workers=1)
+        assert len(errors) == 1
+        mock_get_file.assert_not_called()
+
+
+class TestSyncSpatialData:
+    LOOKUP = {"a": ("IDA", "a"), "b": ("IDB", "b")}
+
+    def _setup(self, tmp_path):
+        old = (settings.SPATIAL_CACHE, settings.SPATIAL_MANIFEST, settings.MAP_CACHE)
+        settings.SPATIAL_CACHE = str(tmp_path / "spatial_cache")
+        settings.SPATIAL_MANIFEST = str(tmp_path / "spatial_manifest.json")
+        settings.MAP_CACHE = str(tmp_path / "map_cache")
+        os.makedirs(settings.SPATIAL_CACHE)
+        return old
+
+    @patch("bomshell.fetch_gis.fetch.get_file", return_value=True)
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_downloads_only_changed_files(self, mock_stat, mock_get_file, tmp_path):
+        from bomshell.fetch_gis import load_manifest
+        from bomshell.fetch_gis import save_manifest
+        from bomshell.fetch_gis import sync_spatial_data
+
+        old = self._setup(tmp_path)
+        try:
+            for name in ("IDA.dbf", "IDB.dbf"):
+                (tmp_path / "spatial_cache" / name).write_text("data")
+            save_manifest({"IDA.dbf": {"size": 4, "mtime": 100.0}, "IDB.dbf": {"size": 4, "mtime": 100.0}})
+            mock_stat.return_value = {"IDA.dbf": {"size": 4, "mtime": 100.0}, "IDB.dbf": {"size": 5, "mtime": 200.0}}
+
+            errors = sync_spatial_data(lookup_source=self.LOOKUP, workers=1)
+
+            assert errors == []
+            assert [c.kwargs["filename"] for c in mock_get_file.call_args_list] == ["IDB.dbf"]
+            assert mock_get_file.call_args.kwargs["overwrite"] is True
+            assert load_manifest()["IDB.dbf"] == {"size": 5, "mtime": 200.0}
+        finally:
+            settings.SPATIAL_CACHE, settings.SPATIAL_MANIFEST, settings.MAP_CACHE = old
+
+    @patch("bomshell.fetch_gis.fetch.get_file", return_value=True)
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_missing_local_file_is_refetched(self, mock_stat, mock_get_file, tmp_path):
+        from bomshell.fetch_gis import save_manifest
+        from bomshell.fetch_gis import sync_spatial_data
+
+        old = self._setup(tmp_path)
+        try:
+            save_manifest({"IDA.shp": {"size": 4, "mtime": 100.0}})
+            mock_stat.return_value = {"IDA.shp": {"size": 4, "mtime": 100.0}}
+
+            sync_spatial_data(lookup_source=self.LOOKUP, workers=1)
+            mock_get_file.assert_called_once()
+        finally:
+            settings.SPATIAL_CACHE, settings.SPATIAL_MANIFEST, settings.MAP_CACHE = old
+
+    @patch("bomshell.fetch_gis.fetch.get_file")
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_failed_download_not_recorded(self, mock_stat, mock_get_file, tmp_path):
+        from bomshell.fetch import FetchError
+        from bomshell.fetch_gis import load_manifest
+        from bomshell.fetch_gis import sync_spatial_data
+
+        old = self._setup(tmp_path)
+        try:
+            mock_stat.return_value = {"IDA.dbf": {"size": 4, "mtime": 100.0}}
+            mock_get_file.side_effect = FetchError("IDA.dbf", "FTP timeout")
+
+            errors = sync_spatial_data(lookup_source=self.LOOKUP, workers=1)
+            assert len(errors) == 1
+            assert "IDA.dbf" not in load_manifest()
+        finally:
+            settings.SPATIAL_CACHE, settings.SPATIAL_MANIFEST, settings.MAP_CACHE = old
+
+    @patch("bomshell.fetch_gis.fetch.get_file", return_value=True)
+    @patch("bomshell.fetch_gis.fetch.stat_remote")
+    def test_updated_layers_leave_the_map_cache(self, mock_stat, mock_get_file, tmp_path):
+        from bomshell import map_cache
+        from bomshell.fetch_gis import sync_spatial_data
+
+        old = self._setup(tmp_path)
+        try:
+            for name in ("IDA", "IDB"):
+                (tmp_path / "spatial_cache" / f"{name}.dbf").write_text("data")
+                map_cache.put(name, 0.0, "{}")
+            mock_stat.return_value = {"IDB.dbf": {"size": 5, "mtime": 200.0}}
+
+            sync_spatial_data(lookup_source=self.LOOKUP, workers=1)
+            assert map_cache.get("IDA", 0.0) == "{}"
+            assert not os.path.exists(map_cache.variant_path("IDB", 0.0))
+        finally:
+            settings.SPATIAL_CACHE, settings.SPATIAL_MANIFEST, settings.MAP_CACHE = old
+
+
+class TestCreateSpatialDatabase:
+    def test_packs_layers(self, spatial_cache):
+        import sqlite3
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database()
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            rows = db.execute("SELECT aac, dist_name, state_code FROM forecast_districts ORDER BY id").fetchall()
+            assert rows[0] == ("WA_PW001", "Perth", "WA")
+            assert len(rows) == 3
+            assert db.execute("SELECT count(*) FROM point_places").fetchone() == (4,)
+
+    def test_parallel_build_matches_serial(self, spatial_cache, tmp_path):
+        import sqlite3
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        dumps = []
+        for workers, database in ((1, tmp_path / "serial.sqlite"), (2, tmp_path / "parallel.sqlite")):
+            create_spatial_database(database=str(database), workers=workers)
+            with sqlite3.connect(database) as db:
+                dumps.append([db.execute(f"SELECT * FROM {t} ORDER BY id").fetchall() for t in ("forecast_districts", "point_places")])
+        assert dumps[0] == dumps[1]
+
+    def test_rebuild_is_idempotent(self, spatial_cache):
+        import sqlite3
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        with patch("bomshell.fetch_gis._decode_layer") as mock_decode:
+            create_spatial_database(workers=1)
+            mock_decode.assert_not_called()
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            assert db.execute("SELECT count(*) FROM forecast_districts").fetchone() == (3,)
+
+    def test_reloads_only_changed_layer(self, spatial_cache, shapefile_writer):
+        import sqlite3
+
+        from shapely.geometry import Point
+
+        from bomshell.fetch_gis import _decode_layer
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        shapefile_writer(
+            spatial_cache,
+            "IDM00013",
+            {"PT_NAME": ["Darwin"], "STATE_NAME": ["NT"], "LAT": [-12.46], "LON": [130.84], "ELEVATION": [30.0]},
+            [Point(130.84, -12.46)],
+        )
+        with patch("bomshell.fetch_gis._decode_layer", side_effect=_decode_layer) as mock_decode:
+            create_spatial_database(workers=1)
+            assert [c.args[0] for c in mock_decode.call_args_list] == [str(spatial_cache / "IDM00013.dbf")]
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            assert db.execute("SELECT pt_name FROM point_places").fetchall() == [("Darwin",)]
+            assert db.execute("SELECT count(*) FROM forecast_districts").fetchone() == (3,)
+
+    def test_failed_reload_keeps_previous_layer(self, spatial_cache):
+        import sqlite3
+
+        from bomshell import spatial_db
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        with patch("bomshell.spatial_db.insert_names", side_effect=RuntimeError("disk full")):
+            create_spatial_database(workers=1, force=True)
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            assert db.execute("SELECT count(*) FROM point_places").fetchone() == (4,)
+            assert db.execute(f"SELECT count(*) FROM {spatial_db.geometry_table('point_places')}").fetchone() == (4,)
+            assert db.execute(f"SELECT count(*) FROM {spatial_db.NAMES_TABLE} WHERE layer = 'point_places'").fetchone() == (4,)
+            assert db.execute(f"SELECT records FROM {spatial_db.LAYERS_TABLE} WHERE name = 'point_places'").fetchone() == (4,)
+
+    def test_touched_source_is_not_reloaded(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        os.utime(spatial_cache / "IDM00001.dbf")
+        with patch("bomshell.fetch_gis._decode_layer") as mock_decode:
+            create_spatial_database(workers=1)
+            mock_decode.assert_not_called()
+
+    def test_force_reloads_everything(self, spatial_cache):
+        from bomshell.fetch_gis import _decode_layer
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        with patch("bomshell.fetch_gis._decode_layer", side_effect=_decode_layer) as mock_decode:
+            create_spatial_database(workers=1, force=True)
+            assert mock_decode.call_count == 2
+
+    def test_new_database_pragmas(self, spatial_cache):
+        import sqlite3
+
+        from bomshell import spatial_db
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            assert db.execute("PRAGMA page_size").fetchone() == (8192,)
+            assert db.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+        conn = spatial_db.connect()
+        assert conn.execute("SELECT count(*) FROM point_places").fetchone() == (4,)
+        conn.close()
+
+    def test_existing_database_keeps_page_size(self, spatial_cache):
+        import sqlite3
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            db.execute("PRAGMA page_size = 4096")
+            db.execute("CREATE TABLE keep (id INTEGER)")
+        create_spatial_database(workers=1)
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            assert db.execute("PRAGMA page_size").fetchone() == (4096,)
+            assert db.execute("SELECT count(*) FROM forecast_districts").fetchone() == (3,)
+
+    def test_missing_layers_are_skipped(self, spatial_cache):
+        import sqlite3
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database()
+        with sqlite3.connect(settings.SPATIAL_DB) as db:
+            tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert "marine_zones" not in tables
+
+    def test_bounds_layers_in_flight(self):
+        from unittest.mock import MagicMock
+
+        from bomshell.fetch_gis import _decoded_layers
+
+        executor = MagicMock()
+        layers = [(f"layer{i}", "", f"src{i}", None, [], None, []) for i in range(5)]
+        yielded = []
+        for seen, (layer, _future) in enumerate(_decoded_layers(executor, layers, window=2), 1):
+            assert executor.submit.call_count <= seen + 2
+            yielded.append(layer)
+        assert yielded == layers
+        assert executor.submit.call_count == 5
+
+    def test_batches_records(self):
+        from bomshell.fetch_gis import _record_batches
+
+        batches = list(_record_batches(range(7), size=3))
+        assert batches == [[0, 1, 2], [3, 4, 5], [6]]
@@ -97,6 +97,22 @@ class TestSearchLocation:
             search_location("Roleystone")
 
 
+class TestForecastCache:
+    @patch("bomshell.forecast._SESSION")
+    def test_repeated_calls_are_answered_from_the_cache(self, mock_session):
+        from requests.structures import CaseInsensitiveDict
+
+        from bomshell import forecast
+
+        mock_resp = MagicMock(status_code=200, headers=CaseInsensitiveDict({"ETag": '"v1"'}))
+        mock_resp.json.return_value = {"data": [{"geohash": "r1r0fsp", "name": "Roleystone"}]}
+        mock_session.get.return_value = mock_resp
+
+        assert search_location("Roleystone") == forecast.fetch_locations("Roleystone")[0]
+        mock_session.get.assert_called_once()
+        assert forecast.fetch_locations("Roleystone")[1] == "hit"
+
+
 class TestGetDailyForecast:
     @patch("bomshell.forecast._SESSION")
     def test_returns_forecast_json(self, mock_session):
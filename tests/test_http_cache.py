@@ -0,0 +1,116 @@
+import json
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from bomshell import http_cache
+from bomshell import settings
+
+URL = "https://api.example/v1/locations/r1r0fsp/forecasts/daily"
+BODY = {"data": [{"date": "2025-02-11", "temp_max": 29}]}
+
+
+def _response(status, body=None, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body).encode() if body is not None else b""
+    resp.headers = CaseInsensitiveDict(headers or {})
+    resp.url = URL
+    return resp
+
+
+def _session(*responses):
+    session = MagicMock()
+    session.get.side_effect = list(responses)
+    return session
+
+
+class TestGetJson:
+    def test_fresh_response_is_reused_without_a_request(self):
+        session = _session(_response(200, BODY))
+        assert http_cache.get_json(session, URL, ttl=60) == (BODY, http_cache.MISS)
+        assert http_cache.get_json(session, URL, ttl=60) == (BODY, http_cache.HIT)
+        session.get.assert_called_once_with(URL)
+
+    def test_params_are_part_of_the_key(self):
+        session = _session(_response(200, {"data": [1]}), _response(200, {"data": [2]}))
+        assert http_cache.get_json(session, URL, params={"search": "a"}, ttl=60)[0] == {"data": [1]}
+        assert http_cache.get_json(session, URL, params={"search": "b"}, ttl=60)[0] == {"data": [2]}
+        assert http_cache.get_json(session, URL, params={"search": "a"}, ttl=60) == ({"data": [1]}, http_cache.HIT)
+
+    def test_stale_response_is_revalidated(self):
+        session = _session(
+            _response(200, BODY, {"ETag": '"v1"', "Last-Modified": "Tue, 11 Feb 2025 00:00:00 GMT"}),
+            _response(304, headers={"Cache-Control": "max-age=60"}),
+        )
+        http_cache.get_json(session, URL, ttl=0)
+        assert http_cache.get_json(session, URL, ttl=0) == (BODY, http_cache.REVALIDATED)
+        headers = session.get.call_args.kwargs["headers"]
+        assert headers == {"If-None-Match": '"v1"', "If-Modified-Since": "Tue, 11 Feb 2025 00:00:00 GMT"}
+        # fresh again for the max-age of the 304
+        assert http_cache.get_json(session, URL, ttl=0) == (BODY, http_cache.HIT)
+
+    def test_changed_data_replaces_the_entry(self):
+        new_body = {"data": [{"date": "2025-02-12"}]}
+        session = _session(_response(200, BODY, {"ETag": '"v1"'}), _response(200, new_body, {"ETag": '"v2"'}))
+        http_cache.get_json(session, URL, ttl=0)
+        assert http_cache.get_json(session, URL, ttl=0) == (new_body, http_cache.MISS)
+
+    def test_cache_control_overrides_the_ttl(self):
+        session = _session(_response(200, BODY, {"Cache-Control": "public, max-age=0"}), _response(200, BODY))
+        http_cache.get_json(session, URL, ttl=3600)
+        assert http_cache.get_json(session, URL, ttl=3600)[1] == http_cache.MISS
+
+    def test_expires_header(self):
+        session = _session(
+            _response(200, BODY, {"Date": "Tue, 11 Feb 2025 00:00:00 GMT", "Expires": "Tue, 11 Feb 2025 00:10:00 GMT"}),
+        )
+        http_cache.get_json(session, URL)
+        assert http_cache.get_json(session, URL)[1] == http_cache.HIT
+
+    def test_no_store_is_not_cached(self, http_cache_dir):
+        session = _session(_response(200, BODY, {"Cache-Control": "no-store"}))
+        http_cache.get_json(session, URL, ttl=3600)
+        assert not http_cache_dir.exists()
+
+    def test_refresh_revalidates_fresh_entries(self):
+        session = _session(_response(200, BODY, {"ETag": '"v1"'}), _response(304))
+        http_cache.get_json(session, URL, ttl=3600)
+        settings.HTTP_CACHE_REFRESH = True
+        assert http_cache.get_json(session, URL, ttl=3600) == (BODY, http_cache.REVALIDATED)
+
+    def test_stale_entry_is_used_when_the_api_fails(self):
+        session = _session(_response(200, BODY), requests.ConnectionError("offline"), _response(503))
+        http_cache.get_json(session, URL, ttl=0)
+        assert http_cache.get_json(session, URL, ttl=0) == (BODY, http_cache.STALE)
+        assert http_cache.get_json(session, URL, ttl=0) == (BODY, http_cache.STALE)
+
+    def test_errors_without_an_entry_raise(self):
+        session = _session(_response(503))
+        with pytest.raises(requests.HTTPError):
+            http_cache.get_json(session, URL, ttl=60)
+
+
+class TestEvict:
+    def test_least_recently_used_entries_go_first(self, http_cache_dir):
+        session = _session(*(_response(200, {"data": "x" * 1000}) for _ in range(3)))
+        for name in ("a", "b", "c"):
+            http_cache.get_json(session, URL, params={"search": name}, ttl=60)
+        paths = {name: http_cache._entry_path(URL, {"search": name}) for name in ("a", "b", "c")}
+        now = time.time()
+        for age, name in enumerate(("c", "a", "b")):
+            os.utime(paths[name], (now - age * 10, now - age * 10))
+        # entries differ in size by a few bytes of expiry time
+        size = max(os.path.getsize(path) for path in paths.values())
+
+        http_cache.evict(2 * size)
+        assert [name for name, path in paths.items() if os.path.exists(path)] == ["a", "c"]
+
+    def test_size_limit_is_applied_on_write(self, http_cache_dir, monkeypatch):
+        monkeypatch.setattr(settings, "HTTP_CACHE_MB", 0)
+        http_cache.get_json(_session(_response(200, BODY)), URL, ttl=60)
+        assert os.listdir(http_cache_dir) == []
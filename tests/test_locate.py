@@ -0,0 +1,149 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from bomshell.locate import DistrictIndex
+from bomshell.locate import format_location
+from bomshell.locate import get_polygon_types
+from bomshell.locate import locate
+
+
+@pytest.fixture()
+def spatial_db_built(spatial_cache):
+    from bomshell.fetch_gis import create_spatial_database
+
+    create_spatial_database(workers=1)
+    return spatial_cache
+
+
+class TestGetPolygonTypes:
+    def test_only_polygons(self):
+        types = get_polygon_types()
+        assert "forecast_districts" in types
+        assert "radar_location" not in types
+        assert types == sorted(types)
+
+
+class TestLocate:
+    def test_point_in_district(self, spatial_db_built):
+        found = locate(-31.95, 115.86)
+        assert [r["dist_name"] for r in found["forecast_districts"]] == ["Perth"]
+        assert "id" not in found["forecast_districts"][0]
+
+    def test_point_outside_all_districts(self, spatial_db_built):
+        found = locate(-25.0, 135.0)
+        assert found == {"forecast_districts": []}
+
+    def test_shared_boundary_matches_both(self, spatial_db_built):
+        found = locate(-32.0, 116.5)
+        assert [r["dist_name"] for r in found["forecast_districts"]] == ["Perth", "Lower West"]
+
+    def test_layers_without_geometry_are_skipped(self, spatial_db_built):
+        index = DistrictIndex(layers=["forecast_districts", "marine_zones"])
+        assert index.layers == ["forecast_districts"]
+
+    def test_no_layer_with_geometry(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        (spatial_cache / "IDM00001.shp").unlink()
+        create_spatial_database(workers=1)
+        with pytest.raises(FileNotFoundError, match="spatial build"):
+            DistrictIndex()
+
+    def test_repeated_lookups_reuse_prepared_geometry(self, spatial_db_built):
+        index = DistrictIndex()
+        index.locate(-31.95, 115.86)
+        geometry = index._geometries[("forecast_districts", 1)]
+        index.locate(-31.90, 115.80)
+        assert index._geometries[("forecast_districts", 1)] is geometry
+
+    def test_missing_database(self, tmp_path):
+        from bomshell import settings
+
+        old_db = settings.SPATIAL_DB
+        try:
+            settings.SPATIAL_DB = str(tmp_path / "nope.sqlite")
+            with pytest.raises(FileNotFoundError):
+                locate(-31.95, 115.86)
+        finally:
+            settings.SPATIAL_DB = old_db
+
+
+class TestFormatLocation:
+    def test_lists_label_and_aac(self):
+        text = format_location(-31.95, 115.86, {"forecast_districts": [{"dist_name": "Perth", "aac": "WA_PW001"}]})
+        assert "Forecast Districts: Perth (WA_PW001)" in text
+
+    def test_no_match(self):
+        text = format_location(0, 0, {"marine_zones": []})
+        assert "Marine Zones: -" in text
+
+
+class TestLocateBatch:
+    CSV = "asset,lat,lon\na,-31.95,115.86\nb,-32.5,117.0\nc,-25.0,135.0\nd,-33.87,151.21\n"
+
+    def test_joins_every_row(self, spatial_cache):
+        from bomshell.locate import locate_batch
+
+        frames = list(locate_batch(io.StringIO(self.CSV), chunk_size=2, workers=1))
+        assert len(frames) == 2
+        result = pd.concat(frames)
+        assert list(result["asset"]) == ["a", "b", "c", "d"]
+        assert list(result["forecast_districts"].fillna("")) == ["Perth", "Lower West", "", "Sydney"]
+        assert list(result["forecast_districts_aac"].fillna("")) == ["WA_PW001", "WA_PW002", "", "NSW_PW001"]
+
+    def test_parallel_matches_serial(self, spatial_cache):
+        from bomshell.locate import locate_batch
+
+        serial = pd.concat(locate_batch(io.StringIO(self.CSV), chunk_size=1, workers=1))
+        parallel = pd.concat(locate_batch(io.StringIO(self.CSV), chunk_size=1, workers=2))
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    def test_detects_coordinate_columns(self, spatial_cache):
+        from bomshell.locate import locate_batch
+
+        csv = "Latitude,Longitude\n-31.95,115.86\n"
+        [result] = locate_batch(io.StringIO(csv), workers=1)
+        assert list(result["forecast_districts"]) == ["Perth"]
+
+    def test_missing_coordinate_columns(self, spatial_cache):
+        from bomshell.locate import locate_batch
+
+        with pytest.raises(ValueError, match="lat"):
+            list(locate_batch(io.StringIO("a,b\n1,2\n"), workers=1))
+
+    def test_no_shapefiles(self, tmp_path):
+        from bomshell import settings
+        from bomshell.locate import locate_batch
+
+        old_cache = settings.SPATIAL_CACHE
+        try:
+            settings.SPATIAL_CACHE = str(tmp_path)
+            with pytest.raises(FileNotFoundError):
+                list(locate_batch(io.StringIO(self.CSV), workers=1))
+        finally:
+            settings.SPATIAL_CACHE = old_cache
+
+
+class TestWriteBatch:
+    FRAMES = [
+        pd.DataFrame({"lat": [-31.95], "forecast_districts": ["Perth"]}),
+        pd.DataFrame({"lat": [-25.0], "forecast_districts": [None]}),
+    ]
+
+    def test_csv_single_header(self):
+        from bomshell.locate import write_batch
+
+        out = io.StringIO()
+        write_batch(iter(self.FRAMES), out, "csv")
+        assert out.getvalue().splitlines() == ["lat,forecast_districts", "-31.95,Perth", "-25.0,"]
+
+    def test_ndjson(self):
+        from bomshell.locate import write_batch
+
+        out = io.StringIO()
+        write_batch(iter(self.FRAMES), out, "ndjson")
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert rows == [{"lat": -31.95, "forecast_districts": "Perth"}, {"lat": -25.0, "forecast_districts": None}]
@@ -0,0 +1,31 @@
+import os
+
+from bomshell import map_cache
+
+
+class TestMapCache:
+    def test_miss_then_hit(self, spatial_cache):
+        assert map_cache.get("IDM00001", 0.01) is None
+        map_cache.put("IDM00001", 0.01, '{"type": "FeatureCollection"}')
+        assert map_cache.get("IDM00001", 0.01) == '{"type": "FeatureCollection"}'
+        assert map_cache.get("IDM00001", 0.0) is None
+
+    def test_touched_but_identical_source_is_current(self, spatial_cache):
+        map_cache.put("IDM00001", 0.0, "{}")
+        dbf_path = spatial_cache / "IDM00001.dbf"
+        mtime = os.path.getmtime(dbf_path) + 60
+        os.utime(dbf_path, (mtime, mtime))
+        assert map_cache.get("IDM00001", 0.0) == "{}"
+
+    def test_changed_source_drops_all_variants(self, spatial_cache):
+        map_cache.put("IDM00001", 0.0, "{}")
+        map_cache.put("IDM00001", 0.01, "{}")
+        with open(spatial_cache / "IDM00001.dbf", "ab") as f:
+            f.write(b" ")
+        assert map_cache.get("IDM00001", 0.0) is None
+        map_cache.put("IDM00001", 0.0, "[]")
+        assert not os.path.exists(map_cache.variant_path("IDM00001", 0.01))
+
+    def test_layer_not_fetched(self, spatial_cache):
+        map_cache.put("IDM00099", 0.0, "{}")
+        assert map_cache.get("IDM00099", 0.0) is None
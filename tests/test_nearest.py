@@ -0,0 +1,115 @@
+import io
+import os
+import pickle
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from bomshell import nearest as nearest_mod
+from bomshell.nearest import format_nearest
+from bomshell.nearest import get_index
+from bomshell.nearest import get_point_types
+from bomshell.nearest import nearest
+from bomshell.nearest import nearest_batch
+from bomshell.nearest import nearest_frames
+
+
+class TestGetPointTypes:
+    def test_only_points(self):
+        types = get_point_types()
+        assert types == ["point_places", "radar_coverage", "radar_location"]
+
+
+class TestNearest:
+    def test_closest_first(self, spatial_cache):
+        found = nearest(-31.95, 115.85, "point_places", k=3)
+        assert [r["PT_NAME"] for r in found] == ["Perth", "Perth Airport", "Mandurah"]
+        assert found[0]["distance_km"] < found[1]["distance_km"] < found[2]["distance_km"]
+
+    def test_great_circle_distance(self, spatial_cache):
+        [sydney] = nearest(-31.95, 115.86, "point_places", k=4)[3:]
+        # Perth to Sydney is about 3290 km along the great circle
+        assert sydney["PT_NAME"] == "Sydney"
+        assert sydney["distance_km"] == pytest.approx(3290, rel=0.01)
+
+    def test_k_larger_than_layer(self, spatial_cache):
+        assert len(nearest(-31.95, 115.86, "point_places", k=10)) == 4
+
+    def test_batch(self, spatial_cache):
+        found = nearest_batch([-31.95, -33.8], [115.86, 151.2], "point_places")
+        assert [r[0]["PT_NAME"] for r in found] == ["Perth", "Sydney"]
+
+    def test_missing_layer(self, spatial_cache):
+        with pytest.raises(FileNotFoundError):
+            nearest(-31.95, 115.86, "radar_location")
+
+
+class TestIndexPersistence:
+    def test_index_is_persisted(self, spatial_cache, tmp_path):
+        get_index("point_places")
+        assert (tmp_path / "nearest" / "point_places.pickle").exists()
+
+    def test_persisted_index_is_reused(self, spatial_cache, monkeypatch):
+        get_index("point_places")
+        nearest_mod._index_cache.clear()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("index rebuilt")
+
+        monkeypatch.setattr(nearest_mod.PointIndex, "from_dbf", fail)
+        assert len(get_index("point_places").records) == 4
+
+    @pytest.mark.parametrize("stale", [b"cno_such_module\nPointIndex\n.", pickle.dumps({"records": []})])
+    def test_stale_pickle_is_rebuilt(self, spatial_cache, stale):
+        path = nearest_mod._index_path("point_places")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(stale)
+        assert len(get_index("point_places").records) == 4
+
+    def test_changed_layer_rebuilds(self, spatial_cache, shapefile_writer):
+        from shapely.geometry import Point
+
+        get_index("point_places")
+        shapefile_writer(
+            spatial_cache,
+            "IDM00013",
+            {"PT_NAME": ["Darwin"], "STATE_NAME": ["NT"], "LAT": [-12.46], "LON": [130.84], "ELEVATION": [30.0]},
+            [Point(130.84, -12.46)],
+        )
+        assert [r["PT_NAME"] for r in nearest(-31.95, 115.86, "point_places")] == ["Darwin"]
+
+
+class TestNearestFrames:
+    def test_adds_ranked_columns(self, spatial_cache):
+        csv = "id,lat,lon\n1,-31.95,115.85\n2,-33.8,151.2\n"
+        [frame] = nearest_frames(io.StringIO(csv), "point_places", k=2)
+        assert list(frame["point_places_1"]) == ["Perth", "Sydney"]
+        assert list(frame["point_places_2"]) == ["Perth Airport", "Perth Airport"]
+        assert isinstance(frame, pd.DataFrame)
+        assert frame["point_places_1_km"].iloc[0] < frame["point_places_2_km"].iloc[0]
+
+    def test_blank_coordinates_are_left_empty(self, spatial_cache):
+        csv = "id,lat,lon\n1,-31.95,115.85\n2,,151.2\n3,-33.8,n/a\n4,-33.8,151.2\n"
+        [frame] = nearest_frames(io.StringIO(csv), "point_places")
+        assert list(frame["point_places_1"].isna()) == [False, True, True, False]
+        assert list(frame["point_places_1"].dropna()) == ["Perth", "Sydney"]
+        assert list(frame["point_places_1_km"].isna()) == [False, True, True, False]
+
+    def test_all_blank_chunk(self, spatial_cache):
+        [frame] = nearest_frames(io.StringIO("id,lat,lon\n1,,\n"), "point_places", k=2)
+        assert frame[["point_places_1", "point_places_2"]].isna().all().all()
+
+    def test_layer_without_points(self, spatial_cache):
+        from bomshell.nearest import PointIndex
+
+        with patch("bomshell.nearest.get_index", return_value=PointIndex([], [], [])):
+            [frame] = nearest_frames(io.StringIO("id,lat,lon\n1,-31.95,115.85\n"), "point_places")
+        assert list(frame.columns) == ["id", "lat", "lon"]
+
+
+class TestFormatNearest:
+    def test_ranked_lines(self):
+        text = format_nearest(-31.95, 115.86, "radar_location", [{"Full_Name": "Perth (Serpentine)", "distance_km": 48.25}])
+        assert "1. Perth (Serpentine) (48.2 km)" in text
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from bomshell import output
+
+
+@pytest.fixture
+def json_format():
+    """Set the JSON format for a test, restoring the default afterwards."""
+    yield output.set_json_format
+    output.set_json_format("pretty")
+
+
+ITEMS = [{"name": "Perth", "tags": ["wa", "capital"], "lat": -31.95}, {"name": "Sydney", "tags": [], "lat": None}]
+
+
+class TestEmitJsonStream:
+    def test_pretty_matches_whole_document(self, capsys):
+        output.emit_json_stream(iter(ITEMS))
+        assert capsys.readouterr().out == json.dumps(ITEMS, indent=2) + "\n"
+
+    def test_compact(self, capsys, json_format):
+        json_format("compact")
+        output.emit_json_stream(iter(ITEMS))
+        out = capsys.readouterr().out
+        assert "\n" not in out.rstrip("\n")
+        assert json.loads(out) == ITEMS
+
+    def test_ndjson(self, capsys, json_format):
+        json_format("ndjson")
+        output.emit_json_stream(iter(ITEMS))
+        assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == ITEMS
+
+    def test_empty(self, capsys):
+        output.emit_json_stream(iter([]))
+        assert json.loads(capsys.readouterr().out) == []
+
+    def test_items_are_written_as_produced(self, capsys):
+        seen = []
+
+        def items():
+            for item in ITEMS:
+                seen.append(capsys.readouterr().out)
+                yield item
+
+        output.emit_json_stream(items())
+        assert seen[0] == ""
+        assert seen[1].startswith('[\n  {\n    "name": "Perth"')
+
+
+class TestEmitJson:
+    def test_generator_is_streamed(self, capsys):
+        output.emit_json(item for item in ITEMS)
+        assert json.loads(capsys.readouterr().out) == ITEMS
+
+    def test_ndjson_list(self, capsys, json_format):
+        json_format("ndjson")
+        output.emit_json(ITEMS)
+        assert len(capsys.readouterr().out.splitlines()) == 2
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            output.set_json_format("yaml")
@@ -0,0 +1,155 @@
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+
+import pytest
+from typer.testing import CliRunner
+
+from bomshell.cli import app
+from bomshell.serve import Layer
+from bomshell.serve import SpatialServer
+from bomshell.serve import parse_bbox
+from bomshell.serve import tile_bounds
+
+WA_BBOX = (110.0, -35.0, 120.0, -30.0)
+
+
+class TestTileBounds:
+    def test_world_tile(self):
+        minx, miny, maxx, maxy = tile_bounds(0, 0, 0)
+        assert (minx, maxx) == (-180.0, 180.0)
+        assert maxy == pytest.approx(85.0511, abs=1e-4)
+        assert miny == pytest.approx(-85.0511, abs=1e-4)
+
+    def test_south_east_quarter(self):
+        minx, miny, maxx, maxy = tile_bounds(1, 1, 1)
+        assert (minx, maxx, maxy) == (0.0, 180.0, 0.0)
+
+    def test_outside_the_zoom_level(self):
+        with pytest.raises(ValueError, match="No tile"):
+            tile_bounds(1, 2, 0)
+
+
+class TestParseBbox:
+    def test_valid(self):
+        assert parse_bbox("110,-35,120,-30") == WA_BBOX
+
+    @pytest.mark.parametrize("text", ["110,-35,120", "a,b,c,d", "120,-35,110,-30"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError, match="Invalid bbox"):
+            parse_bbox(text)
+
+
+class TestLayer:
+    def test_query_picks_and_clips_features(self, spatial_cache):
+        data = json.loads(Layer("forecast_districts").query((116.0, -33.0, 117.0, -31.0)))
+        assert [f["properties"]["DIST_NAME"] for f in data["features"]] == ["Perth", "Lower West"]
+        xs = [x for f in data["features"] for x, _y in f["geometry"]["coordinates"][0]]
+        assert min(xs) == 116.0
+        assert max(xs) == 117.0
+
+    def test_points(self, spatial_cache):
+        data = json.loads(Layer("point_places").query(WA_BBOX, names_only=True))
+        assert [f["properties"] for f in data["features"]] == [{"PT_NAME": "Perth"}, {"PT_NAME": "Perth Airport"}, {"PT_NAME": "Mandurah"}]
+
+    def test_simplified_per_zoom(self, spatial_cache, shapefile_writer):
+        import shapely
+        from shapely.geometry import Polygon
+
+        # a wiggly coastline of 2000 vertices
+        coast = [(115.0 + i * 0.001, -31.0 + (0.0005 if i % 2 else 0.0)) for i in range(2000)]
+        shapefile_writer(spatial_cache, "IDM00001", {"DIST_NAME": ["Coast"]}, [Polygon([*coast, (117.0, -33.0), (115.0, -33.0)])])
+        layer = Layer("forecast_districts")
+        low = shapely.get_num_coordinates(layer.geometries_at(4)).sum()
+        high = shapely.get_num_coordinates(layer.geometries_at(14)).sum()
+        assert low < 20 < high
+        # made once per zoom
+        assert layer.geometries_at(4) is layer.geometries_at(4)
+
+    def test_missing_layer(self, spatial_cache):
+        with pytest.raises(FileNotFoundError):
+            Layer("marine_zones")
+
+
+@pytest.fixture()
+def server(spatial_cache):
+    server = SpatialServer(("127.0.0.1", 0), ["forecast_districts", "point_places"], tile_cache_size=16)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path, headers=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}", headers=headers or {})
+    with urllib.request.urlopen(request) as response:
+        return response.headers, response.read()
+
+
+class TestSpatialServer:
+    def test_page(self, server):
+        headers, body = _get(server, "/")
+        assert headers["Content-Type"].startswith("text/html")
+        assert b"L.GridLayer.extend" in body
+
+    def test_layers(self, server):
+        _, body = _get(server, "/layers")
+        assert [layer["name"] for layer in json.loads(body)] == ["forecast_districts", "point_places"]
+
+    def test_bbox(self, server):
+        _, body = _get(server, "/layers/point_places?bbox=115.8,-32,116,-31.9")
+        assert [f["properties"]["PT_NAME"] for f in json.loads(body)["features"]] == ["Perth", "Perth Airport"]
+
+    def test_tiles_are_cached(self, server):
+        _, body = _get(server, "/tiles/forecast_districts/2/3/2.geojson")
+        assert [f["properties"] for f in json.loads(body)["features"]] == [
+            {"DIST_NAME": "Perth"},
+            {"DIST_NAME": "Lower West"},
+            {"DIST_NAME": "Sydney"},
+        ]
+        _get(server, "/tiles/forecast_districts/2/3/2.geojson")
+        assert server.tile.cache_info().hits == 1
+
+    def test_empty_tile(self, server):
+        _, body = _get(server, "/tiles/forecast_districts/2/0/0.geojson")
+        assert json.loads(body)["features"] == []
+
+    def test_gzip(self, server):
+        headers, body = _get(server, "/", {"Accept-Encoding": "gzip"})
+        assert headers["Content-Encoding"] == "gzip"
+        assert b"L.GridLayer.extend" in gzip.decompress(body)
+
+    @pytest.mark.parametrize(
+        ("path", "status"),
+        [
+            ("/layers/marine_zones?bbox=0,0,1,1", 404),
+            ("/tiles/marine_zones/0/0/0.geojson", 404),
+            ("/nowhere", 404),
+            ("/layers/point_places", 400),
+            ("/layers/point_places?bbox=1,2", 400),
+            ("/tiles/point_places/1/5/0.geojson", 400),
+        ],
+    )
+    def test_errors(self, server, path, status):
+        with pytest.raises(urllib.error.HTTPError) as e:
+            _get(server, path)
+        assert e.value.code == status
+        assert "error" in json.loads(e.value.read())
+
+
+class TestSpatialServeCli:
+    @patch("bomshell.serve.serve")
+    def test_defaults_to_fetched_layers(self, mock_serve, spatial_cache):
+        result = CliRunner().invoke(app, ["spatial", "serve", "--no-open", "-p", "9000"])
+        assert result.exit_code == 0
+        assert mock_serve.call_args[0] == (["forecast_districts", "point_places"], "127.0.0.1", 9000)
+        assert mock_serve.call_args.kwargs["open_browser"] is False
+
+    def test_missing_layer(self, spatial_cache):
+        result = CliRunner().invoke(app, ["spatial", "serve", "--no-open", "-s", "marine_zones"])
+        assert result.exit_code == 1
+        assert "Run 'bomshell spatial fetch' first" in result.output
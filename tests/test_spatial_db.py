@@ -0,0 +1,229 @@
+import os
+from unittest.mock import patch
+
+import dataset
+import pytest
+
+from bomshell import spatial_db
+
+
+def _db(tmp_path):
+    db = dataset.connect(f"sqlite:///{tmp_path / 'test.sqlite'}")
+    spatial_db.ensure_schema(db)
+    return db
+
+
+class TestSourceHash:
+    def test_depends_on_content(self, tmp_path):
+        a = tmp_path / "a.dbf"
+        a.write_bytes(b"one")
+        first = spatial_db.source_hash([str(a)])
+        a.write_bytes(b"two")
+        assert spatial_db.source_hash([str(a)]) != first
+
+
+class TestSourcesUnchanged:
+    def test_same_stat_skips_hash(self, tmp_path):
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        signature = spatial_db.source_signature([str(source)])
+        with patch("bomshell.spatial_db.source_hash") as mock_hash:
+            assert spatial_db.sources_unchanged(signature, [str(source)])
+            mock_hash.assert_not_called()
+
+    def test_touched_refreshes_stat(self, tmp_path):
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        signature = spatial_db.source_signature([str(source)])
+        os.utime(source, (0, 0))
+        refreshed = []
+        assert spatial_db.sources_unchanged(signature, [str(source)], refreshed.append)
+        assert refreshed == [{"size": 4, "mtime": 0.0}]
+
+    def test_changed_content(self, tmp_path):
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        signature = spatial_db.source_signature([str(source)])
+        source.write_bytes(b"atad")
+        os.utime(source, (0, 0))
+        refreshed = []
+        assert not spatial_db.sources_unchanged(signature, [str(source)], refreshed.append)
+        assert refreshed == []
+
+
+class TestLayerState:
+    def test_never_built_is_not_current(self, tmp_path):
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        assert not spatial_db.is_layer_current(_db(tmp_path), "layer", [str(source)])
+
+    def test_current_after_build(self, tmp_path):
+        db = _db(tmp_path)
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        db["layer"].insert({"x": 1})
+        spatial_db.set_layer_state(db, "layer", [str(source)], records=1)
+        assert spatial_db.is_layer_current(db, "layer", [str(source)])
+
+    def test_touched_but_identical_is_current(self, tmp_path):
+        db = _db(tmp_path)
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        db["layer"].insert({"x": 1})
+        spatial_db.set_layer_state(db, "layer", [str(source)], records=1)
+        os.utime(source, (0, 0))
+        assert spatial_db.is_layer_current(db, "layer", [str(source)])
+        assert spatial_db.get_layer_state(db, "layer")["mtime"] == spatial_db.source_stat([str(source)])["mtime"]
+        with patch("bomshell.spatial_db.source_hash") as mock_hash:
+            assert spatial_db.is_layer_current(db, "layer", [str(source)])
+            mock_hash.assert_not_called()
+
+    def test_changed_content_is_stale(self, tmp_path):
+        db = _db(tmp_path)
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        db["layer"].insert({"x": 1})
+        spatial_db.set_layer_state(db, "layer", [str(source)], records=1)
+        source.write_bytes(b"new data")
+        assert not spatial_db.is_layer_current(db, "layer", [str(source)])
+
+    def test_clear_layer(self, tmp_path):
+        db = _db(tmp_path)
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        db["layer"].insert({"x": 1})
+        spatial_db.set_layer_state(db, "layer", [str(source)], records=1)
+        spatial_db.clear_layer(db, "layer")
+        assert "layer" not in db.tables
+        assert spatial_db.get_layer_state(db, "layer") is None
+
+
+class TestGeometryQueries:
+    def test_bbox_query(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        conn = spatial_db.connect()
+        assert spatial_db.has_geometry(conn, "forecast_districts")
+        fids = [fid for fid, _geom in spatial_db.query_bbox(conn, "forecast_districts", 115.5, -32.0, 116.0, -31.5)]
+        assert fids == [1]
+
+    def test_geometry_fid_matches_attribute_id(self, spatial_cache):
+        from shapely.geometry import Point
+
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        conn = spatial_db.connect()
+        [(fid, _geom)] = spatial_db.query_intersects(conn, "forecast_districts", Point(151.0, -33.8))
+        assert conn.execute("SELECT dist_name FROM forecast_districts WHERE id = ?", (fid,)).fetchone() == ("Sydney",)
+
+    def test_points_are_indexed(self, spatial_cache):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1)
+        conn = spatial_db.connect()
+        hits = spatial_db.query_bbox(conn, "point_places", 115.8, -32.0, 116.0, -31.9)
+        assert [fid for fid, _geom in hits] == [1, 2]
+
+    def test_connect_missing_database(self, tmp_path):
+        with pytest.raises(FileNotFoundError, match="spatial build"):
+            spatial_db.connect(str(tmp_path / "missing.sqlite"))
+
+
+@pytest.fixture()
+def built_db(spatial_cache):
+    from bomshell.fetch_gis import create_spatial_database
+
+    create_spatial_database(workers=1)
+    return spatial_db.connect()
+
+
+class TestColumnIndexes:
+    def test_key_columns_indexed(self, built_db):
+        indexes = {row[0] for row in built_db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"ix_forecast_districts_aac", "ix_forecast_districts_dist_name", "ix_forecast_districts_state_code"} <= indexes
+        assert "ix_point_places_pt_name" in indexes
+
+    def test_lookup_uses_index(self, built_db):
+        plan = built_db.execute("EXPLAIN QUERY PLAN SELECT * FROM point_places WHERE pt_name = 'Perth'").fetchall()
+        assert "ix_point_places_pt_name" in str(plan)
+
+
+class TestSearchNames:
+    def test_prefix_match(self, built_db):
+        names = [m["name"] for m in spatial_db.search_names(built_db, "perth air")]
+        assert names == ["Perth Airport"]
+
+    def test_matches_across_layers(self, built_db):
+        layers = {m["layer"] for m in spatial_db.search_names(built_db, "sydney")}
+        assert layers == {"forecast_districts", "point_places"}
+
+    def test_layer_filter(self, built_db):
+        matches = spatial_db.search_names(built_db, "perth", layers=["forecast_districts"])
+        assert [(m["layer"], m["name"]) for m in matches] == [("forecast_districts", "Perth")]
+
+    def test_fuzzy_fallback(self, built_db):
+        names = [m["name"] for m in spatial_db.search_names(built_db, "Mandruah")]
+        assert names == ["Mandurah"]
+
+    def test_no_fuzzy(self, built_db):
+        assert spatial_db.search_names(built_db, "Mandruah", fuzzy=False) == []
+
+    def test_punctuation_is_ignored(self, built_db):
+        assert [m["name"] for m in spatial_db.search_names(built_db, 'mand"urah*', fuzzy=False)] == []
+        assert [m["name"] for m in spatial_db.search_names(built_db, '"mandurah" OR', fuzzy=False)] == []
+        assert spatial_db.search_names(built_db, "***", fuzzy=False) == []
+
+    def test_record_lookup(self, built_db):
+        [match] = spatial_db.search_names(built_db, "mandurah")
+        record = spatial_db.get_record(built_db, match["layer"], match["fid"])
+        assert record["pt_name"] == "Mandurah"
+
+    def test_rebuild_does_not_duplicate_names(self, built_db):
+        from bomshell.fetch_gis import create_spatial_database
+
+        create_spatial_database(workers=1, force=True)
+        assert len(spatial_db.search_names(spatial_db.connect(), "mandurah")) == 1
+
+
+class TestSchemaVersion:
+    def test_old_layout_is_reloaded(self, tmp_path):
+        db = _db(tmp_path)
+        source = tmp_path / "a.dbf"
+        source.write_bytes(b"data")
+        db["layer"].insert({"x": 1})
+        spatial_db.set_layer_state(db, "layer", [str(source)], records=1)
+        db.query("PRAGMA user_version = 1")
+
+        spatial_db.ensure_schema(db)
+        assert not spatial_db.is_layer_current(db, "layer", [str(source)])
+        assert next(iter(db.query("PRAGMA user_version")))["user_version"] == spatial_db.SCHEMA_VERSION
+
+
+class TestQueryLayer:
+    def test_filter_and_projection(self, built_db):
+        columns, records = spatial_db.query_layer(built_db, "forecast_districts", ["AAC", "dist_name"], "state_code = 'WA'")
+        assert columns == ["aac", "dist_name"]
+        assert list(records) == [{"aac": "WA_PW001", "dist_name": "Perth"}, {"aac": "WA_PW002", "dist_name": "Lower West"}]
+
+    def test_all_columns_without_id(self, built_db):
+        columns, records = spatial_db.query_layer(built_db, "point_places", limit=1)
+        assert "id" not in columns
+        assert [r["pt_name"] for r in records] == ["Perth"]
+
+    def test_unknown_column(self, built_db):
+        with pytest.raises(ValueError, match="Unknown columns"):
+            spatial_db.query_layer(built_db, "point_places", ["nope"])
+
+    def test_invalid_filter(self, built_db):
+        with pytest.raises(ValueError, match="Invalid query"):
+            spatial_db.query_layer(built_db, "point_places", where="nope = 1")
+
+    def test_missing_layer(self, built_db):
+        with pytest.raises(ValueError, match="not in the spatial database"):
+            spatial_db.query_layer(built_db, "marine_zones")
+
+    def test_read_only(self, built_db):
+        with pytest.raises(ValueError):
+            spatial_db.query_layer(built_db, "point_places", where="1; DROP TABLE point_places")
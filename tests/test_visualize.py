@@ -1,9 +1,11 @@
+import gzip
+import json
+import os
 from unittest.mock import patch
 
 import pytest
 
 from bomshell.visualize import SPATIAL_CONFIGS
-from bomshell.visualize import _build_popup_html
 from bomshell.visualize import get_visualizable_types
 
 
@@ -19,30 +21,6 @@ class TestGetVisualizableTypes:
         assert "point_places" in types
 
 
-class TestBuildPopupHtml:
-    def test_basic_popup(self):
-        record = {"Name": "Perth", "State": "WA"}
-        html = _build_popup_html(record, ["Name", "State"])
-        assert "<b>Name:</b> Perth" in html
-        assert "<b>State:</b> WA" in html
-
-    def test_missing_fields_skipped(self):
-        record = {"Name": "Perth"}
-        html = _build_popup_html(record, ["Name", "Missing"])
-        assert "Perth" in html
-        assert "Missing" not in html
-
-    def test_empty_fields_skipped(self):
-        record = {"Name": "", "State": "WA"}
-        html = _build_popup_html(record, ["Name", "State"])
-        assert "Name" not in html
-        assert "State" in html
-
-    def test_empty_record(self):
-        html = _build_popup_html({}, ["A", "B"])
-        assert html == ""
-
-
 class TestSpatialConfigs:
     def test_all_configs_have_required_keys(self):
         for name, config in SPATIAL_CONFIGS.items():
@@ -80,9 +58,14 @@ class TestOpenInBrowser:
         assert "test.html" in url
 
 
+def _prepared(spatial_type, *_args):
+    return {"spatial_type": spatial_type}
+
+
 class TestCreateMap:
+    @patch("bomshell.visualize._prepare_layer", side_effect=_prepared)
     @patch("bomshell.visualize._add_layer")
-    def test_single_type_default_output(self, mock_add_layer, tmp_path):
+    def test_single_type_default_output(self, mock_add_layer, mock_prepare, tmp_path):
         from bomshell import settings
         from bomshell.visualize import create_map
 
@@ -95,8 +78,9 @@ class TestCreateMap:
         finally:
             settings.CACHE = old_cache
 
+    @patch("bomshell.visualize._prepare_layer", side_effect=_prepared)
     @patch("bomshell.visualize._add_layer")
-    def test_multiple_types(self, mock_add_layer, tmp_path):
+    def test_multiple_types(self, mock_add_layer, mock_prepare, tmp_path):
         from bomshell import settings
         from bomshell.visualize import create_map
 
@@ -109,8 +93,9 @@ class TestCreateMap:
         finally:
             settings.CACHE = old_cache
 
+    @patch("bomshell.visualize._prepare_layer", side_effect=_prepared)
     @patch("bomshell.visualize._add_layer")
-    def test_custom_output_path(self, mock_add_layer, tmp_path):
+    def test_custom_output_path(self, mock_add_layer, mock_prepare, tmp_path):
         from bomshell.visualize import create_map
 
         out = str(tmp_path / "custom.html")
@@ -123,8 +108,9 @@ class TestCreateMap:
         with pytest.raises(ValueError, match="Unknown spatial type"):
             create_map("totally_fake_type")
 
+    @patch("bomshell.visualize._prepare_layer", side_effect=_prepared)
     @patch("bomshell.visualize._add_layer")
-    def test_polygons_rendered_before_points(self, mock_add_layer, tmp_path):
+    def test_polygons_rendered_before_points(self, mock_add_layer, mock_prepare, tmp_path):
         from bomshell import settings
         from bomshell.visualize import create_map
 
@@ -132,8 +118,231 @@ class TestCreateMap:
         try:
             settings.CACHE = str(tmp_path)
             create_map(["radar_location", "forecast_districts"])
-            calls = [c[0][1] for c in mock_add_layer.call_args_list]
+            calls = [c[0][1]["spatial_type"] for c in mock_add_layer.call_args_list]
             # polygon type should come first
             assert calls == ["forecast_districts", "radar_location"]
         finally:
             settings.CACHE = old_cache
+
+
+def _neighbours(vertices=20_000):
+    """Two districts sharing a wiggly border, like a coastline-heavy layer."""
+    import numpy as np
+    from shapely.geometry import Polygon
+
+    y = np.linspace(-40.0, -30.0, vertices)
+    x = 120.0 + 0.0005 * np.sin(np.arange(vertices))
+    border = list(zip(x, y, strict=True))
+    west = Polygon([*border, (115.0, -30.0), (115.0, -40.0)])
+    east = Polygon([*border, (125.0, -30.0), (125.0, -40.0)])
+    return west, east
+
+
+class TestSimplifyGeometries:
+    def test_neighbours_keep_meeting(self):
+        import geopandas as gpd
+        import shapely
+
+        from bomshell.visualize import simplify_geometries
+
+        west, east = _neighbours()
+        simplified = simplify_geometries(gpd.GeoSeries([west, east], crs="EPSG:4326"), 0.01)
+        assert shapely.get_num_coordinates(simplified.values).sum() < 200
+        # no gap and no overlap along the shared border
+        assert simplified[0].intersection(simplified[1]).length > 9.9
+        assert simplified[0].intersection(simplified[1]).area == 0
+        assert abs(simplified.union_all().area - (west.area + east.area)) < 1e-6
+
+    def test_rounds_coordinates(self):
+        import geopandas as gpd
+        from shapely.geometry import Point
+
+        from bomshell.visualize import simplify_geometries
+
+        simplified = simplify_geometries(gpd.GeoSeries([Point(115.123456789, -31.987654321)]), 0.01)
+        assert (simplified[0].x, simplified[0].y) == (115.123, -31.988)
+
+    def test_coordinate_precision(self):
+        from bomshell.visualize import coordinate_precision
+
+        assert coordinate_precision(0.01) == 3
+        assert coordinate_precision(0.001) == 4
+        assert coordinate_precision(0) == 6
+
+
+class TestPolygonDetail:
+    def test_simplified_map_is_much_smaller(self, spatial_cache, shapefile_writer, tmp_path):
+        from bomshell.visualize import create_map
+
+        shapefile_writer(spatial_cache, "IDM00006", {"NAME": ["West", "East"]}, list(_neighbours()))
+        full = create_map("high_sea_areas", str(tmp_path / "full.html"), tolerance=0.0)
+        low = create_map("high_sea_areas", str(tmp_path / "low.html"), tolerance=0.01)
+        assert os.path.getsize(full) > 10 * os.path.getsize(low)
+
+    def test_cached_per_tolerance(self, spatial_cache):
+        from bomshell import map_cache
+        from bomshell import visualize
+
+        config = SPATIAL_CONFIGS["forecast_districts"]
+        shp_path = str(spatial_cache / "IDM00001.shp")
+        first = visualize.polygon_geojson(config, shp_path, 0.01)
+        with patch("bomshell.visualize.read_layer") as mock_read:
+            assert visualize.polygon_geojson(config, shp_path, 0.01) == first
+            mock_read.assert_not_called()
+        assert os.path.exists(map_cache.variant_path("IDM00001", 0.01))
+        assert not os.path.exists(map_cache.variant_path("IDM00001", 0.001))
+
+    def test_rerender_skips_reading_the_shapefile(self, spatial_cache, tmp_path):
+        from bomshell.visualize import create_map
+
+        create_map("forecast_districts", str(tmp_path / "first.html"))
+        with patch("bomshell.visualize.read_layer") as mock_read:
+            create_map("forecast_districts", str(tmp_path / "second.html"))
+            mock_read.assert_not_called()
+        assert (tmp_path / "first.html").read_text().count("Lower West") == (tmp_path / "second.html").read_text().count("Lower West")
+
+
+class TestPointLayers:
+    def _places(self, count):
+        from shapely.geometry import Point
+
+        lats = [-30.0 - i * 0.001 for i in range(count)]
+        lons = [115.0 + i * 0.001 for i in range(count)]
+        records = {
+            "PT_NAME": [f"Place {i}" for i in range(count)],
+            "STATE_NAME": ["WA"] * count,
+            "LAT": lats,
+            "LON": lons,
+            "ELEVATION": [float(i) for i in range(count)],
+        }
+        return records, [Point(lon, lat) for lat, lon in zip(lats, lons, strict=True)]
+
+    def test_small_layer_is_one_geojson(self, spatial_cache, tmp_path):
+        from bomshell.visualize import create_map
+
+        with open(create_map("point_places", str(tmp_path / "map.html"))) as f:
+            html = f.read()
+        assert html.count("L.marker(") == 0
+        assert '"PT_NAME": "Perth Airport"' in html
+        assert "bindPopup" in html
+
+    def test_clustered_layer_is_one_data_array(self, spatial_cache, shapefile_writer, tmp_path):
+        from bomshell.visualize import create_map
+
+        shapefile_writer(spatial_cache, "IDM00013", *self._places(2000))
+        with open(create_map("point_places", str(tmp_path / "map.html"))) as f:
+            html = f.read()
+        assert "markerClusterGroup" in html
+        assert html.count("L.AwesomeMarkers.icon") == 1
+        assert '"Place 1999"' in html
+        # size grows with the data, not with a block of JS per marker
+        assert len(html) < 100 * 2000
+
+    def test_records_without_location_are_skipped(self, spatial_cache, shapefile_writer):
+        from shapely.geometry import Point
+
+        from bomshell.visualize import read_points
+
+        shapefile_writer(
+            spatial_cache,
+            "IDM00013",
+            {"PT_NAME": ["A", "B"], "STATE_NAME": ["WA", None], "LAT": [-31.0, None], "LON": [115.0, 116.0], "ELEVATION": [1.0, 2.0]},
+            [Point(115.0, -31.0), Point(116.0, -32.0)],
+        )
+        frame = read_points(SPATIAL_CONFIGS["point_places"], str(spatial_cache / "IDM00013.shp"))
+        assert frame["PT_NAME"].tolist() == ["A"]
+
+
+class TestExternalLayers:
+    def test_layers_are_written_next_to_a_shell(self, spatial_cache, tmp_path):
+        from bomshell.visualize import create_map
+
+        path = create_map(["point_places", "forecast_districts"], str(tmp_path / "map.html"), external=True)
+        with open(path) as f:
+            html = f.read()
+        layers_dir = tmp_path / "map_layers"
+        assert sorted(os.listdir(layers_dir)) == ["forecast_districts.js", "point_places.js"]
+        # the data is only in the layer files
+        assert "Lower West" not in html
+        assert "Mandurah" not in html
+        assert '"map_layers/forecast_districts.js"' in html
+        assert "overlayadd" in html
+
+        prefix = '(window.bomshellLayers = window.bomshellLayers || {})["forecast_districts"] = '
+        text = (layers_dir / "forecast_districts.js").read_text()
+        assert text.startswith(prefix)
+        data = json.loads(text[len(prefix) :].rstrip().rstrip(";"))
+        assert [f["properties"]["DIST_NAME"] for f in data["features"]] == ["Perth", "Lower West", "Sydney"]
+
+    def test_gzip_copies(self, spatial_cache, tmp_path):
+        from bomshell.visualize import create_map
+
+        path = create_map("point_places", str(tmp_path / "map.html"), external=True, compress=True)
+        gz_path = tmp_path / "map_layers" / "point_places.geojson.gz"
+        data = json.loads(gzip.decompress(gz_path.read_bytes()))
+        assert len(data["features"]) == 4
+        with open(path) as f:
+            assert '"map_layers/point_places.geojson.gz"' in f.read()
+
+        # dropped again when a later map is written without them
+        create_map("point_places", str(tmp_path / "map.html"), external=True)
+        assert not gz_path.exists()
+
+    def test_only_the_first_layer_starts_on(self, spatial_cache, tmp_path):
+        from bomshell.visualize import create_map
+
+        with patch("bomshell.visualize._add_external_layer", return_value={}) as mock_add, patch("bomshell.visualize.LazyLayers"):
+            create_map(["point_places", "forecast_districts"], str(tmp_path / "map.html"), external=True)
+        shown = [(c[0][1]["spatial_type"], c[0][3]) for c in mock_add.call_args_list]
+        assert shown == [("forecast_districts", True), ("point_places", False)]
+
+
+class TestPrepareLayers:
+    def test_results_keep_the_requested_order(self):
+        import time
+
+        from bomshell.visualize import prepare_layers
+
+        def prepare(spatial_type, *_args):
+            # the first layer finishes last
+            time.sleep(0.05 if spatial_type == "forecast_districts" else 0)
+            return {"spatial_type": spatial_type}
+
+        types = ["forecast_districts", "marine_zones", "radar_location"]
+        with patch("bomshell.visualize._prepare_layer", side_effect=prepare):
+            layers = prepare_layers(types, workers=3)
+        assert [layer["spatial_type"] for layer in layers] == types
+
+    def test_layers_are_prepared_concurrently(self):
+        import threading
+
+        from bomshell.visualize import prepare_layers
+
+        barrier = threading.Barrier(3, timeout=5)
+
+        def prepare(spatial_type, *_args):
+            # only passes if all three layers are being prepared at once
+            barrier.wait()
+            return {"spatial_type": spatial_type}
+
+        with patch("bomshell.visualize._prepare_layer", side_effect=prepare):
+            layers = prepare_layers(["forecast_districts", "marine_zones", "radar_location"], workers=0)
+        assert len(layers) == 3
+
+    def test_missing_layer_raises(self, spatial_cache):
+        from bomshell.visualize import prepare_layers
+
+        with pytest.raises(FileNotFoundError, match="IDM00003"):
+            prepare_layers(["forecast_districts", "marine_zones"])
+
+    def test_concurrent_map_matches_serial(self, spatial_cache, tmp_path):
+        import re
+
+        from bomshell.visualize import create_map
+
+        def render(name, workers):
+            with open(create_map(["point_places", "forecast_districts"], str(tmp_path / name), workers=workers)) as f:
+                # folium names elements with random ids
+                return re.sub(r"_[0-9a-f]{32}", "", f.read())
+
+        assert render("serial.html", 1) == render("threads.html", 0)